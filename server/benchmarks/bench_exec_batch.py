@@ -0,0 +1,71 @@
+# bench_exec_batch.py - Round trips to sync a directory of N files: one process per
+# command (the docker exec path), one agent request per file, and batched agent requests
+#
+#   cd server && python -m benchmarks.bench_exec_batch [N]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from terminal.exec_agent import ExecAgent
+
+AGENT = [sys.executable, "-u", os.path.join("terminal", "container_agent.py")]
+
+
+async def per_process(paths):
+    """stat then base64 per file, a process each, like `docker exec` per command."""
+    for path in paths:
+        for command in (f"stat -c '%F|%s|%Y|%a' '{path}'", f"base64 '{path}'"):
+            process = await asyncio.create_subprocess_shell(
+                command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            await process.communicate()
+    return 2 * len(paths)
+
+
+async def per_request(agent, paths):
+    for path in paths:
+        await agent.stat(path)
+        await agent.read(path)
+    return 2 * len(paths)
+
+
+async def batched(agent, paths):
+    await agent.batch([{"op": "stat", "path": path} for path in paths])
+    await agent.batch([{"op": "read", "path": path} for path in paths])
+    return 2
+
+
+async def main(count: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(count):
+            path = os.path.join(directory, f"file_{i}.txt")
+            with open(path, "w") as f:
+                f.write(f"line {i}\n" * 50)
+            paths.append(path)
+
+        agent = ExecAgent(AGENT)
+        await agent.start()
+        try:
+            runs = [
+                ("process per command", lambda: per_process(paths)),
+                ("agent, request per file", lambda: per_request(agent, paths)),
+                ("agent, batched", lambda: batched(agent, paths)),
+            ]
+            print(f"{count} files")
+            for name, run in runs:
+                started = time.perf_counter()
+                round_trips = await run()
+                elapsed = time.perf_counter() - started
+                print(
+                    f"  {name:26s} {round_trips:5d} round trips  "
+                    f"{elapsed * 1000:8.1f} ms"
+                )
+        finally:
+            await agent.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,75 @@
+# bench_keystroke_latency.py - Keystroke to screen update latency of an app on the
+# alternate screen: execute() per keystroke (write, then collect output for 30ms) against
+# send_input() with the screen read by stream_screen()
+#
+#   cd server && python -m benchmarks.bench_keystroke_latency [keystrokes]
+import asyncio
+import statistics
+import sys
+import time
+
+from terminal.local_pty import LocalPtyController
+from terminal.xoblas_editor import XoblasEditor
+
+# Echoes each key on the alternate screen until "q", then leaves it and prints the
+# marks of a prompt like the server's shell does (see shell_integration.py)
+APP = (
+    "printf '\\033[?1049h'; stty raw -echo; "
+    'while IFS= read -r -n1 c; do [ "$c" = q ] && break; printf "%s" "$c"; done; '
+    "stty sane; printf '\\033[?1049l'; "
+    "printf '\\033]133;A;user=u;host=h;cwd=/app\\007\\033]133;B\\007'"
+)
+
+
+async def open_app() -> XoblasEditor:
+    editor = XoblasEditor("bench")
+    editor.pty = LocalPtyController(editor.config)
+    await editor.pty.spawn(("bash", "--norc", "-c", APP))
+    async for _ in editor.pty.read_continuous_until_prompt(timeout=5):
+        break
+    assert editor.pty.in_alternate_screen
+    return editor
+
+
+async def per_execute(keystrokes: int):
+    editor = await open_app()
+    latencies = []
+    for _ in range(keystrokes):
+        started = time.perf_counter()
+        await editor.execute("x")
+        latencies.append(time.perf_counter() - started)
+    await editor.pty.write("q")
+    editor.pty.close()
+    return latencies
+
+
+async def streamed(keystrokes: int):
+    editor = await open_app()
+    screen = editor.stream_screen()
+    latencies = []
+    for _ in range(keystrokes):
+        started = time.perf_counter()
+        await editor.send_input("x")
+        await screen.__anext__()
+        latencies.append(time.perf_counter() - started)
+    await editor.send_input("q")
+    async for result in screen:
+        assert result["is_exiting_raw"]
+    editor.pty.close()
+    return latencies
+
+
+def main(keystrokes: int) -> None:
+    print(f"{keystrokes} keystrokes")
+    for name, run in (("execute()", per_execute), ("stream_screen()", streamed)):
+        latencies = sorted(asyncio.run(run(keystrokes)))
+        p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+        print(
+            f"  {name:16s} median {statistics.median(latencies) * 1000:6.2f} ms  "
+            f"p99 {p99 * 1000:6.2f} ms  "
+            f"{1 / statistics.mean(latencies):6.0f} keys/s"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
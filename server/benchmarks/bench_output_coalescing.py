@@ -0,0 +1,47 @@
+# bench_output_coalescing.py - Throughput and frame rate of a large output, one frame
+# per PTY read against frames coalesced by time window and size
+#
+#   cd server && python -m benchmarks.bench_output_coalescing [lines]
+import asyncio
+import sys
+import time
+
+from terminal.local_pty import LocalPtyController
+from terminal.terminal_config import TerminalConfig
+
+
+async def measure(name: str, flush_interval: float, max_frame_bytes: int, lines: int):
+    controller = LocalPtyController(TerminalConfig())
+    await controller.start_shell()
+
+    await controller.write(f"seq 1 {lines}\n")
+    started = time.perf_counter()
+    frames = size = 0
+    async for frame in controller.read_continuous_until_prompt(
+        timeout=120, flush_interval=flush_interval, max_frame_bytes=max_frame_bytes
+    ):
+        frames += 1
+        size += len(frame)
+    elapsed = time.perf_counter() - started
+    controller.close()
+
+    print(
+        f"{name:10s} {size / 1e6:5.1f} MB  {size / 1e6 / elapsed:6.1f} MB/s  "
+        f"{frames:6d} frames  {frames / elapsed:7.0f} frames/s"
+    )
+
+
+async def main(lines: int) -> None:
+    print(f"seq 1 {lines}")
+    # Every read goes out as its own frame
+    await measure("per read", 0, 1, lines)
+    await measure(
+        "coalesced",
+        TerminalConfig.OUTPUT_FLUSH_INTERVAL,
+        TerminalConfig.OUTPUT_MAX_FRAME_BYTES,
+        lines,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000000))
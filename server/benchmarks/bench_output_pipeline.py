@@ -0,0 +1,54 @@
+# bench_output_pipeline.py - Time per 64KB chunk of each OutputPipeline stage alone and
+# of the pipelines built from them, on plain, colored (ls) and full screen (vim) output
+#
+#   cd server && python -m benchmarks.bench_output_pipeline [rounds]
+import sys
+import time
+
+from terminal.output_pipeline import (
+    AnsiStrip,
+    Newlines,
+    OutputPipeline,
+    ScreenSwitches,
+)
+from terminal.shell_integration import ShellMarks
+
+CHUNK = 65536
+
+OUTPUTS = [
+    ("plain", b"lorem ipsum dolor sit amet consectetur " * 2000),
+    (
+        "colored ls",
+        b"\x1b[0m\x1b[01;34mdir\x1b[0m  \x1b[01;32mexec\x1b[0m  file.txt\r\n" * 2000,
+    ),
+    (
+        "vim screen",
+        (b"\x1b[5;1H\x1b[K~" + b"\x1b[38;5;12mx\x1b[m" * 20 + b"\r\n") * 400,
+    ),
+]
+
+PIPELINES = [
+    ("ShellMarks", lambda: OutputPipeline([ShellMarks()])),
+    ("ScreenSwitches", lambda: OutputPipeline([ScreenSwitches()])),
+    ("AnsiStrip", lambda: OutputPipeline([AnsiStrip()])),
+    ("Newlines", lambda: OutputPipeline([Newlines()])),
+    ("PTY (marks, screen)", lambda: OutputPipeline([ShellMarks(), ScreenSwitches()])),
+    ("plain_text (ansi, newlines)", OutputPipeline.plain_text),
+]
+
+
+def main(rounds: int) -> None:
+    for label, output in OUTPUTS:
+        data = output[:CHUNK]
+        print(f"{label}")
+        for name, make in PIPELINES:
+            pipeline = make()
+            started = time.perf_counter()
+            for _ in range(rounds):
+                pipeline.feed(data)
+            elapsed = (time.perf_counter() - started) / rounds
+            print(f"  {name:28s} {elapsed * 1e6:8.1f} us / 64KB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,83 @@
+# bench_pty_reader.py - Command latency and event loop stalls of the add_reader PTY
+# reader, against the select-and-sleep polling it replaced
+#
+#   cd server && python -m benchmarks.bench_pty_reader [runs]
+import asyncio
+import os
+import select
+import statistics
+import sys
+import time
+
+from terminal.local_pty import LocalPtyController
+from terminal.shell_integration import MARK
+from terminal.terminal_config import TerminalConfig
+
+# The prompt comes in a second chunk
+COMMAND = "echo a; sleep 0.005; echo b\n"
+PROMPT_READY = MARK + b"B"
+
+
+async def polling(controller: LocalPtyController) -> None:
+    """The reader before: select() for 50ms on the loop's thread, then sleep 50ms."""
+    output = b""
+    while PROMPT_READY not in output:
+        readable, _, _ = select.select([controller.fd], [], [], 0.05)
+        if readable:
+            try:
+                output += os.read(controller.fd, 4096)
+            except (OSError, BlockingIOError):
+                pass
+        await asyncio.sleep(0.05)
+
+
+async def event_driven(controller: LocalPtyController) -> None:
+    async for _ in controller.read_continuous_until_prompt(timeout=5):
+        pass
+
+
+async def measure(name: str, read, runs: int) -> None:
+    controller = LocalPtyController(TerminalConfig())
+    await controller.start_shell()
+    if read is polling:
+        # Polling reads the fd itself
+        controller._stop_reader()
+
+    # Longest gap between 1ms ticks of another task: how long the loop was blocked
+    worst_stall = 0.0
+    ticking = True
+
+    async def ticker():
+        nonlocal worst_stall
+        last = time.perf_counter()
+        while ticking:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            worst_stall = max(worst_stall, now - last)
+            last = now
+
+    ticker_task = asyncio.create_task(ticker())
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await controller.write(COMMAND)
+        await read(controller)
+        latencies.append(time.perf_counter() - started)
+
+    ticking = False
+    await ticker_task
+    controller.close()
+    print(
+        f"{name:12s} median {statistics.median(latencies) * 1000:6.1f} ms  "
+        f"worst event loop stall {worst_stall * 1000:6.1f} ms"
+    )
+
+
+async def main(runs: int) -> None:
+    print(f"{COMMAND.strip()!r}, {runs} runs")
+    await measure("select+sleep", polling, runs)
+    await measure("add_reader", event_driven, runs)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 30))
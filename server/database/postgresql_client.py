@@ -3,7 +3,7 @@ import os
 import uuid
 import time
 
-from typing import Optional, Union, Dict
+from typing import List, Optional, Union, Dict
 
 
 class PostgreSQLClient:
@@ -92,7 +92,28 @@ class PostgreSQLClient:
                 )
                 """
             )
-            print("Successfully created both tables")
+            # One row per command run in a terminal, see terminal/command_history.py
+            self.execute_query(
+                """
+                CREATE TABLE IF NOT EXISTS command_history (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    terminal_id TEXT NOT NULL,
+                    command TEXT NOT NULL,
+                    started_at DOUBLE PRECISION NOT NULL,
+                    duration DOUBLE PRECISION NOT NULL,
+                    output_bytes BIGINT NOT NULL,
+                    exit_code INTEGER
+                )
+                """
+            )
+            self.execute_query(
+                """
+                CREATE INDEX IF NOT EXISTS command_history_user_duration
+                ON command_history (user_id, duration DESC)
+                """
+            )
+            print("Successfully created tables")
 
         except Exception as e:
             print(f"Table creation has failed with error: {e}")
@@ -131,5 +152,67 @@ class PostgreSQLClient:
         finally:
             self.disconnect()
 
+    def add_command_history(self, records: List[Dict]) -> None:
+        """Insert a batch of command history records in one transaction."""
+        try:
+            self.connect()
+
+            with self.connection.cursor() as cur:
+                cur.executemany(
+                    """
+                    INSERT INTO command_history
+                    (id, user_id, terminal_id, command, started_at, duration, output_bytes, exit_code)
+                    VALUES (%(id)s, %(user_id)s, %(terminal_id)s, %(command)s, %(started_at)s,
+                    %(duration)s, %(output_bytes)s, %(exit_code)s)
+                    """,
+                    records,
+                )
+            self.connection.commit()
+
+        except Exception as e:
+            print(f"Error adding command history: {e}")
+            if self.connection:
+                self.connection.rollback()
+            raise e
+
+        finally:
+            self.disconnect()
+
+    def get_slowest_commands(self, user_id: str, limit: int) -> List[Dict]:
+        try:
+            return self.execute_query(
+                """
+                SELECT user_id, terminal_id, command, started_at, duration, output_bytes, exit_code
+                FROM command_history
+                WHERE user_id = %(user_id)s
+                ORDER BY duration DESC
+                LIMIT %(limit)s
+                """,
+                {"user_id": user_id, "limit": limit},
+            )
+
+        finally:
+            self.disconnect()
+
+    def get_frequent_commands(self, user_id: str, limit: int) -> List[Dict]:
+        try:
+            return self.execute_query(
+                """
+                SELECT user_id, command, COUNT(*) AS runs,
+                    AVG(duration) AS avg_duration, MAX(duration) AS max_duration,
+                    AVG(output_bytes) AS avg_output_bytes,
+                    SUM(CASE WHEN exit_code <> 0 THEN 1 ELSE 0 END) AS failures
+                FROM command_history
+                WHERE user_id = %(user_id)s
+                GROUP BY user_id, command
+                ORDER BY runs DESC, avg_duration DESC
+                LIMIT %(limit)s
+                """,
+                {"user_id": user_id, "limit": limit},
+            )
+
+        finally:
+            self.disconnect()
+
 
 PostgreSQLInstance = PostgreSQLClient()
@@ -1,5 +1,5 @@
 import asyncio
-from typing import Dict, Set, Optional, Callable, Awaitable
+from typing import Dict, List, Set, Optional, Callable, Awaitable
 import json
 import base64
 from pathlib import Path
@@ -32,11 +32,11 @@ class FilesystemWatcher:
         """Set the callback function for sending messages to the webapp."""
         self.send_callback = callback
 
-    def is_container_available(self) -> bool:
+    async def is_container_available(self) -> bool:
         """Check if container is available (running and not stopping)."""
         return (
             not self.is_container_stopping
-            and self.docker_manager.is_container_running()
+            and await self.docker_manager.is_container_running()
         )
 
     async def start_watching(self):
@@ -45,7 +45,7 @@ class FilesystemWatcher:
             return
 
         # Check if container is available before starting
-        if not self.is_container_available():
+        if not await self.is_container_available():
             raise Exception("Container is not available (stopped or stopping)")
 
         try:
@@ -75,7 +75,7 @@ class FilesystemWatcher:
 
         try:
             # Stop the watcher process in the container only if container is still available
-            if self.is_container_available():
+            if await self.is_container_available():
                 await self.docker_manager.exec_command(
                     "pkill -f 'python.*filesystem_monitor.py'"
                 )
@@ -97,7 +97,7 @@ class FilesystemWatcher:
     async def _start_container_watcher(self):
         """Start the watcher script inside the container."""
         # Double-check container availability before proceeding
-        if not self.is_container_available():
+        if not await self.is_container_available():
             raise Exception("Container became unavailable during watcher startup")
 
         # Read the monitoring script from the external file
@@ -162,82 +162,102 @@ class FilesystemWatcher:
             paths = [
                 p.strip() for p in stdout.decode().strip().split("\n") if p.strip()
             ]
-            file_tree = []
 
             print(f"Processing {len(paths)} paths for initial sync...")
 
-            for path in paths:
-                if not path.strip():
-                    continue
-
-                try:
-                    file_info = await self._get_file_info_with_content(path)
-                    if file_info:
-                        file_tree.append(file_info)
-                except Exception as e:
-                    print(f"Error processing {path} during sync: {e}")
-                    continue
-
-            return file_tree
+            # Batched round trips (stats, then contents) whatever the number of files
+            return await self._get_file_infos_with_content(paths)
 
         except Exception as e:
             print(f"Error getting complete file tree: {e}")
             return []
 
-    async def _get_file_info_with_content(self, path: str) -> dict:
-        """Get file info with content for a specific path."""
-        try:
-            # Check if file exists and get basic info - use simpler stat format
-            stdout, stderr = await self.docker_manager.exec_command(
-                f"test -e '{path}' && stat -c '%F|%s|%Y|%a' '{path}' || echo 'not_found'"
+    async def _get_file_infos_with_content(self, paths: List[str]) -> List[dict]:
+        """Get file info with content for several paths: one batched round trip for the
+        stats, then one per few MB of content."""
+        stat_responses = await self.docker_manager.batch(
+            [{"op": "stat", "path": path} for path in paths]
+        )
+
+        file_infos = []
+        for path, response in zip(paths, stat_responses):
+            stat_info = response.get("result") or {}
+            if not response["ok"] or not stat_info.get("exists"):
+                if not response["ok"]:
+                    print(f"Error getting file info for {path}: {response['error']}")
+                continue
+
+            file_infos.append(
+                {
+                    "path": path,
+                    "isDirectory": stat_info["is_directory"],
+                    "operation": "create",  # For initial sync, everything is a "create"
+                    "fileInfo": {
+                        "size": stat_info["size"],
+                        "mtime": stat_info["mtime"],
+                        "permissions": stat_info["permissions"],
+                        "name": path.split("/")[-1],
+                    },
+                }
             )
 
-            if stderr or stdout.decode().strip() == "not_found":
-                return None
-
-            stat_output = stdout.decode().strip()
-            stat_parts = stat_output.split("|")
-
-            if len(stat_parts) != 4:
-                print(f"Unexpected stat output for {path}: {stat_output}")
-                return None
-
-            file_type = stat_parts[0]
-            file_size = int(stat_parts[1])
-            mtime = float(stat_parts[2])
-            permissions = stat_parts[3]
-
-            is_directory = "directory" in file_type
-
-            file_info = {
-                "path": path,
-                "isDirectory": is_directory,
-                "operation": "create",  # For initial sync, everything is a "create"
-                "fileInfo": {
-                    "size": file_size,
-                    "mtime": mtime,
-                    "permissions": permissions,
-                    "name": path.split("/")[-1],
-                },
-            }
-
-            # Add content for files (not directories)
-            if not is_directory and file_size <= self.max_file_size:
-                content_info = await self.read_file_content(path)
-                if "content" in content_info:
-                    file_info["content"] = content_info["content"]
-                    file_info["contentType"] = content_info["contentType"]
-                elif content_info.get("contentType") == "file_too_large":
-                    file_info["contentType"] = "file_too_large"
-
-            return file_info
+        # Add content for files (not directories), a few MB per round trip: the
+        # contents of a batch come back base64 encoded in a single frame
+        files = [info for info in file_infos if not info["isDirectory"]]
+        for batch in self._read_batches(files):
+            await self._read_contents(batch)
+
+        return file_infos
+
+    def _read_batches(self, files: List[dict]) -> List[List[dict]]:
+        """Files grouped so each group's size (from the stat pass) stays under
+        `read_batch_size`; a larger file goes alone."""
+        batches: List[List[dict]] = []
+        batch_size = 0
+        for info in files:
+            size = min(info["fileInfo"]["size"], self.max_file_size)
+            if not batches or batch_size + size > self.read_batch_size:
+                batches.append([])
+                batch_size = 0
+            batches[-1].append(info)
+            batch_size += size
+        return batches
+
+    async def _read_contents(self, files: List[dict]) -> None:
+        read_responses = await self.docker_manager.batch(
+            [
+                {"op": "read", "path": info["path"], "max_size": self.max_file_size}
+                for info in files
+            ]
+        )
 
-        except Exception as e:
-            print(f"Error getting file info for {path}: {e}")
-            return None
+        for file_info, response in zip(files, read_responses):
+            if not response["ok"]:
+                print(f"Error reading {file_info['path']} during sync: {response['error']}")
+                continue
+
+            if response["result"].get("too_large"):
+                file_info["contentType"] = "file_too_large"
+                continue
+
+            content_info = self._decode_content(
+                base64.b64decode(response["result"]["content"])
+            )
+            file_info["content"] = content_info["content"]
+            file_info["contentType"] = content_info["contentType"]
+
+    @staticmethod
+    def _decode_content(data: bytes) -> Dict:
+        """Text when the data is valid UTF-8, base64 otherwise."""
+        try:
+            return {"content": data.decode("utf-8"), "contentType": "text"}
+        except UnicodeDecodeError:
+            return {"content": base64.b64encode(data).decode(), "contentType": "binary"}
 
     # Add max file size property
     max_file_size = 10 * 1024 * 1024  # 10MB limit
+    # Contents read per round trip during a sync
+    read_batch_size = 4 * 1024 * 1024
 
     def _load_monitor_script(self) -> str:
         """Load the monitoring script from the external file."""
@@ -277,7 +297,7 @@ class FilesystemWatcher:
         while self.is_running:
             try:
                 # Check if container is still available before polling
-                if not self.is_container_available():
+                if not await self.is_container_available():
                     print("Container no longer available - stopping filesystem polling")
                     self.is_running = False
                     break
@@ -308,7 +328,7 @@ class FilesystemWatcher:
             except Exception as e:
                 print(f"Error polling for filesystem changes: {e}")
                 # Check if this might be due to container stopping
-                if not self.is_container_available():
+                if not await self.is_container_available():
                     print("Container stopped during polling - exiting")
                     self.is_running = False
                     break
@@ -404,17 +424,12 @@ class FilesystemWatcher:
         """Read file content from the container - try UTF-8, fallback to binary."""
         try:
             # Check if file exists and get size
-            stdout, stderr = await self.docker_manager.exec_command(
-                f"test -f '{file_path}' && stat -c '%s' '{file_path}' 2>/dev/null || echo '0'"
-            )
+            stat_info = await self.docker_manager.stat_path(file_path)
 
-            if stderr:
+            if not stat_info.get("exists") or stat_info.get("is_directory"):
                 return {"error": "File not found"}
 
-            try:
-                file_size = int(stdout.decode().strip())
-            except ValueError:
-                return {"error": "Could not determine file size"}
+            file_size = stat_info["size"]
 
             if file_size > 10 * 1024 * 1024:  # 10MB limit
                 return {
@@ -426,37 +441,10 @@ class FilesystemWatcher:
             if file_size == 0:
                 return {"content": "", "contentType": "text", "fileInfo": {"size": 0}}
 
-            # Try to read as UTF-8 text first
-            stdout, stderr = await self.docker_manager.exec_command(
-                f"cat '{file_path}' 2>/dev/null"
-            )
-
-            if not stderr and stdout:
-                try:
-                    # Try to decode as UTF-8
-                    content = stdout.decode("utf-8")
-                    return {
-                        "content": content,
-                        "contentType": "text",
-                        "fileInfo": {"size": file_size},
-                    }
-                except UnicodeDecodeError:
-                    # If UTF-8 fails, read as binary
-                    pass
-
-            # Fallback to binary
-            stdout, stderr = await self.docker_manager.exec_command(
-                f"base64 '{file_path}' 2>/dev/null"
-            )
-
-            if not stderr and stdout:
-                return {
-                    "content": stdout.decode().strip(),
-                    "contentType": "binary",
-                    "fileInfo": {"size": file_size},
-                }
+            data = await self.docker_manager.read_path(file_path)
 
-            return {"error": "Failed to read file content"}
+            # Try to decode as UTF-8, if that fails send it as binary
+            return {**self._decode_content(data), "fileInfo": {"size": file_size}}
 
         except Exception as e:
             return {"error": f"Error reading file: {str(e)}"}
@@ -469,21 +457,13 @@ class FilesystemWatcher:
             # Mark this operation as pending to avoid feedback loops
             self.mark_operation_pending("modified", file_path)
 
-            # Ensure directory exists
-            dir_path = str(Path(file_path).parent)
-            await self.docker_manager.exec_command(f"mkdir -p '{dir_path}'")
-
+            # Parent directories are created by the write itself
             if content_type == "binary":
-                # Decode base64 and write binary file
-                await self.docker_manager.exec_command(
-                    f"echo '{content}' | base64 -d > '{file_path}'"
-                )
+                data = base64.b64decode(content)
             else:
-                # Write UTF-8 text file
-                escaped_content = content.replace("'", "'\\''")
-                await self.docker_manager.exec_command(
-                    f"cat > '{file_path}' << 'EOF'\n{escaped_content}\nEOF"
-                )
+                data = content.encode("utf-8")
+
+            await self.docker_manager.write_path(file_path, data)
 
             return {"success": True}
 
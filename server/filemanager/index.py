@@ -1,5 +1,6 @@
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 import asyncio
+import shlex
 from terminal.docker_manager import DockerManager
 from .filesystem_watcher import FilesystemWatcher
 
@@ -42,7 +43,9 @@ class FileManager:
         # Mark operations as pending to avoid feedback loops
         operation = operations_data["operation"]
         for file_info in operations_data.get("files", []):
-            path = file_info["path"]
+            path = file_info.get("path")
+            if not path:
+                continue
             self.filesystem_watcher.mark_operation_pending(operation, path)
 
             # For rename operations, mark both old and new paths
@@ -52,46 +55,37 @@ class FileManager:
                 )
                 self.filesystem_watcher.mark_operation_pending("create", path)
 
-        for file_info in operations_data.get("files", []):
-            path = file_info["path"]
-            operation = operations_data["operation"]
+        files = operations_data.get("files", [])
 
-            # Smart directory detection (your optimized approach)
-            is_directory = file_info["isDirectory"]
+        # Every valid file's command goes out in a single round trip
+        commands = [self._command_for(operation, file_info) for file_info in files]
+        outputs = iter(
+            await self._run_commands(
+                [command for command in commands if command is not None]
+            )
+        )
 
-            try:
-                if operation == "create":
-                    result = await self._handle_create(path, is_directory)
-                elif operation == "delete":
-                    result = await self._handle_delete(path, is_directory)
-                elif operation == "change":
-                    result = await self._handle_change(path, is_directory)
-                elif operation == "rename":
-                    old_path = file_info.get("oldPath")
-                    result = await self._handle_rename(old_path, path)
-
-                results.append(
-                    {
-                        "path": path,
-                        "oldPath": file_info.get("oldPath"),
-                        "isDirectory": is_directory,
-                        "operation": operation,
-                        "success": result["success"],
-                        "error": result.get("error"),
-                    }
-                )
+        for file_info, command in zip(files, commands):
+            if command is None:
+                stderr = f"Missing path for {operation}".encode()
+            else:
+                _, stderr, _ = next(outputs)
 
-            except Exception as e:
-                results.append(
-                    {
-                        "path": path,
-                        "oldPath": file_info.get("oldPath"),
-                        "isDirectory": is_directory,
-                        "operation": operation,
-                        "success": False,
-                        "error": str(e),
-                    }
-                )
+            if operation == "change":
+                error = "File/directory does not exist" if stderr else None
+            else:
+                error = stderr.decode() if stderr else None
+
+            results.append(
+                {
+                    "path": file_info.get("path"),
+                    "oldPath": file_info.get("oldPath"),
+                    "isDirectory": file_info["isDirectory"],
+                    "operation": operation,
+                    "success": not stderr,
+                    "error": error,
+                }
+            )
 
         return {
             "type": "file_operation_result",
@@ -101,42 +95,43 @@ class FileManager:
             "timestamp": operations_data.get("timestamp"),
         }
 
-    async def _handle_create(self, path: str, is_directory: bool) -> Dict:
-        """Handle file/directory creation."""
-        if is_directory:
-            _, stderr = await self.docker_manager.exec_command(f"mkdir -p '{path}'")
-        else:
-            _, stderr = await self.docker_manager.exec_command(f"touch '{path}'")
-
-        return {"success": not stderr, "error": stderr.decode() if stderr else None}
-
-    async def _handle_delete(self, path: str, is_directory: bool) -> Dict:
-        """Handle file/directory deletion."""
-        if is_directory:
-            _, stderr = await self.docker_manager.exec_command(f"rm -rf '{path}'")
-        else:
-            _, stderr = await self.docker_manager.exec_command(f"rm -f '{path}'")
-
-        return {"success": not stderr, "error": stderr.decode() if stderr else None}
-
-    async def _handle_change(self, path: str, is_directory: bool) -> Dict:
-        """Handle file/directory change (could trigger file watchers)."""
-        # For now, just verify the path exists
-        _, stderr = await self.docker_manager.exec_command(f"test -e '{path}'")
-
-        return {
-            "success": not stderr,
-            "error": "File/directory does not exist" if stderr else None,
-        }
-
-    async def _handle_rename(
-        self,
-        old_path: str,
-        new_path: str,
-    ) -> Dict:
-        """Handle file/directory rename."""
-        _, stderr = await self.docker_manager.exec_command(
-            f"mv '{old_path}' '{new_path}'"
-        )
+    async def _run_commands(self, commands: List[str]) -> List[Tuple[bytes, bytes, int]]:
+        """(stdout, stderr, exit_code) of each command, batched in one round trip."""
+        try:
+            return await self.docker_manager.exec_many(commands)
+        except Exception:
+            pass
 
-        return {"success": not stderr, "error": stderr.decode() if stderr else None}
+        # The batch failed as a whole: one by one, so a command failing only fails its file
+        outputs = []
+        for command in commands:
+            try:
+                outputs.extend(await self.docker_manager.exec_many([command]))
+            except Exception as e:
+                outputs.append((b"", str(e).encode(), -1))
+        return outputs
+
+    @staticmethod
+    def _command_for(operation: str, file_info: Dict) -> Optional[str]:
+        """Shell command applying one file operation in the container, None if the
+        operation is missing a path."""
+        if not file_info.get("path") or (
+            operation == "rename" and not file_info.get("oldPath")
+        ):
+            return None
+
+        path = shlex.quote(file_info["path"])
+        # Smart directory detection (your optimized approach)
+        is_directory = file_info["isDirectory"]
+
+        if operation == "create":
+            return f"mkdir -p {path}" if is_directory else f"touch {path}"
+        elif operation == "delete":
+            return f"rm -rf {path}" if is_directory else f"rm -f {path}"
+        elif operation == "change":
+            # For now, just verify the path exists
+            return f"test -e {path} || echo 'not found' >&2"
+        elif operation == "rename":
+            return f"mv {shlex.quote(file_info['oldPath'])} {path}"
+
+        return f"echo {shlex.quote(f'Unsupported operation: {operation}')} >&2"
@@ -4,6 +4,7 @@ from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional, List
 from terminal.docker_manager import DockerManager
 from terminal.terminal_config import TerminalConfig
+from terminal.tracing import tracer
 
 
 class BaseLSPController(ABC):
@@ -32,32 +33,47 @@ class BaseLSPController(ABC):
         """Get LSP initialization options specific to the language"""
         pass
 
+    def take_prestarted_process(self) -> Optional[asyncio.subprocess.Process]:
+        """Return an already running LSP process for this container, if any."""
+        return None
+
     async def start(self) -> bool:
         """Start the LSP server"""
+        with tracer.trace(f"lsp_{self.language}", self.user_id):
+            return await self._start()
+
+    async def _start(self) -> bool:
         try:
             # Ensure container is running with proper synchronization
-            await self.docker.ensure_container_running()
-
-            # Install LSP server if needed
-            if not await self.install_lsp_server():
-                return False
-
-            # Start LSP process
-            cmd = self.get_lsp_command()
-
-            self.process = await asyncio.create_subprocess_exec(
-                "docker",
-                "exec",
-                "-i",
-                self.docker.container_id,
-                *cmd,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
+            with tracer.stage("ensure_container"):
+                await self.docker.ensure_container_running()
+
+            # Containers from the warm pool already have the server running
+            self.process = self.take_prestarted_process()
+
+            if self.process is None:
+                # Install LSP server if needed
+                with tracer.stage("install_lsp_server"):
+                    installed = await self.install_lsp_server()
+                if not installed:
+                    return False
+
+                # Start LSP process
+                cmd = self.get_lsp_command()
+
+                with tracer.stage("start_lsp_process"):
+                    self.process = await asyncio.create_subprocess_exec(
+                        *self.docker.client.cli(
+                            "exec", "-i", self.docker.container_id, *cmd
+                        ),
+                        stdin=asyncio.subprocess.PIPE,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                    )
 
             # Initialize LSP
-            await self._initialize()
+            with tracer.stage("lsp_initialize"):
+                await self._initialize()
             return True
 
         except Exception as e:
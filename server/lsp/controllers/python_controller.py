@@ -1,4 +1,5 @@
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Optional
 from lsp.base_controller import BaseLSPController
 
 
@@ -6,6 +7,10 @@ class PythonLSPController(BaseLSPController):
     def __init__(self, user_id: str):
         super().__init__(user_id, "python")
 
+    def take_prestarted_process(self) -> Optional[asyncio.subprocess.Process]:
+        """pylsp is started ahead of time in warm pool containers"""
+        return self.docker.take_warm_lsp_process()
+
     async def install_lsp_server(self) -> bool:
         """Install pylsp (Python LSP Server)"""
         try:
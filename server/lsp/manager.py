@@ -1,6 +1,7 @@
 from typing import Dict, Optional
 from lsp.base_controller import BaseLSPController
 from lsp.controllers.python_controller import PythonLSPController
+from terminal.docker_manager import DockerManager
 
 
 class LSPManager:
@@ -23,9 +24,11 @@ class LSPManager:
         """Get existing LSP or create new one"""
         session_key = self._get_session_key(user_id, language)
 
-        # Return existing LSP if available
+        # Return existing LSP if available, thawing its container if it was hibernated
         if session_key in self.active_lsps:
-            return self.active_lsps[session_key]
+            existing = self.active_lsps[session_key]
+            await existing.docker.ensure_container_running()
+            return existing
 
         # Create new LSP
         controller_class = self.language_controllers.get(language)
@@ -67,3 +70,6 @@ class LSPManager:
 
 # Global LSP manager instance
 lsp_manager = LSPManager()
+
+# LSP servers live as long as the container, not the websocket
+DockerManager.add_cleanup_hook(lsp_manager.close_all_user_lsps)
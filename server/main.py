@@ -1,7 +1,11 @@
 import os
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 
+# Before the routers: the database client reads its connection string on import
+load_dotenv()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -10,12 +14,27 @@ from routers import (
     web_socket,
     lsp_socket,
     filesystem_socket,
+    metrics,
 )
+from database.postgresql_client import PostgreSQLClient
+from terminal.command_history import command_history
+from terminal.placement import placement
 
 
-load_dotenv()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Per Docker node: events subscription, image build, capacity monitor, warm pool
+    await placement.start()
+    # Writes the terminal command history to the database in batches, when it's
+    # configured. Its own client: the routers' shared one connects and disconnects
+    # around each of their queries
+    await command_history.start(PostgreSQLClient())
+    yield
+    await command_history.stop()
+    await placement.stop()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 origins = (
@@ -41,6 +60,7 @@ app.add_middleware(
 app.include_router(web_socket.router)
 app.include_router(lsp_socket.router)
 app.include_router(filesystem_socket.router)
+app.include_router(metrics.router)
 
 
 @app.get("/")
@@ -3,6 +3,7 @@ from typing import Dict
 import json
 import re
 import asyncio
+import uuid
 from filemanager.index import FileManager
 from terminal.docker_manager import DockerManager
 from terminal.terminal_config import TerminalConfig
@@ -23,9 +24,15 @@ async def ws_filesystem(websocket: WebSocket, user_id: str):
     # Sanitize user_id for Docker compatibility
     sanitized_user_id = re.sub(r"[^a-z0-9_.-]", "-", user_id.lower())
 
+    # Generate unique connection ID for this WebSocket
+    connection_id = f"filesystem_{uuid.uuid4().hex[:8]}"
+
     try:
         await websocket.accept()
 
+        # Register this connection, an open file tree keeps the session from hibernating
+        DockerManager.register_connection(sanitized_user_id, connection_id)
+
         # Initialize file manager with docker manager
         config = TerminalConfig()
         docker_manager = DockerManager.get_or_create(sanitized_user_id, config)
@@ -125,6 +132,8 @@ async def ws_filesystem(websocket: WebSocket, user_id: str):
         print(f"Filesystem WebSocket error: {e}")
 
     finally:
+        DockerManager.unregister_connection(sanitized_user_id, connection_id)
+
         # Clean up the filesystem session and stop watcher
         if sanitized_user_id in active_filesystem_sessions:
             file_manager = active_filesystem_sessions[sanitized_user_id]
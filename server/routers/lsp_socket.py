@@ -78,12 +78,10 @@ async def ws_lsp(websocket: WebSocket, user_id: str):
         print(f"LSP WebSocket error: {e}")
 
     finally:
-        # Unregister this connection
+        # Unregister this connection, the LSP server is kept (pylsp state survives a
+        # reconnect) and closed by the idle policy when the container is stopped
         DockerManager.unregister_connection(sanitized_user_id, connection_id)
 
-        # Clean up LSPs for this user when disconnecting
-        await lsp_manager.close_all_user_lsps(sanitized_user_id)
-
 
 async def read_from_lsp(lsp, websocket: WebSocket):
     """Continuously read messages from the LSP server and forward them to the client"""
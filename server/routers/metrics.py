@@ -0,0 +1,137 @@
+from typing import Annotated, Optional
+from fastapi import APIRouter, Header
+from terminal.command_history import command_history
+from terminal.docker_manager import DockerManager
+from terminal.placement import placement
+from terminal.pty_controller import output_throughput
+from terminal.session_host import SessionHost
+from terminal.tracing import tracer
+import re
+
+
+def terminal_user(user_id: str) -> str:
+    """The id a user's terminals record commands under (see routers/web_socket.py)."""
+    return re.sub(r"[^a-z0-9_.-]", "-", user_id)
+
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get(
+    "/pool",
+    name="Warm pool metrics",
+    description="Per Docker node: warm container pool hit rate, warm-up time and time-to-first-prompt",
+)
+async def pool_metrics():
+    return {
+        endpoint: node.pool.get_metrics() for endpoint, node in placement.nodes.items()
+    }
+
+
+@router.get(
+    "/hibernation",
+    name="Hibernation metrics",
+    description="Idle policy timings: pause, resume (unpause), stop and time spent paused",
+)
+async def hibernation_metrics():
+    return DockerManager.get_hibernation_metrics()
+
+
+@router.get(
+    "/capacity",
+    name="Capacity metrics",
+    description="Per Docker node: running containers against host limits, admission queue, wait times and evictions",
+)
+async def capacity_metrics():
+    return {
+        endpoint: node.capacity.get_metrics()
+        for endpoint, node in placement.nodes.items()
+    }
+
+
+@router.get(
+    "/placement",
+    name="Placement metrics",
+    description="Users placed on each Docker node and the bounded-load limit",
+)
+async def placement_metrics():
+    return placement.get_metrics()
+
+
+@router.get(
+    "/exec",
+    name="Exec metrics",
+    description="Round trips to containers and the number of commands they carried",
+)
+async def exec_metrics():
+    return DockerManager.get_exec_metrics()
+
+
+@router.get(
+    "/stages",
+    name="Bring-up stage metrics",
+    description="Latency histograms per session bring-up stage (slowest first) and per session kind",
+)
+async def stage_metrics():
+    return tracer.get_stage_metrics()
+
+
+@router.get(
+    "/traces",
+    name="Recent bring-up traces",
+    description="Most recent session bring-up traces, optionally for a single user",
+)
+async def traces(user_id: Optional[str] = None, limit: int = 20):
+    return tracer.get_traces(user_id, limit)
+
+
+@router.get(
+    "/output",
+    name="Terminal output metrics",
+    description="Terminal output frames and bytes sent, with frames/s and MB/s over the last seconds",
+)
+async def output_metrics():
+    return output_throughput.summary()
+
+
+@router.get(
+    "/terminals",
+    name="Terminal metrics",
+    description="Open terminals (tabs), how many of them need a host process, output buffered per session for slow clients, and open/close times",
+)
+async def terminal_metrics():
+    return SessionHost.get_metrics()
+
+
+@router.get(
+    "/commands",
+    name="Command history metrics",
+    description="Commands recorded, kept in memory, waiting to be written to the database, and dropped before they were",
+)
+async def command_history_metrics():
+    return command_history.get_metrics()
+
+
+@router.get(
+    "/commands/slowest",
+    name="Slowest commands",
+    description="Your slowest terminal commands with their duration, output size and exit code",
+)
+async def slowest_commands(
+    user_id: Annotated[str, Header(alias="X-xoblas-terminal-User")], limit: int = 20
+):
+    return await command_history.slowest(terminal_user(user_id), limit)
+
+
+@router.get(
+    "/commands/frequent",
+    name="Most frequent commands",
+    description="Your most run terminal commands with their run count, average and max duration",
+)
+async def frequent_commands(
+    user_id: Annotated[str, Header(alias="X-xoblas-terminal-User")], limit: int = 20
+):
+    return await command_history.most_frequent(terminal_user(user_id), limit)
@@ -1,14 +1,45 @@
 from fastapi import WebSocket, APIRouter
-from typing import Dict
+from typing import Callable, Dict, Optional
 from terminal.xoblas_editor import XoblasEditor
 from terminal.docker_manager import DockerManager
+from terminal.session_host import SessionHost
+from terminal.tracing import tracer
+from terminal.workspace_tree import WorkspaceTree
+import asyncio
 import json
 import re
+import time
 import uuid
 
 
-# Dictionary to store active terminal sessions
-active_terminals: Dict[str, XoblasEditor] = {}
+# Terminal used by messages that don't name one
+MAIN_TERMINAL = "main"
+
+# Binary frames (clients connecting with ?output=binary) carry streamed output as read
+# from the PTY: kind byte, terminal id length byte, terminal id (ascii), then the output
+OUTPUT_FRAME = 0x01
+MAX_TERMINAL_ID = 64
+
+# Messages waiting on a terminal's worker. Once full, the websocket isn't read until
+# the worker catches up (a large paste waiting on the PTY)
+INBOX_SIZE = 64
+
+
+def output_frame(terminal_id: str, output: bytes) -> bytes:
+    """Binary frame for streamed output, decoded on the client in stream order."""
+    terminal = terminal_id.encode("ascii", errors="replace")
+    return bytes((OUTPUT_FRAME, len(terminal))) + terminal + output
+
+
+async def close_user_terminals(user_id: str):
+    """Close the PTYs of a user whose container is being stopped"""
+    for session_id, host in list(SessionHost.hosts.items()):
+        if host.user_id == user_id:
+            await host.close_all()
+            del SessionHost.hosts[session_id]
+
+
+DockerManager.add_cleanup_hook(close_user_terminals)
 
 
 router = APIRouter(
@@ -20,8 +51,6 @@ router = APIRouter(
 @router.websocket("/terminal/{user_id}")
 async def ws_terminal(websocket: WebSocket, user_id: str):
     # Generate a unique session ID based on the user_id (Anonymous, coming from the front-end)
-    session_id = user_id
-
     session_id = user_id.lower()
 
     # Replace all disallowed characters with a dash or remove them
@@ -31,29 +60,313 @@ async def ws_terminal(websocket: WebSocket, user_id: str):
     # Generate unique connection ID for this WebSocket
     connection_id = f"terminal_{uuid.uuid4().hex[:8]}"
 
+    host: Optional[SessionHost] = None
+
+    # Sent by a client reconnecting to its session: the token it was given and the
+    # offset of the last output it received
+    resume_token = websocket.query_params.get("resume")
+    resume_offset = websocket.query_params.get("offset")
+
+    # Streamed output goes as binary frames instead of JSON text
+    binary = websocket.query_params.get("output") == "binary"
+
+    # Every message carries the terminal (tab) it belongs to. Each terminal has its own
+    # worker: its messages run in order, while the terminals run side by side
+    inboxes: Dict[str, asyncio.Queue] = {}
+    workers: Dict[str, asyncio.Task] = {}
+    # Output of the app a terminal has on the alternate screen, read as it comes
+    screens: Dict[str, asyncio.Task] = {}
+    # Structured commands running beside the shells, by the id the client gave them
+    execs: Dict[str, asyncio.Task] = {}
+    # Workspace index this connection gets the changes of, and its listener there
+    tree_watch: Dict[WorkspaceTree, Callable[[Dict], None]] = {}
+    send_lock = asyncio.Lock()
+
+    async def send(message: Dict, terminal_id: str = MAIN_TERMINAL):
+        async with send_lock:
+            output = message.get("output")
+            if isinstance(output, bytes):
+                await websocket.send_bytes(output_frame(terminal_id, output))
+            else:
+                await websocket.send_json({**message, "terminal": terminal_id})
+
+    async def send_file(terminal_id: str, editor: XoblasEditor):
+        # File path will be implemented if we have multiple of them =) (multi file editor)
+        file = await editor.read_from_file()
+        await send({"type": "file", "content": file, "file_path": ""}, terminal_id)
+
+    async def stream_screen(terminal_id: str, editor: XoblasEditor):
+        try:
+            async for result in editor.stream_screen(binary):
+                # When exiting a alternate screen we always check the file that is opened
+                if result.get("is_exiting_raw"):
+                    await send_file(terminal_id, editor)
+                await send(result, terminal_id)
+        except Exception as e:
+            print(f"Terminal {terminal_id} screen error: {e}")
+
+    async def watch_screen(terminal_id: str, editor: XoblasEditor):
+        """Keep reading the terminal while an app is on the alternate screen."""
+        screen = screens.get(terminal_id)
+        if editor.pty.in_alternate_screen and (screen is None or screen.done()):
+            screens[terminal_id] = asyncio.create_task(
+                stream_screen(terminal_id, editor)
+            )
+            # Let it take over the output before the next message is handled
+            await asyncio.sleep(0)
+
+    def stop_screen(terminal_id: str):
+        screen = screens.pop(terminal_id, None)
+        if screen is not None:
+            screen.cancel()
+
+    async def run_exec(terminal_id: str, exec_id: str, command: str):
+        """Run a command outside the terminal's PTY, streaming stdout, stderr and its exit."""
+        try:
+            editor = host.get(terminal_id)
+            if editor is None:
+                await send(
+                    {"type": "error", "message": f"Terminal {terminal_id} is not open"},
+                    terminal_id,
+                )
+                return
+
+            async for event in editor.run_structured(command):
+                await send({**event, "id": exec_id}, terminal_id)
+        except Exception as e:
+            print(f"Exec {exec_id} error: {e}")
+            await send(
+                {"type": "exec_exit", "id": exec_id, "exit_code": None, "error": str(e)},
+                terminal_id,
+            )
+        finally:
+            if execs.get(exec_id) is asyncio.current_task():
+                del execs[exec_id]
+
+    async def watch_tree(editor: XoblasEditor):
+        """Send the workspace index's diffs from now on ("xoblas_diff" messages)."""
+        tree = await editor.docker.get_workspace_tree()
+        if tree is None or tree in tree_watch:
+            return
+        unwatch_tree()
+
+        def on_diff(diff: Dict):
+            asyncio.create_task(send({"type": "xoblas_diff", **diff}))
+
+        tree.listeners.append(on_diff)
+        tree_watch[tree] = on_diff
+
+    def unwatch_tree():
+        for tree, listener in tree_watch.items():
+            if listener in tree.listeners:
+                tree.listeners.remove(listener)
+        tree_watch.clear()
+
+    async def send_file_structure(terminal_id: str, editor: XoblasEditor, command: str):
+        try:
+            file_structure = await editor.xoblas_editor_command(command)
+            await send({"type": "xoblas", "file_structure": file_structure}, terminal_id)
+            await watch_tree(editor)
+        except Exception as e:
+            print(f"Terminal {terminal_id} xoblas error: {e}")
+        finally:
+            if execs.get(f"xoblas-{terminal_id}") is asyncio.current_task():
+                del execs[f"xoblas-{terminal_id}"]
+
+    async def follow_command(terminal_id: str, editor: XoblasEditor):
+        try:
+            async for result in editor.follow_command(binary):
+                await send(result, terminal_id)
+            await watch_screen(terminal_id, editor)
+        except Exception as e:
+            print(f"Terminal {terminal_id} follow error: {e}")
+
+    async def attach_terminal(
+        terminal_id: str,
+        on_queue_position=None,
+        token: Optional[str] = None,
+        offset: Optional[str] = None,
+    ) -> XoblasEditor:
+        """Resume the terminal if its shell is still running or start it, then send its prompt."""
+        editor = host.get(terminal_id)
+        resumed = editor is not None
+        if resumed:
+            await editor.resume(on_queue_position)
+            editor.pty.attach()
+
+            # Catch the client up on what the shell printed while it was away
+            missed = editor.resume_replay(token, offset)
+            if missed is not None:
+                await send(missed, terminal_id)
+        else:
+            editor = await host.open(terminal_id, on_queue_position)
+
+        await send({"type": "session", "token": editor.resume_token}, terminal_id)
+
+        # Send initial prompt (perhaps, it could be executed in the initialization)
+        with tracer.stage("first_prompt"):
+            if not resumed:
+                async for result in editor.execute_streaming("", binary=binary):
+                    await send(result, terminal_id)
+
+            # Nothing is written to a resumed shell, a keystroke would reach the app or
+            # command running there
+            elif editor.pty.in_alternate_screen:
+                # An app left on the alternate screen is repainted from the screen model
+                restored = await editor.restore_screen()
+                if restored is not None:
+                    await send(restored, terminal_id)
+            elif editor.pty.command_running():
+                # Its output goes on in the background, like an app's screen
+                screens[terminal_id] = asyncio.create_task(
+                    follow_command(terminal_id, editor)
+                )
+            else:
+                await send(editor.current_prompt(), terminal_id)
+
+        await watch_screen(terminal_id, editor)
+        return editor
+
+    async def handle_message(terminal_id: str, json_data: Dict):
+        req_type = json_data.get("type")
+
+        if req_type == "open_terminal":
+            await attach_terminal(
+                terminal_id, token=json_data.get("resume"), offset=json_data.get("offset")
+            )
+            return
+
+        editor = host.get(terminal_id)
+        if editor is None:
+            await send(
+                {"type": "error", "message": f"Terminal {terminal_id} is not open"},
+                terminal_id,
+            )
+            return
+
+        # To execute a terminal command
+        if req_type == "command":
+            command = json_data.get("command")
+
+            if editor.is_xoblas_command(command):
+                # Served outside the PTY, the shell stays free meanwhile
+                previous = execs.pop(f"xoblas-{terminal_id}", None)
+                if previous is not None:
+                    previous.cancel()
+                execs[f"xoblas-{terminal_id}"] = asyncio.create_task(
+                    send_file_structure(terminal_id, editor, command)
+                )
+
+            else:
+                # Output is read here from now on
+                stop_screen(terminal_id)
+
+                # Stream command execution
+                async for result in editor.execute_streaming(command, binary=binary):
+                    await send(result, terminal_id)
+
+                await watch_screen(terminal_id, editor)
+
+        # Indicating raw mode "alternate screen" for text editors
+        elif req_type == "input":
+            screen = screens.get(terminal_id)
+            if screen is not None and not screen.done():
+                # Fire and forget, the echo comes back through the screen stream
+                await editor.send_input(json_data.get("data"))
+                return
+
+            result = await editor.execute(json_data.get("data"))
+
+            # When exiting a alternate screen we always check the file that is opened
+            if result.get("is_exiting_raw"):
+                await send_file(terminal_id, editor)
+
+            await send(result, terminal_id)
+            await watch_screen(terminal_id, editor)
+
+        # A page of the workspace tree: {"type": "tree", "path", "depth", "offset", "limit",
+        # "ignore", "hidden"}
+        elif req_type == "tree":
+            limit = json_data.get("limit")
+            node = await editor.tree(
+                json_data.get("path", "."),
+                depth=json_data.get("depth"),
+                offset=json_data.get("offset", 0),
+                limit=min(
+                    limit if limit is not None else editor.config.TREE_PAGE_SIZE,
+                    editor.config.TREE_PAGE_SIZE,
+                ),
+                ignore=json_data.get("ignore", ()),
+                hidden=json_data.get("hidden", False),
+            )
+            if node is None:
+                await send(
+                    {"type": "error", "message": "Path is not in the indexed workspace"},
+                    terminal_id,
+                )
+                return
+
+            await send(
+                {"type": "tree", "path": json_data.get("path", "."), "tree": node},
+                terminal_id,
+            )
+            await watch_tree(editor)
+
+        elif req_type == "resize":
+            cols, rows = json_data.get("cols"), json_data.get("rows")
+            if editor.pty.in_alternate_screen:
+                result = await editor.resize(rows, cols)
+
+                await send(result, terminal_id)
+
+            else:
+                await editor.resize(rows, cols)
+
+    async def run_terminal(terminal_id: str, inbox: asyncio.Queue):
+        while True:
+            json_data = await inbox.get()
+            try:
+                await handle_message(terminal_id, json_data)
+            except Exception as e:
+                print(f"Terminal {terminal_id} error: {e}")
+
     try:
         await websocket.accept()
+        connected_at = time.perf_counter()
 
         # Register this connection
         DockerManager.register_connection(sanitized, connection_id)
 
-        # Create and start a new PTY shell session
-        editor = XoblasEditor(user_id=sanitized)
-        await editor.start()
-
-        active_terminals[session_id] = editor
+        # Tell the client where it stands while the host is at capacity
+        async def send_queue_position(position: int):
+            await send({"type": "queue", "position": position})
+
+        # Every bring-up stage below is timed into this session's trace
+        with tracer.trace("terminal", sanitized):
+            # Reuse the terminals left by a previous connection, their shells survive
+            # hibernation. A connection next to an attached one gets its own terminals
+            registered = SessionHost.hosts.get(session_id)
+            if registered is None:
+                host = SessionHost.hosts[session_id] = SessionHost(sanitized)
+            elif not registered.attached:
+                host = registered
+            else:
+                host = SessionHost(sanitized)
+            host.attached = True
+
+            editor = await attach_terminal(
+                MAIN_TERMINAL, send_queue_position, resume_token, resume_offset
+            )
+
+        editor.docker.node.pool.record_first_prompt(
+            time.perf_counter() - connected_at, editor.docker.from_warm_pool
+        )
 
-        # Send initial prompt (perhaps, it could be executed in the initialization)
-        async for result in editor.execute_streaming(""):
-            await websocket.send_json(result)
+        # Tabs still open from the previous connection, reattached with "open_terminal"
+        await send({"type": "terminals", "terminals": host.list()})
 
         # Sync file stored on container with UI
-        main_file = await editor.read_from_file()
-
-        # File path will be implemented if we have multiple of them =) (multi file editor)
-        await websocket.send_json(
-            {"type": "file", "content": main_file, "file_path": ""}
-        )
+        await send_file(MAIN_TERMINAL, editor)
 
         while True:
             # Receive command from client
@@ -65,64 +378,67 @@ async def ws_terminal(websocket: WebSocket, user_id: str):
 
             print(f"Incoming reqType:{req_type}")
 
-            # To execute a terminal command
-            if req_type == "command":
-                command = json_data.get("command")
-
-                if editor.is_xoblas_command(command):
-                    file_structure = await editor.xoblas_editor_command(command)
-
-                    await websocket.send_json(
-                        {"type": "xoblas", "file_structure": file_structure}
-                    )
-
-                else:
-                    # Stream command execution
-                    async for result in editor.execute_streaming(command):
-                        await websocket.send_json(result)
+            terminal_id = str(json_data.get("terminal", MAIN_TERMINAL))[:MAX_TERMINAL_ID]
 
             # To save a file
-            elif req_type == "write_file":
+            if req_type == "write_file":
                 await editor.write_to_file(code_content=json_data.get("content"))
 
-            # Indicating raw mode "alternate screen" for text editors
-            elif req_type == "input":
-                result = await editor.execute(json_data.get("data"))
-
-                # [TO-DO]: Make this object trough a function instead of repeating code
-                # When exiting a alternate screen we always check the file that is opened
-                if result.get("is_exiting_raw"):
-                    file = await editor.read_from_file()
-                    await websocket.send_json(
-                        {
-                            "type": "file",
-                            "content": file,
-                            "file_path": "",
-                        }
+            # Non-interactive command outside the PTY: {"type": "exec", "id", "command"}
+            elif req_type == "exec":
+                exec_id = str(json_data.get("id"))
+                previous = execs.pop(exec_id, None)
+                if previous is not None:
+                    previous.cancel()
+                execs[exec_id] = asyncio.create_task(
+                    run_exec(terminal_id, exec_id, json_data.get("command", ""))
+                )
+
+            elif req_type == "exec_cancel":
+                running = execs.pop(str(json_data.get("id")), None)
+                if running is not None:
+                    running.cancel()
+
+            elif req_type == "close_terminal":
+                worker = workers.pop(terminal_id, None)
+                if worker is not None:
+                    worker.cancel()
+                inboxes.pop(terminal_id, None)
+                stop_screen(terminal_id)
+
+                await host.close(terminal_id)
+                await send({"type": "terminal_closed"}, terminal_id)
+
+            else:
+                if terminal_id not in inboxes:
+                    inboxes[terminal_id] = asyncio.Queue(INBOX_SIZE)
+                    workers[terminal_id] = asyncio.create_task(
+                        run_terminal(terminal_id, inboxes[terminal_id])
                     )
-
-                await websocket.send_json(result)
-
-            elif req_type == "resize":
-                _, cols, rows = json_data.values()
-                if editor.pty.in_alternate_screen:
-                    result = await editor.resize(rows, cols)
-
-                    await websocket.send_json(result)
-
-                else:
-                    await editor.resize(rows, cols)
+                await inboxes[terminal_id].put(json_data)
 
     except Exception as e:
         print(f"Terminal error: {e}")
         pass
 
     finally:
+        for worker in workers.values():
+            worker.cancel()
+        for terminal_id in list(screens):
+            stop_screen(terminal_id)
+        for running in list(execs.values()):
+            running.cancel()
+        unwatch_tree()
+
         # Unregister this connection
         DockerManager.unregister_connection(sanitized, connection_id)
 
-        # Clean up the terminal session from our local tracking
-        if session_id in active_terminals:
-            del active_terminals[session_id]
+        # Keep the terminals around for a resume, they're closed by the idle policy once
+        # the container is stopped. Those of a concurrent connection are closed right away
+        if host is not None:
+            if SessionHost.hosts.get(session_id) is host:
+                host.detach()
+            else:
+                await host.close_all()
 
         print(f"Terminal WebSocket disconnected for user: {sanitized}")
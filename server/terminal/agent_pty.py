@@ -0,0 +1,98 @@
+# agent_pty.py - PTY hosted inside the container by the exec agent
+import asyncio
+import base64
+from typing import Dict
+
+from terminal.exec_agent import ExecAgent, ExecAgentError
+from terminal.pty_controller import PtyController
+from terminal.terminal_config import TerminalConfig
+
+
+class AgentPtyController(PtyController):
+    """
+    PTY opened by the container's exec agent. Its output arrives as agent events over
+    the agent's pipe, so a terminal costs no host process (a `docker exec -it` client
+    per terminal otherwise) and opening one is a single agent round trip.
+    """
+
+    def __init__(self, config: TerminalConfig, agent: ExecAgent, name: str):
+        super().__init__(config)
+        self.agent = agent
+        # Unique per agent, several terminals may share a tab name across connections
+        self.name = name
+        self._alive = False
+
+    async def open(self) -> None:
+        self.pid = await self.agent.pty_open(
+            self.name, self.rows, self.cols, self._on_event
+        )
+        self._alive = True
+
+        # Give the shell a moment to initialize
+        await asyncio.sleep(0.1)
+
+    def _on_event(self, event: Dict) -> None:
+        if event["event"] == "pty_output":
+            self._feed_output(base64.b64decode(event["data"]))
+        elif event["event"] == "pty_exit":
+            self._alive = False
+            self._feed_output(b"")
+
+    def _pause_reading(self) -> None:
+        self._set_reading(False)
+
+    def _resume_reading(self) -> None:
+        self._set_reading(True)
+
+    def _set_reading(self, reading: bool) -> None:
+        # Called from the output path, the requests still go out in order
+        if self.is_process_alive():
+            asyncio.get_running_loop().create_task(
+                self.agent.pty_flow(self.name, reading)
+            )
+
+    def set_raw_mode(self):
+        """The agent puts the PTY in raw mode when opening it."""
+
+    async def write(self, data: str) -> None:
+        if not self._alive:
+            return
+
+        # A paste goes out in chunks, the agent's pipe pushes back once it's full
+        encoded = data.encode()
+        chunk = self.config.INPUT_WRITE_CHUNK
+        for start in range(0, len(encoded), chunk):
+            await self.agent.pty_write(self.name, encoded[start : start + chunk])
+
+    async def resize(self, rows: int, cols: int, capture_output: bool = True) -> str:
+        self.rows = rows
+        self.cols = cols
+        self.screen.resize(rows, cols)
+
+        if not self.is_process_alive():
+            return ""
+
+        await self.agent.pty_resize(self.name, rows, cols)
+
+        # Small wait to let shell react
+        await asyncio.sleep(0.05)
+        if capture_output:
+            return await self.read_immediate_output(timeout=0.1)
+        return ""
+
+    def is_process_alive(self) -> bool:
+        return self._alive and self.agent.is_alive
+
+    def close(self) -> None:
+        """Hang up the shell, the agent reaps it."""
+        if self.is_process_alive():
+            asyncio.get_running_loop().create_task(self._hang_up())
+        self._alive = False
+        self.pid = None
+        self._end_output()
+
+    async def _hang_up(self) -> None:
+        try:
+            await self.agent.pty_close(self.name)
+        except ExecAgentError:
+            pass
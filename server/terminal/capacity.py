@@ -0,0 +1,226 @@
+# capacity.py - Host capacity limits, fair admission queue and LRU eviction
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from terminal.metrics import LatencyStats
+from terminal.terminal_config import TerminalConfig
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+def host_available_memory_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo, None where it can't be read."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class _Waiter:
+    def __init__(self, key: str):
+        self.key = key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.listeners: List[PositionCallback] = []
+        self.enqueued_at = time.perf_counter()
+
+
+class CapacityManager:
+    """
+    Every running container holds one slot. A slot is granted when the container count,
+    the memory budget (count x per-container limit) and the host's available memory all
+    allow it; otherwise the request waits in a FIFO queue and its position is reported.
+    Under pressure the least recently used session without connections is evicted.
+    """
+
+    def __init__(
+        self,
+        max_containers: int = TerminalConfig.MAX_CONTAINERS,
+        max_memory_mb: int = TerminalConfig.MAX_MEMORY_MB,
+        container_memory_mb: int = TerminalConfig.CONTAINER_MEMORY_MB,
+        min_available_mb: int = TerminalConfig.MIN_HOST_AVAILABLE_MB,
+        check_host_memory: bool = True,
+    ):
+        self.max_containers = max_containers
+        self.max_memory_mb = max_memory_mb
+        self.container_memory_mb = container_memory_mb
+        self.min_available_mb = min_available_mb
+        # Only meaningful when the daemon runs on this host
+        self.check_host_memory = check_host_memory
+
+        # key -> last activity, least recently used first
+        self.holders: "OrderedDict[str, float]" = OrderedDict()
+        self.queue: Deque[_Waiter] = deque()
+
+        # Wired by the owning node: whether a session has no connections, and how to evict it
+        self.is_idle: Callable[[str], bool] = lambda key: False
+        self.evict: Optional[Callable[[str], Awaitable[None]]] = None
+
+        self.evictions = 0
+        self.rejected_warmups = 0
+        self.admission_wait = LatencyStats()
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    # ----------------------------------------------------------------- state
+
+    def _memory_pressure(self) -> bool:
+        if not self.check_host_memory:
+            return False
+        available = host_available_memory_mb()
+        return available is not None and available < self.min_available_mb
+
+    def _has_room(self) -> bool:
+        count = len(self.holders) + 1
+        return (
+            count <= self.max_containers
+            and count * self.container_memory_mb <= self.max_memory_mb
+            and not self._memory_pressure()
+        )
+
+    def holds(self, key: str) -> bool:
+        return key in self.holders
+
+    def touch(self, key: str) -> None:
+        if key in self.holders:
+            self.holders[key] = time.monotonic()
+            self.holders.move_to_end(key)
+
+    # ------------------------------------------------------------- admission
+
+    def try_acquire(self, key: str) -> bool:
+        """Take a slot only if one is free right now and nobody is queued (warm pool)."""
+        if key in self.holders:
+            return True
+        if self.queue or not self._has_room():
+            self.rejected_warmups += 1
+            return False
+
+        self.holders[key] = time.monotonic()
+        return True
+
+    async def acquire(self, key: str, on_position: Optional[PositionCallback] = None):
+        """Wait for a slot. `on_position` is awaited with the queue position while waiting."""
+        if key in self.holders:
+            self.touch(key)
+            return
+
+        if not self.queue and self._has_room():
+            self.holders[key] = time.monotonic()
+            return
+
+        waiter = _Waiter(key)
+        if on_position:
+            waiter.listeners.append(on_position)
+        self.queue.append(waiter)
+
+        try:
+            await self._report_positions()
+            await self.make_room()
+            await waiter.future
+        except BaseException:
+            if waiter in self.queue:
+                self.queue.remove(waiter)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # Granted right before the cancellation came through, nobody will use
+                # the slot
+                self.release(waiter.key)
+            raise
+
+        self.admission_wait.record(time.perf_counter() - waiter.enqueued_at)
+
+    def transfer(self, old_key: str, new_key: str) -> None:
+        """Move a slot to another key (warm container handed over to a user)."""
+        if old_key in self.holders:
+            del self.holders[old_key]
+            self.holders[new_key] = time.monotonic()
+
+    def release(self, key: str) -> None:
+        if self.holders.pop(key, None) is not None:
+            self._grant_waiters()
+
+    def _grant_waiters(self) -> None:
+        granted = False
+        while self.queue and self._has_room():
+            waiter = self.queue.popleft()
+            if waiter.future.done():
+                continue
+            self.holders[waiter.key] = time.monotonic()
+            waiter.future.set_result(None)
+            granted = True
+
+        if granted and self.queue:
+            asyncio.create_task(self._report_positions())
+
+    async def _report_positions(self) -> None:
+        for position, waiter in enumerate(list(self.queue), start=1):
+            for listener in waiter.listeners:
+                try:
+                    await listener(position)
+                except Exception as e:
+                    print(f"Error reporting queue position to {waiter.key}: {e}")
+
+    # -------------------------------------------------------------- eviction
+
+    def _idle_holders(self) -> List[str]:
+        """Holders without connections, least recently used first."""
+        return [key for key in self.holders if self.is_idle(key)]
+
+    async def make_room(self) -> None:
+        """Evict idle sessions (LRU first) until the head of the queue fits."""
+        for key in self._idle_holders():
+            if not self.queue or self._has_room() or self.evict is None:
+                break
+            await self._evict(key)
+
+        self._grant_waiters()
+
+    async def _evict(self, key: str) -> None:
+        print(f"Evicting idle session {key} to free capacity")
+        self.evictions += 1
+        try:
+            await self.evict(key)
+        finally:
+            self.release(key)
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(TerminalConfig.CAPACITY_CHECK_INTERVAL)
+            try:
+                # Memory pressure without new arrivals: still shed idle sessions
+                for key in self._idle_holders():
+                    if not self._memory_pressure() or self.evict is None:
+                        break
+                    await self._evict(key)
+                await self.make_room()
+            except Exception as e:
+                print(f"Capacity monitor error: {e}")
+
+    async def start(self) -> None:
+        if self._monitor_task is None:
+            self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def stop(self) -> None:
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            self._monitor_task = None
+
+    def get_metrics(self) -> Dict:
+        return {
+            "containers": len(self.holders),
+            "max_containers": self.max_containers,
+            "memory_budget_mb": len(self.holders) * self.container_memory_mb,
+            "max_memory_mb": self.max_memory_mb,
+            "host_available_mb": (
+                host_available_memory_mb() if self.check_host_memory else None
+            ),
+            "queued": len(self.queue),
+            "evictions": self.evictions,
+            "rejected_warmups": self.rejected_warmups,
+            "admission_wait": self.admission_wait.summary(),
+        }
+
@@ -0,0 +1,225 @@
+# command_history.py - Commands run in terminals, with their duration, output size and exit code
+import asyncio
+import uuid
+from collections import deque
+from itertools import islice
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional
+
+from terminal.terminal_config import TerminalConfig
+
+if TYPE_CHECKING:
+    # Imported by main.py, which hands the client over: the terminal stack runs
+    # without psycopg installed
+    from database.postgresql_client import PostgreSQLClient
+
+
+class CommandHistory:
+    """
+    The latest commands are kept in a bounded ring and written to the database in
+    batches by a background task, so recording one never waits on the database. Records
+    the ring overwrites before they were written (database down or too slow) are counted
+    in `dropped`. Without a database, or while it's unreachable, queries are answered
+    from the ring.
+    """
+
+    def __init__(
+        self,
+        database: Optional["PostgreSQLClient"] = None,
+        max_records: int = TerminalConfig.COMMAND_HISTORY_SIZE,
+        batch_size: int = TerminalConfig.COMMAND_HISTORY_BATCH,
+        flush_interval: float = TerminalConfig.COMMAND_HISTORY_FLUSH_INTERVAL,
+    ):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records: Deque[Dict] = deque(maxlen=max_records)
+
+        # Records ever added, and how many of the oldest of them are written or dropped
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.flush_failures = 0
+
+        self._flush_task: Optional[asyncio.Task] = None
+        self._batch_ready = asyncio.Event()
+        # One batch or query at a time on the database client, which holds a single
+        # connection
+        self._database_lock = asyncio.Lock()
+        self._tables_created = False
+
+    def record(
+        self,
+        user_id: str,
+        terminal_id: str,
+        command: str,
+        started_at: float,
+        duration: float,
+        output_bytes: int,
+        exit_code: Optional[int],
+    ) -> None:
+        self.records.append(
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "terminal_id": terminal_id,
+                "command": command[: TerminalConfig.COMMAND_HISTORY_MAX_LENGTH],
+                "started_at": started_at,
+                "duration": duration,
+                "output_bytes": output_bytes,
+                "exit_code": exit_code,
+            }
+        )
+        self.recorded += 1
+
+        if self.pending() >= self.batch_size:
+            self._batch_ready.set()
+
+    def pending(self) -> int:
+        """Records in the ring not written yet; those it overwrote count as dropped."""
+        unwritten = self.recorded - self.written
+        if unwritten > len(self.records):
+            # Overwritten before their turn
+            self.dropped += unwritten - len(self.records)
+            self.written = self.recorded - len(self.records)
+            unwritten = len(self.records)
+        return unwritten
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                self.flush_failures += 1
+                print(f"Command history flush error: {e}")
+
+    async def flush(self) -> None:
+        """Write every pending record, a batch per transaction."""
+        if self.database is None:
+            return
+
+        async with self._database_lock:
+            if not self._tables_created:
+                await asyncio.to_thread(self.database.create_tables)
+                self._tables_created = True
+
+            while pending := self.pending():
+                start = len(self.records) - pending
+                batch = list(islice(self.records, start, start + self.batch_size))
+                # Counted as written while in flight, so the ring overwriting them
+                # meanwhile doesn't count them as dropped
+                first = self.written
+                self.written += len(batch)
+                try:
+                    await asyncio.to_thread(self.database.add_command_history, batch)
+                except Exception:
+                    # Back in line for the next flush, those the ring still holds
+                    self.written = first
+                    raise
+
+    async def start(self, database: Optional["PostgreSQLClient"] = None) -> None:
+        if database is not None:
+            self.database = database
+        if self.database is not None and not (
+            self.database.connection_string or self.database.conn_params
+        ):
+            # No database configured: memory only
+            self.database = None
+        if self._flush_task is None and self.database is not None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+            # What's left, before the process goes
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Command history flush error: {e}")
+
+    async def _query(
+        self, method: str, user_id: str, limit: int
+    ) -> Optional[List[Dict]]:
+        """Run a database query, pending records written first; None if it failed."""
+        if self.database is None:
+            return None
+        try:
+            await self.flush()
+            async with self._database_lock:
+                return await asyncio.to_thread(
+                    getattr(self.database, method), user_id, limit
+                )
+        except Exception as e:
+            print(f"Command history query error: {e}")
+            return None
+
+    def _user_records(self, user_id: str) -> List[Dict]:
+        return [record for record in self.records if record["user_id"] == user_id]
+
+    async def slowest(self, user_id: str, limit: int = 20) -> Dict:
+        """Slowest commands of a user."""
+        rows = await self._query("get_slowest_commands", user_id, limit)
+        if rows is not None:
+            return {"source": "database", "commands": rows}
+
+        records = sorted(
+            self._user_records(user_id),
+            key=lambda record: record["duration"],
+            reverse=True,
+        )
+        return {
+            "source": "memory",
+            "commands": [
+                {key: value for key, value in record.items() if key != "id"}
+                for record in records[:limit]
+            ],
+        }
+
+    async def most_frequent(self, user_id: str, limit: int = 20) -> Dict:
+        """Most run commands of a user, with their durations."""
+        rows = await self._query("get_frequent_commands", user_id, limit)
+        if rows is not None:
+            return {"source": "database", "commands": rows}
+
+        groups: Dict[tuple, List[Dict]] = {}
+        for record in self._user_records(user_id):
+            groups.setdefault((record["user_id"], record["command"]), []).append(record)
+
+        commands = [
+            {
+                "user_id": user,
+                "command": command,
+                "runs": len(records),
+                "avg_duration": sum(r["duration"] for r in records) / len(records),
+                "max_duration": max(r["duration"] for r in records),
+                "avg_output_bytes": sum(r["output_bytes"] for r in records)
+                / len(records),
+                "failures": sum(1 for r in records if r["exit_code"] not in (0, None)),
+            }
+            for (user, command), records in groups.items()
+        ]
+        commands.sort(key=lambda c: (c["runs"], c["avg_duration"]), reverse=True)
+        return {"source": "memory", "commands": commands[:limit]}
+
+    def get_metrics(self) -> Dict:
+        pending = self.pending()
+        return {
+            "in_memory": len(self.records),
+            "recorded": self.recorded,
+            "pending": pending,
+            # `written` also moves past the dropped records
+            "written": self.written - self.dropped,
+            "dropped": self.dropped,
+            "flush_failures": self.flush_failures,
+            "database": self.database is not None,
+        }
+
+
+# Memory only until main.py's lifespan starts it with a database client
+command_history = CommandHistory()
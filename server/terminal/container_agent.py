@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+# container_agent.py - Long-lived helper running inside the user container
+#
+# Started once per container through a single `docker exec -i` pipe. Requests and responses
+# are framed as a 4 byte big-endian length followed by a JSON object:
+#
+#   request:  {"id": 1, "op": "stat", "path": "/home/termuser/root/main.py"}
+#   response: {"id": 1, "ok": true, "result": {...}}  or  {"id": 1, "ok": false, "error": "..."}
+#
+# Requests are served concurrently, so responses may come back out of order. A "batch"
+# request carries several operations that run in order and come back in one response.
+# A request without an id gets no response.
+#
+# The agent also hosts PTYs (terminal tabs). Their output is pushed without a request:
+#
+#   event:    {"event": "pty_output", "pty": "main-1a2b", "data": "<base64>"}
+#             {"event": "pty_exit", "pty": "main-1a2b", "exit_code": 0}
+#
+# And runs non-interactive commands outside any PTY, their stdout and stderr kept apart:
+#
+#   event:    {"event": "exec_output", "exec": "exec-1", "stream": "stderr", "data": "<base64>"}
+#             {"event": "exec_exit", "exec": "exec-1", "exit_code": 0}
+#
+# And watches directory trees with inotify, pushing what changed under them:
+#
+#   event:    {"event": "tree_change", "watch": "tree-1", "changes": [["add", "src/a.py", false, false]]}
+#             {"event": "tree_resync", "watch": "tree-1"}   (events were lost, list it again)
+#
+# Only the standard library is available here.
+import base64
+import ctypes
+import fcntl
+import json
+import os
+import pty
+import queue
+import select
+import signal
+import stat
+import struct
+import subprocess
+import sys
+import termios
+import threading
+import tty
+from concurrent.futures import ThreadPoolExecutor
+
+HEADER = struct.Struct(">I")
+
+stdin = sys.stdin.buffer
+stdout = sys.stdout.buffer
+write_lock = threading.Lock()
+
+
+def send_frame(message):
+    payload = json.dumps(message).encode()
+    with write_lock:
+        stdout.write(HEADER.pack(len(payload)) + payload)
+        stdout.flush()
+
+
+def read_frame():
+    header = stdin.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (size,) = HEADER.unpack(header)
+    return json.loads(stdin.read(size))
+
+
+def op_stat(path):
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return {"exists": False}
+
+    return {
+        "exists": True,
+        "is_directory": stat.S_ISDIR(info.st_mode),
+        "is_file": stat.S_ISREG(info.st_mode),
+        "is_symlink": stat.S_ISLNK(info.st_mode),
+        "size": info.st_size,
+        "mtime": info.st_mtime,
+        "permissions": oct(info.st_mode)[-3:],
+        "name": os.path.basename(path),
+    }
+
+
+def op_read(path, max_size=None):
+    size = os.path.getsize(path)
+    if max_size is not None and size > max_size:
+        return {"size": size, "too_large": True}
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    return {"size": len(data), "content": base64.b64encode(data).decode("ascii")}
+
+
+def op_write(path, content, mkdir=True):
+    if mkdir:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    data = base64.b64decode(content)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    return {"size": len(data)}
+
+
+def op_list(path, recursive=False, ignore=(), limit=None):
+    entries = []
+    ignore = set(ignore)
+
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in ignore)
+        for name in dirs + sorted(files):
+            full_path = os.path.join(root, name)
+            entries.append({"path": full_path, "is_directory": name in dirs})
+            if limit is not None and len(entries) >= limit:
+                return {"entries": entries, "truncated": True}
+
+        if not recursive:
+            break
+
+    return {"entries": entries, "truncated": False}
+
+
+def op_run(command, cwd=None, timeout=None):
+    process = subprocess.run(
+        ["bash", "-c", command],
+        cwd=cwd,
+        capture_output=True,
+        timeout=timeout,
+    )
+
+    return {
+        "stdout": base64.b64encode(process.stdout).decode("ascii"),
+        "stderr": base64.b64encode(process.stderr).decode("ascii"),
+        "exit_code": process.returncode,
+    }
+
+
+class HostedPty:
+    """A shell on a PTY, read and written by its own threads so keystrokes stay in order."""
+
+    def __init__(self, name, command, rows, cols):
+        self.name = name
+        self.pid, self.fd = pty.fork()
+
+        if self.pid == 0:
+            os.environ["TERM"] = "xterm-256color"
+            os.execvp(command[0], command)
+
+        set_winsize(self.fd, rows, cols)
+        tty.setraw(self.fd)
+        # Input the writer thread hasn't written yet. Unbounded: the request reader never
+        # waits on the shell, which may itself wait for a "pty_flow" behind that input
+        self.writes = queue.Queue()
+        # Cleared while the server's client is behind on output
+        self.reading = threading.Event()
+        self.reading.set()
+        threading.Thread(target=self.read_loop, daemon=True).start()
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    def read_loop(self):
+        while True:
+            self.reading.wait()
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError:
+                # EIO once the shell is gone
+                data = b""
+            if not data:
+                break
+            send_frame(
+                {
+                    "event": "pty_output",
+                    "pty": self.name,
+                    "data": base64.b64encode(data).decode("ascii"),
+                }
+            )
+
+        _, status = os.waitpid(self.pid, 0)
+        exit_code = (
+            os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        )
+        if PTYS.get(self.name) is self:
+            del PTYS[self.name]
+        # Input nobody will read
+        while True:
+            try:
+                self.writes.get_nowait()
+            except queue.Empty:
+                break
+        self.writes.put(None)
+        os.close(self.fd)
+        send_frame({"event": "pty_exit", "pty": self.name, "exit_code": exit_code})
+
+    def write_loop(self):
+        while True:
+            data = self.writes.get()
+            if data is None:
+                return
+            try:
+                while data:
+                    data = data[os.write(self.fd, data) :]
+            except OSError:
+                return
+
+
+PTYS = {}
+
+
+def set_winsize(fd, rows, cols):
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+
+def get_pty(name):
+    hosted = PTYS.get(name)
+    if hosted is None:
+        raise ValueError(f"No PTY named {name}")
+    return hosted
+
+
+class HostedExec:
+    """A command on pipes, each stream read by its own thread; the exit comes after all output."""
+
+    def __init__(self, name, command, cwd):
+        self.name = name
+        self.process = subprocess.Popen(
+            ["bash", "-c", command],
+            cwd=os.path.expanduser(cwd) if cwd else None,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # Its own process group, a kill takes its children too
+            start_new_session=True,
+        )
+
+        readers = [
+            threading.Thread(target=self.read_loop, args=(stream, pipe), daemon=True)
+            for stream, pipe in (
+                ("stdout", self.process.stdout),
+                ("stderr", self.process.stderr),
+            )
+        ]
+        for reader in readers:
+            reader.start()
+        threading.Thread(target=self.wait_loop, args=(readers,), daemon=True).start()
+
+    def read_loop(self, stream, pipe):
+        while True:
+            data = os.read(pipe.fileno(), 65536)
+            if not data:
+                break
+            send_frame(
+                {
+                    "event": "exec_output",
+                    "exec": self.name,
+                    "stream": stream,
+                    "data": base64.b64encode(data).decode("ascii"),
+                }
+            )
+        pipe.close()
+
+    def wait_loop(self, readers):
+        for reader in readers:
+            reader.join()
+        exit_code = self.process.wait()
+        if EXECS.get(self.name) is self:
+            del EXECS[self.name]
+        send_frame({"event": "exec_exit", "exec": self.name, "exit_code": exit_code})
+
+
+EXECS = {}
+
+
+def op_exec_start(exec, command, cwd=None):
+    if exec in EXECS:
+        raise ValueError(f"Exec {exec} is already running")
+
+    hosted = HostedExec(exec, command, cwd)
+    EXECS[exec] = hosted
+    return {"pid": hosted.process.pid}
+
+
+def op_exec_kill(exec):
+    hosted = EXECS.get(exec)
+    if hosted is not None:
+        try:
+            os.killpg(hosted.process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    return {}
+
+
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct("iIII")
+
+libc = ctypes.CDLL(None, use_errno=True)
+
+
+class TreeWatch:
+    """
+    Every directory under `root` watched with inotify. Directories named in `ignore`
+    (or hidden ones) are listed but neither entered nor watched.
+
+    Entries are [path relative to root, is_directory, ignored]; changes are the same
+    with "add" or "remove" in front.
+    """
+
+    def __init__(self, name, root, ignore):
+        self.name = name
+        self.root = root
+        self.ignore = set(ignore)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watch descriptor to the directory it watches, and back
+        self.directories = {}
+        self.descriptors = {}
+        self.closed = False
+
+    def start(self):
+        threading.Thread(target=self.read_loop, daemon=True).start()
+
+    def is_ignored(self, name):
+        return name in self.ignore or name.startswith(".")
+
+    def scan(self, relative):
+        """Watch `relative` and the directories below it, returning their entries."""
+        entries = []
+        pending = [relative]
+        while pending:
+            directory = pending.pop()
+            full_path = os.path.join(self.root, directory)
+
+            # Watched before listing, nothing created in between is missed
+            descriptor = libc.inotify_add_watch(
+                self.fd, os.fsencode(full_path), WATCH_MASK
+            )
+            if descriptor >= 0:
+                self.directories[descriptor] = directory
+                self.descriptors[directory] = descriptor
+
+            try:
+                scanned = sorted(os.scandir(full_path), key=lambda entry: entry.name)
+            except OSError:
+                continue
+
+            for entry in scanned:
+                path = os.path.join(directory, entry.name) if directory else entry.name
+                try:
+                    is_directory = entry.is_dir()
+                except OSError:
+                    is_directory = False
+                ignored = is_directory and self.is_ignored(entry.name)
+                entries.append([path, is_directory, ignored])
+                # Symlinked directories are shown, not entered (they may loop)
+                if is_directory and not ignored and not entry.is_symlink():
+                    pending.append(path)
+
+        return entries
+
+    def forget(self, relative):
+        """Stop watching `relative` and what is below it (removed or moved away)."""
+        prefix = relative + "/"
+        for directory in [
+            d for d in self.descriptors if d == relative or d.startswith(prefix)
+        ]:
+            descriptor = self.descriptors.pop(directory)
+            self.directories.pop(descriptor, None)
+            libc.inotify_rm_watch(self.fd, descriptor)
+
+    def read_loop(self):
+        while not self.closed:
+            # Wakes up now and then to notice a close
+            readable, _, _ = select.select([self.fd], [], [], 1.0)
+            if not readable or self.closed:
+                continue
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+
+            changes = []
+            resync = False
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                start = offset + INOTIFY_EVENT.size
+                name = os.fsdecode(data[start : start + length].rstrip(b"\0"))
+                offset = start + length
+
+                if mask & IN_Q_OVERFLOW:
+                    resync = True
+                    continue
+                if mask & IN_IGNORED:
+                    directory = self.directories.pop(descriptor, None)
+                    if directory is not None:
+                        self.descriptors.pop(directory, None)
+                    continue
+
+                directory = self.directories.get(descriptor)
+                if directory is None or not name:
+                    continue
+
+                path = os.path.join(directory, name) if directory else name
+                is_directory = bool(mask & IN_ISDIR)
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    ignored = is_directory and self.is_ignored(name)
+                    changes.append(["add", path, is_directory, ignored])
+                    if is_directory and not ignored:
+                        changes.extend(["add", *entry] for entry in self.scan(path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    changes.append(["remove", path, is_directory, False])
+                    if is_directory:
+                        self.forget(path)
+
+            if resync:
+                send_frame({"event": "tree_resync", "watch": self.name})
+            elif changes:
+                send_frame(
+                    {"event": "tree_change", "watch": self.name, "changes": changes}
+                )
+
+        os.close(self.fd)
+
+
+WATCHES = {}
+
+
+def op_tree_watch(watch, root, ignore=()):
+    if watch in WATCHES:
+        raise ValueError(f"Watch {watch} already exists")
+
+    tree_watch = TreeWatch(watch, root, ignore)
+    entries = tree_watch.scan("")
+    WATCHES[watch] = tree_watch
+    tree_watch.start()
+    return {"entries": entries}
+
+
+def op_tree_unwatch(watch):
+    tree_watch = WATCHES.pop(watch, None)
+    if tree_watch is not None:
+        tree_watch.closed = True
+    return {}
+
+
+def op_pty_open(pty, command=("bash",), rows=24, cols=80):
+    if pty in PTYS:
+        raise ValueError(f"PTY {pty} is already open")
+
+    hosted = HostedPty(pty, list(command), rows, cols)
+    PTYS[pty] = hosted
+    return {"pid": hosted.pid}
+
+
+def op_pty_write(pty, data):
+    # Runs on the request reader, the PTY's writer thread does the blocking part
+    get_pty(pty).writes.put(base64.b64decode(data))
+    return {}
+
+
+def op_pty_flow(pty, reading):
+    hosted = get_pty(pty)
+    if reading:
+        hosted.reading.set()
+    else:
+        hosted.reading.clear()
+    return {}
+
+
+def op_pty_resize(pty, rows, cols):
+    # The kernel sends SIGWINCH to the PTY's foreground process group
+    set_winsize(get_pty(pty).fd, rows, cols)
+    return {}
+
+
+def op_pty_close(pty):
+    hosted = PTYS.get(pty)
+    if hosted is not None:
+        os.kill(hosted.pid, signal.SIGHUP)
+        # A paused reader has to see the shell exit
+        hosted.reading.set()
+    return {}
+
+
+def run_operation(request):
+    """Run one {"op": ..., **params} request, returning its response without an id."""
+    params = dict(request)
+    operation = OPERATIONS.get(params.pop("op", None))
+
+    try:
+        if operation is None:
+            raise ValueError("Unknown operation")
+        return {"ok": True, "result": operation(**params)}
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def op_batch(requests):
+    # Sequential on purpose: later operations may depend on earlier ones (mkdir, then write)
+    return {"results": [run_operation(request) for request in requests]}
+
+
+OPERATIONS = {
+    "stat": op_stat,
+    "read": op_read,
+    "write": op_write,
+    "list": op_list,
+    "run": op_run,
+    "batch": op_batch,
+    "tree_watch": op_tree_watch,
+    "tree_unwatch": op_tree_unwatch,
+    "exec_start": op_exec_start,
+    "exec_kill": op_exec_kill,
+    "pty_open": op_pty_open,
+    "pty_write": op_pty_write,
+    "pty_flow": op_pty_flow,
+    "pty_resize": op_pty_resize,
+    "pty_close": op_pty_close,
+}
+
+# Served in arrival order on the reader instead of the pool
+INLINE_OPERATIONS = {"pty_write", "pty_flow"}
+# As long as the command they run; served by their own workers so the quick operations
+# (stat, read, write, list...) never wait behind them. At most 8 run at once, the
+# others wait for one of those to finish
+SLOW_OPERATIONS = {"run"}
+
+
+def is_slow(request):
+    if request.get("op") == "batch":
+        return any(is_slow(operation) for operation in request.get("requests", ()))
+    return request.get("op") in SLOW_OPERATIONS
+
+
+def handle(request):
+    request_id = request.pop("id", None)
+    response = run_operation(request)
+    if request_id is not None:
+        send_frame({"id": request_id, **response})
+
+
+if __name__ == "__main__":
+    with ThreadPoolExecutor(max_workers=8) as quick, ThreadPoolExecutor(
+        max_workers=8
+    ) as slow:
+        while True:
+            request = read_frame()
+            if request is None:
+                break
+            if request.get("op") in INLINE_OPERATIONS:
+                handle(request)
+            elif is_slow(request):
+                slow.submit(handle, request)
+            else:
+                quick.submit(handle, request)
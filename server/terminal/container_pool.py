@@ -0,0 +1,298 @@
+# container_pool.py - Pool of pre-started containers handed to new users on first connect
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from terminal.capacity import CapacityManager
+from terminal.docker_client import DockerAPIClient
+from terminal.container_state import ContainerStateCache
+from terminal.exec_agent import ExecAgent
+from terminal.image_builder import get_image_builder
+from terminal.metrics import LatencyStats
+from terminal.terminal_config import TerminalConfig
+
+# Capacity slots held by warm containers, until handed over to a user
+POOL_KEY_PREFIX = "pool:"
+
+
+def user_container_config(image_ref: str, volume_name: str) -> Dict:
+    """Equivalent of `docker run -d -i --rm -v <volume>:/home/termuser <image> tail -f /dev/null`."""
+    return {
+        "Image": image_ref,
+        "Cmd": ["tail", "-f", "/dev/null"],
+        "OpenStdin": True,
+        "HostConfig": {
+            "AutoRemove": True,
+            "Binds": [f"{volume_name}:/home/termuser"],
+            # Hard limit that the capacity manager's memory budget relies on
+            "Memory": TerminalConfig.CONTAINER_MEMORY_MB * 1024 * 1024,
+        },
+    }
+
+
+class WarmContainer:
+    def __init__(self, container_id: Optional[str], volume_name: str):
+        self.container_id = container_id
+        self.volume_name = volume_name
+        self.agent: Optional[ExecAgent] = None
+        self.lsp_process: Optional[asyncio.subprocess.Process] = None
+        self.ready_at = time.time()
+
+    @property
+    def capacity_key(self) -> str:
+        return f"{POOL_KEY_PREFIX}{self.volume_name}"
+
+
+class VolumeBindings:
+    """
+    Users' home volumes and the Docker node that holds each of them (user id ->
+    {"volume", "node"}). Volumes live on the daemon that created them, so a returning
+    user is placed back on that node.
+    """
+
+    def __init__(self, path: str = TerminalConfig.POOL_BINDINGS_PATH):
+        self.path = path
+        self._bindings: Dict[str, Dict[str, Optional[str]]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Optional[str]]]:
+        try:
+            with open(self.path, "r") as f:
+                bindings = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        # Files written before nodes were recorded map user id -> volume name
+        return {
+            user_id: (
+                binding
+                if isinstance(binding, dict)
+                else {"volume": binding, "node": None}
+            )
+            for user_id, binding in bindings.items()
+        }
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._bindings, f)
+        os.replace(tmp_path, self.path)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._bindings
+
+    def bind(self, user_id: str, volume_name: str, node: str) -> None:
+        binding = {"volume": volume_name, "node": node}
+        if self._bindings.get(user_id) != binding:
+            self._bindings[user_id] = binding
+            self._save()
+
+    def volume_for(self, user_id: str) -> str:
+        """Name of the volume holding this user's home directory."""
+        binding = self._bindings.get(user_id)
+        return binding["volume"] if binding else user_id
+
+    def node_for(self, user_id: str) -> Optional[str]:
+        """Endpoint of the node holding the user's volume, None if it isn't known."""
+        binding = self._bindings.get(user_id)
+        return binding["node"] if binding else None
+
+
+volume_bindings = VolumeBindings()
+
+
+class ContainerPool:
+    """
+    Keeps `size` containers started and configured ahead of time (exec agent and pylsp
+    already running) on one daemon, so a new user skips the whole cold start.
+
+    A running container can't get a new mount, so each warm container is created on its
+    own fresh volume and that volume becomes the user's volume when it's handed over. The
+    binding is persisted so later cold starts for that user mount the same volume. Users
+    that already own a volume always go through a cold start.
+    """
+
+    def __init__(
+        self,
+        client: DockerAPIClient,
+        state: ContainerStateCache,
+        capacity: CapacityManager,
+        size: int = TerminalConfig.WARM_POOL_SIZE,
+    ):
+        self.client = client
+        self.state = state
+        self.capacity = capacity
+        self.size = size
+        self.ready: List[WarmContainer] = []
+        self._starting = 0
+        self._refill_event = asyncio.Event()
+        self._refill_task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses: Dict[str, int] = {}
+        self.warmup_time = LatencyStats()
+        self.time_to_first_prompt = {"warm": LatencyStats(), "cold": LatencyStats()}
+
+    # ------------------------------------------------------------- lifecycle
+
+    async def start(self) -> None:
+        if self.size <= 0 or self._refill_task:
+            return
+
+        self._refill_task = asyncio.create_task(self._refill_loop())
+        self._refill_event.set()
+
+    async def stop(self) -> None:
+        if self._refill_task:
+            self._refill_task.cancel()
+            self._refill_task = None
+
+        while self.ready:
+            await self._discard(self.ready.pop())
+
+    async def _refill_loop(self) -> None:
+        while True:
+            await self._refill_event.wait()
+            self._refill_event.clear()
+
+            while len(self.ready) + self._starting < self.size:
+                volume_name = f"xoblas_pool_{uuid.uuid4().hex[:12]}"
+                capacity_key = f"{POOL_KEY_PREFIX}{volume_name}"
+
+                # Warm containers only use spare capacity, never a queued user's slot
+                if not self.capacity.try_acquire(capacity_key):
+                    break
+
+                self._starting += 1
+                warm = WarmContainer(None, volume_name)
+                try:
+                    await self._create_warm_container(warm)
+                    self.ready.append(warm)
+                except asyncio.CancelledError:
+                    await self._discard(warm)
+                    raise
+                except Exception as e:
+                    print(f"Failed to warm up a container: {e}")
+                    # Whatever was created goes, the slot with it
+                    await self._discard(warm)
+                    await asyncio.sleep(5.0)
+                finally:
+                    self._starting -= 1
+
+    async def _create_warm_container(self, warm: WarmContainer) -> None:
+        """Create, start and pre-configure the container of `warm`, filling it in as
+        it goes so a failure part way can be discarded."""
+        started = time.perf_counter()
+        volume_name = warm.volume_name
+
+        # Shares the boot build, so warming up never starts a second build
+        image_ref = await get_image_builder().ensure_built(self.client)
+
+        await self.client.create_volume(volume_name)
+        container_id = warm.container_id = await self.client.create_container(
+            user_container_config(image_ref, volume_name)
+        )
+        await self.client.start_container(container_id)
+        self.state.set_state(container_id, True)
+
+        # Pre-configure: exec agent and pylsp are already up when the user arrives
+        warm.agent = ExecAgent.for_container(container_id, self.client.cli())
+        await warm.agent.start()
+
+        warm.lsp_process = await asyncio.create_subprocess_exec(
+            *self.client.cli("exec", "-i", container_id, "pylsp"),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        warm.ready_at = time.time()
+        self.warmup_time.record(time.perf_counter() - started)
+
+    async def _discard(self, warm: WarmContainer) -> None:
+        if warm.agent:
+            await warm.agent.close()
+        if warm.lsp_process and warm.lsp_process.returncode is None:
+            warm.lsp_process.kill()
+
+        try:
+            if warm.container_id:
+                await self.client.stop_container(warm.container_id, timeout=1)
+                await self.client.remove_container(warm.container_id, force=True)
+            # Never handed to a user, nothing on it to keep
+            await self.client.remove_volume(warm.volume_name)
+        except Exception as e:
+            print(f"Error discarding warm container {warm.container_id}: {e}")
+
+        self.capacity.release(warm.capacity_key)
+
+    def request_refill(self) -> None:
+        """Capacity was freed, top the pool back up if it's short."""
+        if self._refill_task:
+            self._refill_event.set()
+
+    def is_evictable(self, capacity_key: str) -> bool:
+        return any(warm.capacity_key == capacity_key for warm in self.ready)
+
+    async def evict(self, capacity_key: str) -> None:
+        """Give a warm container's capacity back to users waiting for a slot."""
+        for warm in self.ready:
+            if warm.capacity_key == capacity_key:
+                self.ready.remove(warm)
+                await self._discard(warm)
+                return
+
+    # ---------------------------------------------------------------- handoff
+
+    def _record_miss(self, reason: str) -> None:
+        self.misses[reason] = self.misses.get(reason, 0) + 1
+
+    async def acquire(self, user_id: str) -> Optional[WarmContainer]:
+        """Hand a warm container to a new user, or None if they need a cold start."""
+        if self.size <= 0:
+            return None
+
+        if user_id in volume_bindings or await self.client.inspect_volume(user_id):
+            self._record_miss("existing_volume")
+            return None
+
+        while self.ready:
+            warm = self.ready.pop(0)
+            if await self.state.is_running(warm.container_id):
+                break
+            await self._discard(warm)
+        else:
+            self._record_miss("pool_empty")
+            self._refill_event.set()
+            return None
+
+        volume_bindings.bind(user_id, warm.volume_name, self.client.endpoint)
+        self.capacity.transfer(warm.capacity_key, user_id)
+
+        self.hits += 1
+        self._refill_event.set()
+        return warm
+
+    def record_first_prompt(self, seconds: float, warm: bool) -> None:
+        self.time_to_first_prompt["warm" if warm else "cold"].record(seconds)
+
+    def get_metrics(self) -> Dict:
+        misses = sum(self.misses.values())
+        requests = self.hits + misses
+
+        return {
+            "size": self.size,
+            "ready": len(self.ready),
+            "starting": self._starting,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else None,
+            "warmup_time": self.warmup_time.summary(),
+            "time_to_first_prompt": {
+                kind: stats.summary()
+                for kind, stats in self.time_to_first_prompt.items()
+            },
+        }
+
@@ -0,0 +1,154 @@
+# container_state.py - In-memory container liveness fed by the Docker events stream
+import asyncio
+import json
+import time
+from typing import Dict, Optional, Tuple
+
+from terminal.docker_client import DockerAPIClient
+from terminal.terminal_config import TerminalConfig
+
+# Event actions that change whether a container is running
+RUNNING_ACTIONS = {"start", "restart", "unpause"}
+STOPPED_ACTIONS = {"die", "stop", "oom", "destroy"}
+
+
+class ContainerStateCache:
+    """
+    One subscription to a daemon's `/events` keeps a table of container states up to date, so a
+    liveness check is a dict lookup. Containers the stream hasn't reported on yet, or any
+    container while the stream is disconnected, fall back to an async inspect whose
+    result is cached for a short TTL.
+    """
+
+    def __init__(
+        self, client: DockerAPIClient, ttl: float = TerminalConfig.CONTAINER_STATE_TTL
+    ):
+        self.client = client
+        self.ttl = ttl
+        # container id -> (running, paused, updated_at)
+        self._states: Dict[str, Tuple[bool, bool, float]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._events_task: Optional[asyncio.Task] = None
+        self._last_event_at: Optional[float] = None
+        self.connected = False
+
+    async def start(self) -> None:
+        if self._events_task is None:
+            self._events_task = asyncio.create_task(self._watch_events())
+
+    async def stop(self) -> None:
+        if self._events_task:
+            self._events_task.cancel()
+            self._events_task = None
+        self.connected = False
+
+    def set_state(
+        self, container_id: str, running: bool, paused: bool = False
+    ) -> None:
+        self._states[container_id] = (running, paused, time.monotonic())
+
+    def forget(self, container_id: str) -> None:
+        self._states.pop(container_id, None)
+
+    # ---------------------------------------------------------------- events
+
+    async def _watch_events(self) -> None:
+        backoff = 0.5
+
+        def subscribed() -> None:
+            nonlocal backoff
+            # Every change from now on arrives as an event
+            self.connected = True
+            backoff = 0.5
+
+        while True:
+            try:
+                buffer = b""
+                params = {"filters": json.dumps({"type": ["container"]})}
+                if self._last_event_at is not None:
+                    # Replay whatever happened while we were disconnected
+                    params["since"] = int(self._last_event_at)
+
+                async for chunk in self.client.stream(
+                    "GET", "/events", params, on_open=subscribed
+                ):
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            self._apply_event(json.loads(line))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Docker events stream error: {e}")
+
+            # Anything cached while disconnected can be stale, fall back to TTL checks
+            self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 10.0)
+
+    def _apply_event(self, event: Dict) -> None:
+        action = event.get("Action") or event.get("status") or ""
+        container_id = event.get("id") or event.get("Actor", {}).get("ID")
+        if not container_id:
+            return
+
+        self._last_event_at = event.get("time", time.time())
+
+        # Actions may carry a suffix, e.g. "exec_start: bash"
+        action = action.split(":")[0]
+
+        if action == "destroy":
+            self.forget(container_id)
+        elif action in RUNNING_ACTIONS:
+            self.set_state(container_id, True)
+        elif action == "pause":
+            self.set_state(container_id, True, paused=True)
+        elif action in STOPPED_ACTIONS:
+            self.set_state(container_id, False)
+
+    # ---------------------------------------------------------------- lookup
+
+    def _cached(self, container_id: str) -> Optional[Tuple[bool, bool, float]]:
+        entry = self._states.get(container_id)
+        if entry is None:
+            return None
+
+        # While subscribed, every change arrives as an event so entries never expire
+        if self.connected or time.monotonic() - entry[2] < self.ttl:
+            return entry
+
+        return None
+
+    async def _refresh(self, container_id: str) -> Tuple[bool, bool, float]:
+        """Inspect the container, sharing one request between concurrent callers."""
+        future = self._inflight.get(container_id)
+        if future is not None:
+            return await future
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[container_id] = future
+        try:
+            info = await self.client.inspect_container(container_id)
+            state = (info or {}).get("State", {})
+            self.set_state(
+                container_id, bool(state.get("Running")), bool(state.get("Paused"))
+            )
+            future.set_result(self._states[container_id])
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            del self._inflight[container_id]
+
+        return await future
+
+    async def get_state(self, container_id: str) -> Tuple[bool, bool]:
+        """Return (running, paused) for a container."""
+        entry = self._cached(container_id) or await self._refresh(container_id)
+        return entry[0], entry[1]
+
+    async def is_running(self, container_id: str) -> bool:
+        running, _ = await self.get_state(container_id)
+        return running
+
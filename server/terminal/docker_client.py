@@ -0,0 +1,398 @@
+# docker_client.py - Async Docker Engine API client over a daemon socket (unix or tcp)
+import asyncio
+import json
+import struct
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode, urlsplit
+
+from terminal.terminal_config import TerminalConfig
+
+
+class DockerAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class _Response:
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        if not self.body:
+            return None
+        return json.loads(self.body)
+
+
+def normalize_endpoint(endpoint: str) -> str:
+    """`/path/docker.sock` -> `unix:///path/docker.sock`, URLs are kept as they are."""
+    return endpoint if "://" in endpoint else f"unix://{endpoint}"
+
+
+class DockerAPIClient:
+    """
+    Minimal HTTP/1.1 client for the Docker Engine API.
+
+    Connections to the daemon socket are kept alive and reused, so a call costs one
+    request/response on an already open socket instead of forking the `docker` CLI.
+    `endpoint` is a `unix://` socket or a `tcp://host:port` daemon, like `docker -H`.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = TerminalConfig.DOCKER_SOCKET_PATH,
+        api_version: str = TerminalConfig.DOCKER_API_VERSION,
+        max_connections: int = TerminalConfig.DOCKER_API_POOL_SIZE,
+    ):
+        self.endpoint = normalize_endpoint(endpoint)
+        url = urlsplit(self.endpoint)
+        if url.scheme == "unix":
+            self.socket_path = url.path
+        elif url.scheme == "tcp":
+            self.host, self.port = url.hostname, url.port or 2375
+        else:
+            raise ValueError(f"Unsupported Docker endpoint: {endpoint}")
+        self.is_local = url.scheme == "unix"
+        self.api_version = api_version
+        self.max_connections = max_connections
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        # Created lazily so the client can be instantiated at import time
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    # ------------------------------------------------------------------ pool
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        return self._slots
+
+    async def _open_connection(self):
+        if self.is_local:
+            return await asyncio.open_unix_connection(self.socket_path)
+        return await asyncio.open_connection(self.host, self.port)
+
+    def cli(self, *args: str) -> List[str]:
+        """`docker` CLI command line targeting this client's daemon."""
+        return ["docker", "-H", self.endpoint, *args]
+
+    async def _acquire(self) -> Tuple[Tuple, bool]:
+        """Return a connection and whether it was reused from the idle pool."""
+        await self._get_slots().acquire()
+
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return (reader, writer), True
+            writer.close()
+
+        try:
+            return await self._open_connection(), False
+        except Exception:
+            self._get_slots().release()
+            raise
+
+    def _release(self, conn: Tuple, reusable: bool) -> None:
+        reader, writer = conn
+        if reusable and not writer.is_closing():
+            self._idle.append(conn)
+        else:
+            writer.close()
+        self._get_slots().release()
+
+    async def close(self) -> None:
+        """Close every idle connection."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    # ------------------------------------------------------------------ http
+
+    def _build_request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Any = None,
+    ) -> bytes:
+        target = f"/{self.api_version}{path}"
+        if params:
+            target += "?" + urlencode(params)
+
+        payload = b"" if body is None else json.dumps(body).encode()
+        head = (
+            f"{method} {target} HTTP/1.1\r\n"
+            "Host: docker\r\n"
+            "Connection: keep-alive\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+        )
+        if body is not None:
+            head += "Content-Type: application/json\r\n"
+
+        return (head + "\r\n").encode() + payload
+
+    async def _read_head(self, reader: asyncio.StreamReader) -> Tuple[int, Dict]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Docker daemon closed the connection")
+
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        return status, headers
+
+    async def _iter_chunks(
+        self, reader: asyncio.StreamReader
+    ) -> AsyncGenerator[bytes, None]:
+        """Yield the pieces of a chunked transfer-encoded body."""
+        while True:
+            size_line = await reader.readline()
+            if not size_line:
+                return
+            size = int(size_line.split(b";")[0].strip(), 16)
+            if size == 0:
+                # Consume the trailer terminator
+                await reader.readline()
+                return
+            chunk = await reader.readexactly(size)
+            await reader.readexactly(2)
+            yield chunk
+
+    async def _read_body(
+        self, reader: asyncio.StreamReader, status: int, headers: Dict
+    ) -> Tuple[bytes, bool]:
+        """Read a full response body; also report whether the connection can be reused."""
+        if status in (101, 204, 304):
+            return b"", status != 101
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = [chunk async for chunk in self._iter_chunks(reader)]
+            return b"".join(parts), True
+
+        if "content-length" in headers:
+            return await reader.readexactly(int(headers["content-length"])), True
+
+        # Raw streams (exec attach) run until the daemon closes the socket
+        return await reader.read(), False
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Any = None,
+    ) -> _Response:
+        """Send a request on a pooled connection and return the full response."""
+        data = self._build_request(method, path, params, body)
+
+        # A reused keep-alive connection may have been closed by the daemon in the
+        # meantime, in that case retry once on a fresh connection.
+        for attempt in range(2):
+            conn, reused = await self._acquire()
+            reader, writer = conn
+            reusable = False
+            try:
+                writer.write(data)
+                await writer.drain()
+                status, headers = await self._read_head(reader)
+                body_bytes, reusable = await self._read_body(reader, status, headers)
+                if headers.get("connection", "").lower() == "close":
+                    reusable = False
+                return _Response(status, headers, body_bytes)
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                if not reused or attempt == 1:
+                    raise
+            finally:
+                self._release(conn, reusable)
+
+    async def request_json(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Any = None,
+        allow_404: bool = False,
+    ) -> Any:
+        response = await self.request(method, path, params, body)
+
+        if response.status == 404 and allow_404:
+            return None
+
+        if response.status >= 400:
+            try:
+                message = (response.json() or {}).get("message", "")
+            except ValueError:
+                message = response.body.decode(errors="replace")
+            raise DockerAPIError(response.status, message)
+
+        return response.json()
+
+    async def stream(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        on_open: Optional[Callable[[], None]] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """Open a dedicated connection and yield a long-running response body as it arrives.
+
+        `on_open` is called once the daemon accepted the request, the body may not start
+        for a while (a quiet events stream).
+        """
+        reader, writer = await self._open_connection()
+        try:
+            writer.write(self._build_request(method, path, params))
+            await writer.drain()
+
+            status, headers = await self._read_head(reader)
+            if status >= 400:
+                body, _ = await self._read_body(reader, status, headers)
+                raise DockerAPIError(status, body.decode(errors="replace"))
+            if on_open is not None:
+                on_open()
+
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                async for chunk in self._iter_chunks(reader):
+                    yield chunk
+            else:
+                while chunk := await reader.read(65536):
+                    yield chunk
+        finally:
+            writer.close()
+
+    # ------------------------------------------------------------ containers
+
+    async def ping(self) -> bool:
+        response = await self.request("GET", "/_ping")
+        return response.status == 200
+
+    async def inspect_container(self, container_id: str) -> Optional[Dict]:
+        return await self.request_json(
+            "GET", f"/containers/{quote(container_id)}/json", allow_404=True
+        )
+
+    async def inspect_image(self, reference: str) -> Optional[Dict]:
+        return await self.request_json(
+            "GET", f"/images/{quote(reference, safe=':')}/json", allow_404=True
+        )
+
+    async def inspect_volume(self, name: str) -> Optional[Dict]:
+        return await self.request_json(
+            "GET", f"/volumes/{quote(name)}", allow_404=True
+        )
+
+    async def create_volume(self, name: str) -> Dict:
+        return await self.request_json("POST", "/volumes/create", body={"Name": name})
+
+    async def remove_volume(self, name: str, attempts: int = 5) -> None:
+        """Remove a volume, waiting for a container being auto-removed to let go of it."""
+        for attempt in range(attempts):
+            response = await self.request("DELETE", f"/volumes/{quote(name)}")
+            # 409: still in use
+            if response.status != 409 or attempt == attempts - 1:
+                break
+            await asyncio.sleep(0.2)
+
+        # 404: already gone
+        if response.status >= 400 and response.status != 404:
+            raise DockerAPIError(response.status, response.body.decode(errors="replace"))
+
+    async def create_container(self, config: Dict, name: Optional[str] = None) -> str:
+        params = {"name": name} if name else None
+        result = await self.request_json(
+            "POST", "/containers/create", params=params, body=config
+        )
+        return result["Id"]
+
+    async def start_container(self, container_id: str) -> None:
+        # 304 means the container was already started
+        await self.request_json("POST", f"/containers/{quote(container_id)}/start")
+
+    async def stop_container(self, container_id: str, timeout: int = 10) -> None:
+        await self.request_json(
+            "POST",
+            f"/containers/{quote(container_id)}/stop",
+            params={"t": timeout},
+            allow_404=True,
+        )
+
+    async def pause_container(self, container_id: str) -> None:
+        await self.request_json("POST", f"/containers/{quote(container_id)}/pause")
+
+    async def unpause_container(self, container_id: str) -> None:
+        await self.request_json("POST", f"/containers/{quote(container_id)}/unpause")
+
+    async def remove_container(self, container_id: str, force: bool = False) -> None:
+        response = await self.request(
+            "DELETE",
+            f"/containers/{quote(container_id)}",
+            params={"force": str(force).lower()},
+        )
+        # 404: already gone, 409: removal already in progress (AutoRemove)
+        if response.status >= 400 and response.status not in (404, 409):
+            raise DockerAPIError(response.status, response.body.decode(errors="replace"))
+
+    # ------------------------------------------------------------------ exec
+
+    @staticmethod
+    def demux_stream(raw: bytes) -> Tuple[bytes, bytes]:
+        """Split a multiplexed (non-TTY) attach stream into stdout and stderr."""
+        stdout, stderr = [], []
+        offset = 0
+
+        while offset + 8 <= len(raw):
+            stream_type, size = struct.unpack(">BxxxL", raw[offset : offset + 8])
+            offset += 8
+            payload = raw[offset : offset + size]
+            offset += size
+            (stderr if stream_type == 2 else stdout).append(payload)
+
+        return b"".join(stdout), b"".join(stderr)
+
+    async def exec_create(
+        self, container_id: str, cmd: List[str], tty: bool = False, **options
+    ) -> str:
+        config = {
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": tty,
+            "Cmd": cmd,
+            **options,
+        }
+        result = await self.request_json(
+            "POST", f"/containers/{quote(container_id)}/exec", body=config
+        )
+        return result["Id"]
+
+    async def exec_inspect(self, exec_id: str) -> Dict:
+        return await self.request_json("GET", f"/exec/{exec_id}/json")
+
+    async def exec_run(
+        self, container_id: str, cmd: List[str]
+    ) -> Tuple[bytes, bytes, Optional[int]]:
+        """Run a command to completion and return (stdout, stderr, exit_code).
+
+        The attach stream is read whole before it's split, so this is for commands with
+        bounded output; DockerManager.stream_command streams the others.
+        """
+        exec_id = await self.exec_create(container_id, cmd)
+
+        response = await self.request(
+            "POST", f"/exec/{exec_id}/start", body={"Detach": False, "Tty": False}
+        )
+        if response.status >= 400:
+            raise DockerAPIError(response.status, response.body.decode(errors="replace"))
+
+        stdout, stderr = self.demux_stream(response.body)
+        exit_code = (await self.exec_inspect(exec_id)).get("ExitCode")
+
+        return stdout, stderr, exit_code
+
@@ -1,13 +1,45 @@
-from typing import Dict, Set
+from typing import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 import asyncio
-import subprocess
+import base64
+import shlex
+import time
 from terminal.terminal_config import TerminalConfig
+from terminal.exec_agent import ExecAgent, ExecAgentError
+from terminal.agent_pty import AgentPtyController
+from terminal.pty_controller import PtyController
+from terminal.image_builder import ImageBuilder, get_image_builder
+from terminal.container_pool import volume_bindings, user_container_config, WarmContainer
+from terminal.placement import DockerNode, placement
+from terminal.metrics import LatencyStats
+from terminal.tracing import tracer
+from terminal.workspace_tree import WorkspaceTree
 
 docker_sessions: Dict[str, "DockerManager"] = {}
-# Add a global lock for container startup per user
-container_startup_locks: Dict[str, asyncio.Lock] = {}
 # Track active WebSocket connections per user
 active_connections: Dict[str, Set[str]] = {}
+# Pending idle policy (pause, then stop) per user without connections
+idle_tasks: Dict[str, asyncio.Task] = {}
+# Called with the user id before a session's container is stopped (LSP, terminals...)
+session_cleanup_hooks: List[Callable[[str], Awaitable[None]]] = []
+
+# Requests sent to containers (agent requests or docker execs) and commands they carried
+exec_metrics = {"round_trips": 0, "commands": 0}
+
+hibernation_metrics = {
+    "pause": LatencyStats(),
+    "resume": LatencyStats(),
+    "stop": LatencyStats(),
+    "paused_for": LatencyStats(),
+}
 
 
 class DockerManager:
@@ -19,34 +51,34 @@ class DockerManager:
         self.image_name = config.DEFAULT_IMAGE_NAME
         self.container_name = f"{config.DEFAULT_CONTAINER_NAME}_{user_id}"
         self.dockerfile_path = config.DEFAULT_DOCKERFILE_PATH
-        # Add instance-level startup state tracking
-        self._startup_in_progress = False
+        # Docker daemon this user is placed on, every container call goes through it
+        self.node: DockerNode = placement.node_for(user_id)
+        self.client = self.node.client
+        # Startup shared by every concurrent caller (terminal, LSP, filesystem sockets)
+        self._startup_task: Optional[asyncio.Task] = None
+        # Told the admission queue position while waiting for capacity
+        self._queue_listeners: List[Callable[[int], Awaitable[None]]] = []
+        # Long-lived in-container agent, started on first use
+        self._agent: Optional[ExecAgent] = None
+        self._agent_lock = asyncio.Lock()
+        self._agent_unavailable = False
+        # Index of the workspace served to `xoblas`, built on first use
+        self._workspace_tree: Optional[WorkspaceTree] = None
+        self._workspace_tree_lock = asyncio.Lock()
+        # Set when the container came from the warm pool
+        self.from_warm_pool = False
+        self.warm_lsp_process: Optional[asyncio.subprocess.Process] = None
+        # Set while the container is paused by the idle policy
+        self.paused_at: Optional[float] = None
+
+    @property
+    def image_builder(self) -> ImageBuilder:
+        return get_image_builder(self.image_name, self.dockerfile_path)
 
     async def build_image(self) -> str:
         """Build Docker image from Dockerfile if not already built."""
-        image_tag = f"{self.image_name}:latest"
-
-        if await self.is_image_built():
-            return image_tag
-
-        process = await asyncio.create_subprocess_exec(
-            "docker",
-            "build",
-            "-t",
-            image_tag,
-            "-f",
-            self.dockerfile_path,
-            ".",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-
-        await process.communicate()
-
-        if process.returncode != 0:
-            raise Exception("Failed to build Docker image")
-
-        return image_tag
+        # Normally already done at boot, this only waits if that build is still running
+        return await self.image_builder.ensure_built(self.client)
 
     @classmethod
     def get_or_create(cls, user_id: str, config: TerminalConfig) -> "DockerManager":
@@ -58,22 +90,30 @@ class DockerManager:
         manager = cls(user_id, config)
         docker_sessions[user_id] = manager
 
-        # Create a startup lock for this user if it doesn't exist
-        if user_id not in container_startup_locks:
-            container_startup_locks[user_id] = asyncio.Lock()
-
         # Initialize connection tracking for this user
         if user_id not in active_connections:
             active_connections[user_id] = set()
 
         return manager
 
+    @classmethod
+    def add_cleanup_hook(cls, hook: Callable[[str], Awaitable[None]]):
+        """Run `hook(user_id)` before a user's container is stopped for good."""
+        session_cleanup_hooks.append(hook)
+
     @classmethod
     def register_connection(cls, user_id: str, connection_id: str):
         """Register a new WebSocket connection for this user"""
         if user_id not in active_connections:
             active_connections[user_id] = set()
         active_connections[user_id].add(connection_id)
+        cls._touch(user_id)
+
+        # The user is back, cancel any pending pause/stop
+        idle_task = idle_tasks.pop(user_id, None)
+        if idle_task is not None:
+            idle_task.cancel()
+
         print(
             f"Registered connection {connection_id} for user {user_id}. Active: {len(active_connections[user_id])}"
         )
@@ -83,28 +123,56 @@ class DockerManager:
         """Unregister a WebSocket connection for this user"""
         if user_id in active_connections:
             active_connections[user_id].discard(connection_id)
+            cls._touch(user_id)
             print(
                 f"Unregistered connection {connection_id} for user {user_id}. Active: {len(active_connections[user_id])}"
             )
 
-            # If no more connections, clean up the Docker session
-            if len(active_connections[user_id]) == 0:
+            # If no more connections, start the idle policy for the Docker session
+            if len(active_connections[user_id]) == 0 and user_id not in idle_tasks:
                 print(
-                    f"No more active connections for user {user_id}. Scheduling cleanup."
+                    f"No more active connections for user {user_id}. Scheduling hibernation."
                 )
-                # Schedule cleanup with a delay to allow for quick reconnections (like refresh)
-                asyncio.create_task(cls._delayed_cleanup(user_id))
+                idle_tasks[user_id] = asyncio.create_task(cls._idle_policy(user_id))
+
+                # Someone may be queued for exactly the capacity this session holds
+                manager = docker_sessions.get(user_id)
+                if manager is not None and manager.node.capacity.queue:
+                    asyncio.create_task(manager.node.capacity.make_room())
+
+    @classmethod
+    def _touch(cls, user_id: str):
+        manager = docker_sessions.get(user_id)
+        if manager is not None:
+            manager.node.capacity.touch(user_id)
+
+    @classmethod
+    def _is_idle(cls, user_id: str) -> bool:
+        return user_id in active_connections and len(active_connections[user_id]) == 0
 
     @classmethod
-    async def _delayed_cleanup(cls, user_id: str):
-        """Clean up Docker session after a delay if no connections are re-established"""
-        # Wait a bit to see if user reconnects (common during page refresh)
-        await asyncio.sleep(5.0)  # 5 second grace period
+    async def _idle_policy(cls, user_id: str):
+        """Pause the container after a short idle period and stop it after a long one"""
+        try:
+            # Quick reconnections (like a page refresh) never get past this first wait
+            await asyncio.sleep(TerminalConfig.IDLE_PAUSE_AFTER)
+
+            manager = docker_sessions.get(user_id)
+            if cls._is_idle(user_id) and manager is not None:
+                await manager.pause_container()
+
+            await asyncio.sleep(
+                max(0.0, TerminalConfig.IDLE_STOP_AFTER - TerminalConfig.IDLE_PAUSE_AFTER)
+            )
 
-        # Double-check if there are still no active connections
-        if user_id in active_connections and len(active_connections[user_id]) == 0:
-            print(f"Performing delayed cleanup for user {user_id}")
-            await cls._cleanup_user_session(user_id)
+            if cls._is_idle(user_id):
+                print(f"Performing idle cleanup for user {user_id}")
+                await cls._cleanup_user_session(user_id)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if idle_tasks.get(user_id) is asyncio.current_task():
+                del idle_tasks[user_id]
 
     @classmethod
     async def _cleanup_user_session(cls, user_id: str):
@@ -113,11 +181,20 @@ class DockerManager:
         if user_id in active_connections:
             del active_connections[user_id]
 
+        # Let long-lived processes (pylsp, PTY shells) shut down first
+        for hook in session_cleanup_hooks:
+            try:
+                await hook(user_id)
+            except Exception as e:
+                print(f"Error running cleanup hook for user {user_id}: {e}")
+
         # Stop and remove container, then remove from sessions
         if user_id in docker_sessions:
             docker_manager = docker_sessions[user_id]
+            started = time.perf_counter()
             try:
                 await docker_manager.stop_container()
+                hibernation_metrics["stop"].record(time.perf_counter() - started)
             except Exception as e:
                 print(f"Error stopping container for user {user_id}: {e}")
 
@@ -125,128 +202,427 @@ class DockerManager:
             del docker_sessions[user_id]
             print(f"Cleaned up Docker session for user {user_id}")
 
-        # Clean up startup locks
-        if user_id in container_startup_locks:
-            del container_startup_locks[user_id]
+        placement.release(user_id)
 
     async def is_image_built(self) -> bool:
         """Check if the Docker image already exists."""
-        process = await asyncio.create_subprocess_exec(
-            "docker", "images", self.image_name, stdout=asyncio.subprocess.PIPE
-        )
+        return await self.image_builder.is_built(self.client)
 
-        stdout, _ = await process.communicate()
-        return self.image_name in stdout.decode()
-
-    async def ensure_container_running(self) -> str:
+    async def ensure_container_running(
+        self, on_queue_position: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> str:
         """Ensure container is running with proper synchronization to prevent multiple containers."""
-
-        # Get or create the startup lock for this user
-        if self.user_id not in container_startup_locks:
-            container_startup_locks[self.user_id] = asyncio.Lock()
-
-        startup_lock = container_startup_locks[self.user_id]
-
-        async with startup_lock:
-            # Double-check if container is running after acquiring lock
-            if self.is_container_running():
-                return self.container_id
-
-            # If startup is already in progress, wait for it
-            if self._startup_in_progress:
-                # Wait a bit and check again
-                while self._startup_in_progress:
-                    await asyncio.sleep(0.1)
-                    if self.is_container_running():
-                        return self.container_id
-
-            # Start the container
-            self._startup_in_progress = True
-            try:
-                # Build image first
+        if on_queue_position is not None:
+            self._queue_listeners.append(on_queue_position)
+
+        try:
+            # Concurrent callers wait on the same startup instead of polling for it
+            if self._startup_task is None or self._startup_task.done():
+                self._startup_task = asyncio.create_task(self._ensure_running())
+
+            # Shielded so one caller going away doesn't abort the startup for the others
+            return await asyncio.shield(self._startup_task)
+        finally:
+            if on_queue_position is not None:
+                self._queue_listeners.remove(on_queue_position)
+
+    async def _ensure_running(self) -> str:
+        # A hibernated container only needs to be thawed
+        if self.paused_at is not None:
+            with tracer.stage("resume_container"):
+                await self.resume_container()
+
+        if await self.is_container_running():
+            self.node.capacity.touch(self.user_id)
+            return self.container_id
+
+        # A new user gets a pre-started container right away (its slot comes along)
+        with tracer.stage("warm_pool_acquire"):
+            warm = await self.node.pool.acquire(self.user_id)
+        if warm is not None:
+            self._adopt_warm_container(warm)
+            return self.container_id
+
+        # Wait for a slot, evicting idle sessions if the host is full
+        with tracer.stage("capacity_wait"):
+            await self.node.capacity.acquire(self.user_id, self._report_queue_position)
+
+        try:
+            # Build image first
+            with tracer.stage("build_image"):
                 await self.build_image()
 
-                # Start container
-                container_id = await self.start_container()
+            # Start container
+            container_id = await self.start_container()
 
-                # Wait a moment for container to be fully ready
+            # Wait a moment for container to be fully ready
+            with tracer.stage("ready_wait"):
                 await asyncio.sleep(0.2)
 
-                return container_id
-            finally:
-                self._startup_in_progress = False
+            return container_id
+        except BaseException:
+            self.node.capacity.release(self.user_id)
+            raise
+
+    async def _report_queue_position(self, position: int) -> None:
+        for listener in list(self._queue_listeners):
+            await listener(position)
+
+    def _adopt_warm_container(self, warm: WarmContainer) -> None:
+        """Take over a container (and its agent and pylsp) from the warm pool."""
+        self.container_id = warm.container_id
+        self._agent = warm.agent
+        self._agent_unavailable = False
+        self.warm_lsp_process = warm.lsp_process
+        self.from_warm_pool = True
+
+    def take_warm_lsp_process(self) -> Optional[asyncio.subprocess.Process]:
+        """Hand the pre-started pylsp process over to the LSP controller (once)."""
+        process, self.warm_lsp_process = self.warm_lsp_process, None
+        if process is not None and process.returncode is None:
+            return process
+        return None
 
     async def start_container(self) -> str:
         """Start the Docker container and return its ID."""
-        # Create volume for user data persistence
-        await asyncio.create_subprocess_exec("docker", "volume", "create", self.user_id)
-
-        # Start container
-        process = await asyncio.create_subprocess_exec(
-            "docker",
-            "run",
-            "-d",
-            "-i",
-            "--rm",
-            "-v",
-            f"{self.user_id}:/home/termuser",
-            f"{self.image_name}:latest",
-            "tail",
-            "-f",
-            "/dev/null",
-            stdout=asyncio.subprocess.PIPE,
-        )
-
-        stdout, _ = await process.communicate()
-        container_id = stdout.decode().strip()
+        volume_name = volume_bindings.volume_for(self.user_id)
 
+        # Create volume for user data persistence
+        with tracer.stage("create_volume"):
+            await self.client.create_volume(volume_name)
+        # Places the user back on this node next time, where the volume is
+        volume_bindings.bind(self.user_id, volume_name, self.node.endpoint)
+
+        with tracer.stage("create_container"):
+            container_id = await self.client.create_container(
+                user_container_config(self.image_builder.image_ref, volume_name)
+            )
         if not container_id:
             raise Exception("Failed to start Docker container")
 
+        with tracer.stage("start_container"):
+            await self.client.start_container(container_id)
+        self.node.state.set_state(container_id, True)
+
         self.container_id = container_id
+        self._agent_unavailable = False
         return container_id
 
+    async def get_agent(self) -> ExecAgent:
+        """Return the exec agent of this container, starting it if needed."""
+        async with self._agent_lock:
+            if self._agent is None or not self._agent.is_alive:
+                agent = ExecAgent.for_container(self.container_id, self.client.cli())
+                with tracer.stage("start_exec_agent"):
+                    await agent.start()
+                self._agent = agent
+
+            return self._agent
+
+    async def close_agent(self) -> None:
+        if self._agent is not None:
+            await self._agent.close()
+            self._agent = None
+
+    async def get_workspace_tree(self) -> Optional[WorkspaceTree]:
+        """The workspace index, rebuilt once stale. None when the exec agent can't be used."""
+        async with self._workspace_tree_lock:
+            tree = self._workspace_tree
+            if tree is not None and not tree.stale:
+                return tree
+            if tree is not None:
+                self._workspace_tree = None
+                try:
+                    await tree.close()
+                except ExecAgentError:
+                    pass
+
+            if self._agent_unavailable:
+                return None
+
+            try:
+                agent = await self.get_agent()
+                exec_metrics["round_trips"] += 1
+                tree = WorkspaceTree(
+                    agent, self.config.WORKSPACE_ROOT, self.config.TREE_IGNORE
+                )
+                await tree.start()
+            except (ExecAgentError, OSError) as e:
+                print(f"Workspace tree unavailable: {e}")
+                return None
+
+            self._workspace_tree = tree
+            return tree
+
+    async def open_pty(self, name: str, config: TerminalConfig) -> PtyController:
+        """
+        A bash PTY in the container. The exec agent hosts it, so it costs no host process;
+        without the agent it's a `docker exec -it` client like before.
+        """
+        if not self._agent_unavailable:
+            try:
+                agent = await self.get_agent()
+                pty = AgentPtyController(config, agent, name)
+                await pty.open()
+                return pty
+            except (ExecAgentError, OSError) as e:
+                print(f"Exec agent can't host PTY {name}, using docker exec: {e}")
+
+        pty = PtyController(config)
+        await pty.create_pty(self.container_id, self.client.cli())
+        return pty
+
+    async def _agent_call(self, method: str, *args, **kwargs):
+        """Call an agent operation, or return None when the agent can't be used."""
+        if self._agent_unavailable:
+            return None
+
+        try:
+            agent = await self.get_agent()
+            exec_metrics["round_trips"] += 1
+            return await getattr(agent, method)(*args, **kwargs)
+        except (ExecAgentError, OSError) as e:
+            if not self._agent or not self._agent.is_alive:
+                # Don't respawn a broken agent on every call, use docker exec instead
+                print(f"Exec agent unavailable, falling back to docker exec: {e}")
+                self._agent_unavailable = True
+                return None
+            raise
+
     async def exec_command(self, command: str) -> tuple:
         """Execute a command in the container."""
-        process = await asyncio.create_subprocess_exec(
-            "docker",
-            "exec",
-            self.container_id,
-            "bash",
-            "-c",
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+        exec_metrics["commands"] += 1
+        result = await self._agent_call("run", command)
+        if result is not None:
+            stdout, stderr, _ = result
+            return stdout, stderr
+
+        stdout, stderr, _ = await self._docker_exec(command)
+
+        return stdout, stderr
+
+    async def stream_command(
+        self, command: str, cwd: Optional[str] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Run a non-interactive command beside the terminals' shells: {"stream", "data"} as
+        stdout and stderr are produced, then {"exit_code"}. Without the agent the output
+        comes in one piece once the command is done.
+        """
+        exec_metrics["commands"] += 1
+
+        agent = None
+        if not self._agent_unavailable:
+            try:
+                agent = await self.get_agent()
+            except (ExecAgentError, OSError) as e:
+                print(f"Exec agent unavailable, falling back to docker exec: {e}")
+                self._agent_unavailable = True
+
+        if agent is not None:
+            exec_metrics["round_trips"] += 1
+            async for event in agent.exec_stream(command, cwd):
+                yield event
+            return
+
+        if cwd:
+            # The shell's working directory may be relative to home (~/root)
+            directory = (
+                '"$HOME"' + shlex.quote(cwd[1:]) if cwd.startswith("~") else shlex.quote(cwd)
+            )
+            command = f"cd {directory} && {command}"
+
+        stdout, stderr, exit_code = await self._docker_exec(command)
+        for stream, data in (("stdout", stdout), ("stderr", stderr)):
+            if data:
+                yield {"stream": stream, "data": data}
+        yield {"exit_code": exit_code}
+
+    async def _docker_exec(self, command: str) -> Tuple[bytes, bytes, int]:
+        exec_metrics["round_trips"] += 1
+        return await self.client.exec_run(self.container_id, ["bash", "-c", command])
+
+    async def exec_many(self, commands: List[str]) -> List[Tuple[bytes, bytes, int]]:
+        """Run commands in order in one round trip; (stdout, stderr, exit_code) for each."""
+        if not commands:
+            return []
+
+        exec_metrics["commands"] += len(commands)
+        results = await self._agent_call("run_many", commands)
+        if results is not None:
+            return results
+
+        # Without the agent every command is its own docker exec
+        return [await self._docker_exec(command) for command in commands]
+
+    async def batch(self, requests: List[Dict]) -> List[Dict]:
+        """Run agent operations ({"op": "stat", "path": ...}) in order in one round trip.
+
+        Returns one {"ok": ..., "result"/"error"} per request. Without the agent each
+        operation falls back to its own call.
+        """
+        if not requests:
+            return []
+
+        exec_metrics["commands"] += len(requests)
+        responses = await self._agent_call("batch", requests)
+        if responses is not None:
+            return responses
+
+        responses = []
+        for request in requests:
+            try:
+                responses.append({"ok": True, "result": await self._fallback_op(request)})
+            except Exception as e:
+                responses.append({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        return responses
+
+    async def _fallback_op(self, request: Dict) -> Dict:
+        op = request["op"]
+        if op == "stat":
+            return await self.stat_path(request["path"])
+        if op == "read":
+            content = await self.read_path(request["path"])
+            max_size = request.get("max_size")
+            if max_size is not None and len(content) > max_size:
+                return {"size": len(content), "too_large": True}
+            return {"size": len(content), "content": base64.b64encode(content).decode()}
+        if op == "run":
+            stdout, stderr, exit_code = await self._docker_exec(request["command"])
+            return {
+                "stdout": base64.b64encode(stdout).decode(),
+                "stderr": base64.b64encode(stderr).decode(),
+                "exit_code": exit_code,
+            }
+        raise ValueError(f"Operation {op} needs the exec agent")
+
+    async def stat_path(self, path: str) -> Dict:
+        """Stat a path in the container, {"exists": False} if it doesn't exist."""
+        result = await self._agent_call("stat", path)
+        if result is not None:
+            return result
+
+        quoted = shlex.quote(path)
+        stdout, _ = await self.exec_command(
+            f"test -e {quoted} && stat -c '%F|%s|%Y|%a' {quoted} || echo 'not_found'"
         )
+        parts = stdout.decode().strip().split("|")
+        if len(parts) != 4:
+            return {"exists": False}
+
+        return {
+            "exists": True,
+            "is_directory": "directory" in parts[0],
+            "is_file": "regular" in parts[0],
+            "size": int(parts[1]),
+            "mtime": float(parts[2]),
+            "permissions": parts[3],
+            "name": path.split("/")[-1],
+        }
+
+    async def read_path(self, path: str) -> bytes:
+        """Read a file from the container."""
+        result = await self._agent_call("read", path)
+        if result is not None:
+            return result
+
+        stdout, stderr = await self.exec_command(f"base64 {shlex.quote(path)}")
+        if stderr:
+            raise FileNotFoundError(stderr.decode())
+
+        return base64.b64decode(stdout)
+
+    async def write_path(self, path: str, content: bytes) -> None:
+        """Write a file in the container, creating parent directories."""
+        if await self._agent_call("write", path, content) is not None:
+            return
+
+        encoded = base64.b64encode(content).decode()
+        quoted = shlex.quote(path)
+        _, stderr = await self.exec_command(
+            f"mkdir -p \"$(dirname {quoted})\" && echo '{encoded}' | base64 -d > {quoted}"
+        )
+        if stderr:
+            raise OSError(stderr.decode())
 
-        return await process.communicate()
-
-    def is_container_running(self) -> bool:
+    async def is_container_running(self) -> bool:
         """Check if the container is still running."""
         if not self.container_id:
             return False
 
-        result = subprocess.run(
-            ["docker", "inspect", "-f", "{{.State.Running}}", self.container_id],
-            capture_output=True,
-            text=True,
-        )
-        return result.stdout.strip() == "true"
+        try:
+            # Served from the events-fed state table, no blocking inspect
+            return await self.node.state.is_running(self.container_id)
+        except Exception as e:
+            print(f"Error inspecting container {self.container_id}: {e}")
+            return False
+
+    async def pause_container(self) -> None:
+        """Freeze the container's processes (PTY shell and pylsp keep their state)."""
+        if not self.container_id or self.paused_at is not None:
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.client.pause_container(self.container_id)
+        except Exception as e:
+            print(f"Error pausing container for user {self.user_id}: {e}")
+            return
+
+        self.node.state.set_state(self.container_id, True, paused=True)
+        self.paused_at = time.monotonic()
+        hibernation_metrics["pause"].record(time.perf_counter() - started)
+        print(f"Paused idle container for user {self.user_id}")
+
+    async def resume_container(self, record: bool = True) -> None:
+        """Unpause a container frozen by the idle policy."""
+        if not self.container_id or self.paused_at is None:
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.client.unpause_container(self.container_id)
+            self.node.state.set_state(self.container_id, True)
+            if record:
+                hibernation_metrics["resume"].record(time.perf_counter() - started)
+                hibernation_metrics["paused_for"].record(
+                    time.monotonic() - self.paused_at
+                )
+        except Exception as e:
+            print(f"Error resuming container for user {self.user_id}: {e}")
+
+        self.paused_at = None
+
+    @classmethod
+    def get_exec_metrics(cls) -> Dict:
+        round_trips = exec_metrics["round_trips"]
+        return {
+            **exec_metrics,
+            "commands_per_round_trip": (
+                round(exec_metrics["commands"] / round_trips, 2) if round_trips else None
+            ),
+        }
+
+    @classmethod
+    def get_hibernation_metrics(cls) -> Dict:
+        return {
+            "pause_after_s": TerminalConfig.IDLE_PAUSE_AFTER,
+            "stop_after_s": TerminalConfig.IDLE_STOP_AFTER,
+            "paused_now": sum(
+                1 for manager in docker_sessions.values() if manager.paused_at is not None
+            ),
+            "idle_sessions": len(idle_tasks),
+            **{name: stats.summary() for name, stats in hibernation_metrics.items()},
+        }
 
     async def cleanup_vim_locks(self) -> None:
         """Clean up any vim swap files that might be left."""
         if self.container_id:
             try:
                 # Find and remove vim swap files
-                await asyncio.create_subprocess_exec(
-                    "docker",
-                    "exec",
+                await self.client.exec_run(
                     self.container_id,
-                    "bash",
-                    "-c",
-                    "find /home/termuser -name '*.sw[a-p]' -delete",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
+                    ["bash", "-c", "find /home/termuser -name '*.sw[a-p]' -delete"],
                 )
             except Exception as e:
                 print(f"Error cleaning up vim locks: {e}")
@@ -257,30 +633,26 @@ class DockerManager:
             # Notify any filesystem watchers that the container is stopping
             self._notify_container_stopping()
 
+            # A paused container can't be stopped gracefully
+            await self.resume_container(record=False)
+
+            await self.close_agent()
+
             try:
-                proc = await asyncio.create_subprocess_exec(
-                    "docker",
-                    "container",
-                    "stop",
-                    self.container_id,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                )
-                await proc.communicate()
-
-                proc = await asyncio.create_subprocess_exec(
-                    "docker",
-                    "rm",
-                    self.container_name,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                )
-                await proc.communicate()
+                await self.client.stop_container(self.container_id)
+
+                # AutoRemove normally takes care of this, remove explicitly just in case
+                await self.client.remove_container(self.container_id, force=True)
             except Exception:
                 pass
 
+            self.node.state.forget(self.container_id)
+
             self.container_id = None
 
+        self.node.capacity.release(self.user_id)
+        self.node.pool.request_refill()
+
     def _notify_container_stopping(self):
         """Notify components that the container is stopping."""
         # This is a simple approach - in a more complex system you might use observers
@@ -291,3 +663,14 @@ class DockerManager:
     def set_filesystem_watcher(self, watcher):
         """Set reference to filesystem watcher for stop notifications."""
         self._filesystem_watcher = watcher
+
+
+async def _evict_session(user_id: str) -> None:
+    idle_task = idle_tasks.pop(user_id, None)
+    if idle_task is not None:
+        idle_task.cancel()
+    await DockerManager._cleanup_user_session(user_id)
+
+
+placement.session_is_idle = DockerManager._is_idle
+placement.evict_session = _evict_session
@@ -0,0 +1,280 @@
+# docker_standin.py - Local stand-in for the Docker daemon socket
+#
+# Serves the subset of the Engine API used by DockerAPIClient so the terminal stack can be
+# exercised without a real daemon. "Containers" are bookkeeping entries and exec commands
+# run as local subprocesses.
+#
+#   python -m terminal.docker_standin /tmp/xoblas-docker.sock
+#   DOCKER_SOCKET_PATH=/tmp/xoblas-docker.sock fastapi dev main.py
+#
+# Several sockets give one independent daemon each, to exercise multi-node placement:
+#
+#   python -m terminal.docker_standin /tmp/docker-a.sock /tmp/docker-b.sock
+#   DOCKER_ENDPOINTS=/tmp/docker-a.sock,/tmp/docker-b.sock fastapi dev main.py
+import asyncio
+import json
+import re
+import struct
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+from urllib.parse import unquote, urlparse
+
+
+class StandInDockerDaemon:
+    def __init__(self, socket_path: str, images: Optional[Set[str]] = None):
+        self.socket_path = socket_path
+        # None means every image reference is reported as built
+        self.images = images
+        self.containers: Dict[str, Dict] = {}
+        self.volumes: Set[str] = set()
+        self.execs: Dict[str, Dict] = {}
+        self.event_subscribers: List[asyncio.Queue] = []
+        self.server = None
+
+        # For tests of the client: connections accepted so far, answer with chunked
+        # bodies, close the connection on the next request instead of answering
+        self.connections = 0
+        self.chunked = False
+        self.drop_next_request = False
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_unix_server(
+            self._handle_connection, path=self.socket_path
+        )
+
+    async def stop(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        print(f"Docker stand-in listening on {self.socket_path}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    # ------------------------------------------------------------------ http
+
+    async def _handle_connection(self, reader, writer) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                body = json.loads(await reader.readexactly(length)) if length else None
+
+                if self.drop_next_request:
+                    # Like a daemon that closed an idle keep-alive connection
+                    self.drop_next_request = False
+                    break
+
+                # Strip the /v1.xx prefix
+                path = re.sub(r"^/v[0-9.]+", "", urlparse(target).path)
+                keep_open = await self._route(method, unquote(path), body, writer)
+                if not keep_open:
+                    break
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status: int, payload=None) -> bool:
+        body = b"" if payload is None else json.dumps(payload).encode()
+        if self.chunked and status != 204:
+            writer.write(
+                f"HTTP/1.1 {status} OK\r\n"
+                "Content-Type: application/json\r\n"
+                "Transfer-Encoding: chunked\r\n\r\n".encode()
+            )
+            for start in range(0, len(body), 16):
+                chunk = body[start : start + 16]
+                writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            return True
+
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        return True
+
+    async def _route(self, method: str, path: str, body, writer) -> bool:
+        if path == "/_ping":
+            return await self._respond(writer, 200, "OK")
+
+        if method == "GET" and path == "/events":
+            return await self._stream_events(writer)
+
+        if method == "GET" and (match := re.fullmatch(r"/images/(.+)/json", path)):
+            if self.images is None or match.group(1) in self.images:
+                return await self._respond(writer, 200, {"RepoTags": [match.group(1)]})
+            return await self._respond(writer, 404, {"message": "No such image"})
+
+        if method == "GET" and (match := re.fullmatch(r"/volumes/([^/]+)", path)):
+            if match.group(1) in self.volumes:
+                return await self._respond(writer, 200, {"Name": match.group(1)})
+            return await self._respond(writer, 404, {"message": "No such volume"})
+
+        if method == "DELETE" and (match := re.fullmatch(r"/volumes/([^/]+)", path)):
+            if match.group(1) not in self.volumes:
+                return await self._respond(writer, 404, {"message": "No such volume"})
+            self.volumes.discard(match.group(1))
+            return await self._respond(writer, 204)
+
+        if method == "POST" and path == "/volumes/create":
+            self.volumes.add(body["Name"])
+            return await self._respond(writer, 201, {"Name": body["Name"]})
+
+        if method == "POST" and path == "/containers/create":
+            container_id = uuid.uuid4().hex * 2
+            self.containers[container_id] = {
+                "Id": container_id,
+                "Config": body,
+                "State": {"Running": False, "Paused": False},
+            }
+            return await self._respond(writer, 201, {"Id": container_id})
+
+        if match := re.fullmatch(r"/containers/([^/]+)(/\w+)?(/json)?", path):
+            return await self._container_route(method, match, body, writer)
+
+        if match := re.fullmatch(r"/exec/([^/]+)/(start|json)", path):
+            return await self._exec_route(match.group(1), match.group(2), writer)
+
+        return await self._respond(writer, 404, {"message": f"Unsupported {path}"})
+
+    async def _container_route(self, method, match, body, writer) -> bool:
+        container = self._find_container(match.group(1))
+        action = (match.group(2) or match.group(3) or "").strip("/")
+
+        if container is None:
+            return await self._respond(writer, 404, {"message": "No such container"})
+
+        if action == "json":
+            return await self._respond(writer, 200, container)
+
+        if action == "start":
+            container["State"]["Running"] = True
+            self._emit("start", container["Id"])
+            return await self._respond(writer, 204)
+
+        if action == "stop":
+            self._stop(container)
+            return await self._respond(writer, 204)
+
+        if action in ("pause", "unpause"):
+            container["State"]["Paused"] = action == "pause"
+            self._emit(action, container["Id"])
+            return await self._respond(writer, 204)
+
+        if action == "" and method == "DELETE":
+            self.containers.pop(container["Id"], None)
+            self._emit("destroy", container["Id"])
+            return await self._respond(writer, 204)
+
+        if action == "exec":
+            exec_id = uuid.uuid4().hex
+            self.execs[exec_id] = {"Cmd": body["Cmd"], "ExitCode": None}
+            return await self._respond(writer, 201, {"Id": exec_id})
+
+        return await self._respond(writer, 404, {"message": f"Unsupported {action}"})
+
+    async def _exec_route(self, exec_id: str, action: str, writer) -> bool:
+        exec_info = self.execs.get(exec_id)
+        if exec_info is None:
+            return await self._respond(writer, 404, {"message": "No such exec"})
+
+        if action == "json":
+            return await self._respond(writer, 200, exec_info)
+
+        process = await asyncio.create_subprocess_exec(
+            *exec_info["Cmd"],
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+        exec_info["ExitCode"] = process.returncode
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/vnd.docker.raw-stream\r\n\r\n"
+        )
+        for stream_type, payload in ((1, stdout), (2, stderr)):
+            if payload:
+                writer.write(struct.pack(">BxxxL", stream_type, len(payload)) + payload)
+        await writer.drain()
+
+        # Hijacked streams end when the daemon closes the connection
+        return False
+
+    async def _stream_events(self, writer) -> bool:
+        queue: asyncio.Queue = asyncio.Queue()
+        self.event_subscribers.append(queue)
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        try:
+            while True:
+                event = json.dumps(await queue.get()).encode() + b"\n"
+                writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                await writer.drain()
+        finally:
+            self.event_subscribers.remove(queue)
+
+    def _emit(self, action: str, container_id: str) -> None:
+        event = {
+            "Type": "container",
+            "Action": action,
+            "id": container_id,
+            "time": int(time.time()),
+        }
+        for queue in self.event_subscribers:
+            queue.put_nowait(event)
+
+    def _find_container(self, ref: str) -> Optional[Dict]:
+        for container_id, container in self.containers.items():
+            if container_id.startswith(ref):
+                return container
+        return None
+
+    def _stop(self, container: Dict) -> None:
+        container["State"]["Running"] = False
+        self._emit("die", container["Id"])
+        if container["Config"].get("HostConfig", {}).get("AutoRemove"):
+            self.containers.pop(container["Id"], None)
+            self._emit("destroy", container["Id"])
+
+
+async def serve_all(socket_paths: List[str]) -> None:
+    await asyncio.gather(
+        *(StandInDockerDaemon(path).serve_forever() for path in socket_paths)
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m terminal.docker_standin <socket_path> [<socket_path>...]")
+        sys.exit(1)
+
+    asyncio.run(serve_all(sys.argv[1:]))
@@ -0,0 +1,322 @@
+# exec_agent.py - Host side of the in-container exec agent (see container_agent.py)
+import asyncio
+import base64
+import json
+import struct
+from pathlib import Path
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+
+HEADER = struct.Struct(">I")
+
+
+class ExecAgentError(Exception):
+    pass
+
+
+class ExecAgent:
+    """
+    Multiplexes id-tagged requests over the stdin/stdout pipe of one agent process.
+
+    `command` is whatever starts container_agent.py, normally
+    `docker exec -i <container> python3 -u -c <source>`, but any local
+    `python3 container_agent.py` works the same way.
+    """
+
+    def __init__(self, command: List[str]):
+        self.command = command
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._reader_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        # Receivers of the events pushed by the PTYs the agent hosts, by PTY name
+        self._pty_listeners: Dict[str, Callable[[Dict], None]] = {}
+        # Same for the commands it runs outside PTYs, by exec name
+        self._exec_listeners: Dict[str, Callable[[Dict], None]] = {}
+        self._next_exec = 0
+        # And for the directory trees it watches, by watch name
+        self._watch_listeners: Dict[str, Callable[[Dict], None]] = {}
+
+    @staticmethod
+    def load_source() -> str:
+        """Source of the agent, passed to `python3 -c` so nothing has to be copied first."""
+        return (Path(__file__).parent / "container_agent.py").read_text()
+
+    @classmethod
+    def for_container(cls, container_id: str, docker_cli: List[str]) -> "ExecAgent":
+        """`docker_cli` is the docker command targeting the container's daemon."""
+        return cls(
+            [
+                *docker_cli,
+                "exec",
+                "-i",
+                container_id,
+                "python3",
+                "-u",
+                "-c",
+                cls.load_source(),
+            ]
+        )
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def close(self) -> None:
+        if self.process and self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=2.0)
+            except asyncio.TimeoutError:
+                self.process.kill()
+
+        if self._reader_task:
+            self._reader_task.cancel()
+
+        self._fail_pending(ExecAgentError("Exec agent closed"))
+        self._end_ptys()
+        self.process = None
+
+    def _fail_pending(self, error: Exception) -> None:
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    def _end_ptys(self) -> None:
+        """The PTYs (and commands) die with the agent."""
+        for name, listener in list(self._pty_listeners.items()):
+            listener({"event": "pty_exit", "pty": name, "exit_code": None})
+        self._pty_listeners.clear()
+        for name, listener in list(self._exec_listeners.items()):
+            listener({"event": "exec_exit", "exec": name, "exit_code": None})
+        self._exec_listeners.clear()
+        for name, listener in list(self._watch_listeners.items()):
+            listener({"event": "tree_closed", "watch": name})
+        self._watch_listeners.clear()
+
+    async def _read_responses(self) -> None:
+        try:
+            while True:
+                header = await self.process.stdout.readexactly(HEADER.size)
+                (size,) = HEADER.unpack(header)
+                response = json.loads(await self.process.stdout.readexactly(size))
+
+                if "event" in response:
+                    if "exec" in response:
+                        listeners, name = self._exec_listeners, response["exec"]
+                    elif "watch" in response:
+                        listeners, name = self._watch_listeners, response["watch"]
+                    else:
+                        listeners, name = self._pty_listeners, response.get("pty")
+                    listener = listeners.get(name)
+                    if listener is not None:
+                        listener(response)
+                    if response["event"] in ("pty_exit", "exec_exit"):
+                        listeners.pop(name, None)
+                    continue
+
+                future = self._pending.pop(response.get("id"), None)
+                if future is None or future.done():
+                    continue
+
+                if response.get("ok"):
+                    future.set_result(response.get("result"))
+                else:
+                    future.set_exception(ExecAgentError(response.get("error")))
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        except asyncio.CancelledError:
+            return
+
+        self._fail_pending(ExecAgentError("Exec agent exited"))
+        self._end_ptys()
+
+    async def request(self, op: str, **params) -> Any:
+        """Send one request and wait for its response."""
+        if not self.is_alive:
+            raise ExecAgentError("Exec agent is not running")
+
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+
+        payload = json.dumps({"id": request_id, "op": op, **params}).encode()
+        async with self._write_lock:
+            self.process.stdin.write(HEADER.pack(len(payload)) + payload)
+            await self.process.stdin.drain()
+
+        return await future
+
+    async def notify(self, op: str, **params) -> None:
+        """Send a request that gets no response, in order with the other requests."""
+        if not self.is_alive:
+            raise ExecAgentError("Exec agent is not running")
+
+        payload = json.dumps({"op": op, **params}).encode()
+        async with self._write_lock:
+            self.process.stdin.write(HEADER.pack(len(payload)) + payload)
+            await self.process.stdin.drain()
+
+    # ------------------------------------------------------------ operations
+
+    async def stat(self, path: str) -> Dict:
+        return await self.request("stat", path=path)
+
+    async def read(self, path: str, max_size: Optional[int] = None) -> Optional[bytes]:
+        """Return the file content, or None when it exceeds max_size."""
+        result = await self.request("read", path=path, max_size=max_size)
+        if result.get("too_large"):
+            return None
+        return base64.b64decode(result["content"])
+
+    async def write(self, path: str, content: bytes, mkdir: bool = True) -> Dict:
+        return await self.request(
+            "write",
+            path=path,
+            content=base64.b64encode(content).decode("ascii"),
+            mkdir=mkdir,
+        )
+
+    async def list(
+        self,
+        path: str,
+        recursive: bool = False,
+        ignore: Tuple[str, ...] = (),
+        limit: Optional[int] = None,
+    ) -> Dict:
+        return await self.request(
+            "list", path=path, recursive=recursive, ignore=list(ignore), limit=limit
+        )
+
+    async def run(
+        self, command: str, cwd: Optional[str] = None, timeout: Optional[float] = None
+    ) -> Tuple[bytes, bytes, int]:
+        result = await self.request("run", command=command, cwd=cwd, timeout=timeout)
+        return self._decode_run(result)
+
+    @staticmethod
+    def _decode_run(result: Dict) -> Tuple[bytes, bytes, int]:
+        return (
+            base64.b64decode(result["stdout"]),
+            base64.b64decode(result["stderr"]),
+            result["exit_code"],
+        )
+
+    async def batch(self, requests: List[Dict]) -> List[Dict]:
+        """Run several operations in order in one round trip.
+
+        Each request is {"op": ..., **params}; each response {"ok": ..., "result"/"error"}.
+        """
+        result = await self.request("batch", requests=requests)
+        return result["results"]
+
+    async def run_many(self, commands: List[str]) -> List[Tuple[bytes, bytes, int]]:
+        responses = await self.batch(
+            [{"op": "run", "command": command} for command in commands]
+        )
+
+        results = []
+        for response in responses:
+            if response["ok"]:
+                results.append(self._decode_run(response["result"]))
+            else:
+                results.append((b"", response["error"].encode(), -1))
+        return results
+
+    async def exec_stream(
+        self, command: str, cwd: Optional[str] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """Run `command` outside any PTY: {"stream", "data"} as stdout and stderr are
+        produced, then {"exit_code"} (None if the agent died). Closing early kills it."""
+        self._next_exec += 1
+        name = f"exec-{self._next_exec}"
+        events: "asyncio.Queue[Dict]" = asyncio.Queue()
+        self._exec_listeners[name] = events.put_nowait
+
+        try:
+            await self.request("exec_start", exec=name, command=command, cwd=cwd)
+            while True:
+                event = await events.get()
+                if event["event"] == "exec_exit":
+                    yield {"exit_code": event["exit_code"]}
+                    return
+                yield {"stream": event["stream"], "data": base64.b64decode(event["data"])}
+        finally:
+            if self._exec_listeners.pop(name, None) is not None and self.is_alive:
+                try:
+                    await self.notify("exec_kill", exec=name)
+                except (ExecAgentError, ConnectionError):
+                    pass
+
+    async def tree_watch(
+        self,
+        name: str,
+        root: str,
+        ignore: Tuple[str, ...],
+        on_event: Callable[[Dict], None],
+    ) -> List[List]:
+        """Entries under `root` ([path, is_directory, ignored]); its changes go to `on_event`."""
+        self._watch_listeners[name] = on_event
+        try:
+            result = await self.request(
+                "tree_watch", watch=name, root=root, ignore=list(ignore)
+            )
+        except ExecAgentError:
+            self._watch_listeners.pop(name, None)
+            raise
+        return result["entries"]
+
+    async def tree_unwatch(self, name: str) -> None:
+        self._watch_listeners.pop(name, None)
+        await self.request("tree_unwatch", watch=name)
+
+    # ------------------------------------------------------------------ ptys
+
+    async def pty_open(
+        self,
+        name: str,
+        rows: int,
+        cols: int,
+        on_event: Callable[[Dict], None],
+        command: Tuple[str, ...] = ("bash",),
+    ) -> int:
+        """Open a PTY running `command` in the container; its events go to `on_event`."""
+        self._pty_listeners[name] = on_event
+        try:
+            result = await self.request(
+                "pty_open", pty=name, command=list(command), rows=rows, cols=cols
+            )
+        except ExecAgentError:
+            self._pty_listeners.pop(name, None)
+            raise
+        return result["pid"]
+
+    async def pty_write(self, name: str, data: bytes) -> None:
+        # No response to wait for, keystrokes only pay for the pipe write
+        await self.notify(
+            "pty_write", pty=name, data=base64.b64encode(data).decode("ascii")
+        )
+
+    async def pty_flow(self, name: str, reading: bool) -> None:
+        """Stop or resume reading the PTY, its process blocks once the PTY buffer is full."""
+        try:
+            await self.notify("pty_flow", pty=name, reading=reading)
+        except (ExecAgentError, ConnectionError):
+            pass
+
+    async def pty_resize(self, name: str, rows: int, cols: int) -> None:
+        await self.request("pty_resize", pty=name, rows=rows, cols=cols)
+
+    async def pty_close(self, name: str) -> None:
+        await self.request("pty_close", pty=name)
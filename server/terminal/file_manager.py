@@ -1,5 +1,4 @@
 # file_manager.py - Handles file operations within the container
-import base64
 from typing import Dict
 from terminal.docker_manager import DockerManager
 
@@ -12,25 +11,21 @@ class FileManager:
         self, content: str, file_path: str = "/home/termuser/root/main.py"
     ) -> Dict[str, str]:
         """Write content to a file in the container."""
-        # Base64 encode to handle special characters
-        encoded_content = base64.b64encode(content.encode()).decode()
-        bash_command = f"echo '{encoded_content}' | base64 -d > {file_path}"
-
-        _, stderr = await self.docker_manager.exec_command(bash_command)
-
-        if not stderr:
-            return {"status": "success", "message": "File updated successfully"}
-        else:
+        try:
+            await self.docker_manager.write_path(file_path, content.encode())
+        except Exception as e:
             return {
                 "status": "error",
-                "message": f"Failed to update file: {stderr.decode()}",
+                "message": f"Failed to update file: {e}",
             }
 
+        return {"status": "success", "message": "File updated successfully"}
+
     async def read_file(self, file_path: str = "/home/termuser/root/main.py") -> str:
         """Read content from a file in the container."""
-        stdout, stderr = await self.docker_manager.exec_command(f"cat {file_path}")
-
-        if stderr:
-            return stderr.decode()
+        try:
+            content = await self.docker_manager.read_path(file_path)
+        except Exception as e:
+            return str(e)
 
-        return stdout.decode()
+        return content.decode(errors="replace")
@@ -0,0 +1,133 @@
+# image_builder.py - Content-addressed terminal image, built once at boot
+import asyncio
+import hashlib
+import os
+import shlex
+from typing import Dict, List, Optional, Tuple
+
+from terminal.docker_client import DockerAPIClient
+from terminal.terminal_config import TerminalConfig
+
+
+def _copy_sources(dockerfile: str) -> List[str]:
+    """Local sources referenced by COPY/ADD instructions of a Dockerfile."""
+    sources = []
+
+    for line in dockerfile.replace("\\\n", " ").splitlines():
+        words = shlex.split(line, comments=True)
+        if not words or words[0].upper() not in ("COPY", "ADD"):
+            continue
+
+        args = [w for w in words[1:] if not w.startswith("--")]
+        # Multi-stage copies don't read from the build context
+        if any(w.startswith("--from") for w in words[1:]):
+            continue
+
+        sources.extend(args[:-1])
+
+    return sources
+
+
+def compute_image_tag(dockerfile_path: str, context_dir: str) -> str:
+    """Hash the Dockerfile and every file it copies from the build context."""
+    with open(dockerfile_path, "rb") as f:
+        dockerfile = f.read()
+
+    digest = hashlib.sha256(dockerfile)
+
+    for source in sorted(_copy_sources(dockerfile.decode())):
+        source_path = os.path.normpath(os.path.join(context_dir, source))
+
+        if os.path.isdir(source_path):
+            files = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(source_path)
+                for name in names
+            )
+        else:
+            files = [source_path] if os.path.exists(source_path) else []
+
+        for file_path in files:
+            digest.update(os.path.relpath(file_path, context_dir).encode())
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+
+    return digest.hexdigest()[:12]
+
+
+class ImageBuilder:
+    """
+    The image tag is derived from its inputs, so an edit to the Dockerfile or to a copied
+    script produces a new tag (and a build), while an unchanged tree is a single exact-tag
+    lookup. Concurrent callers share one build per daemon.
+    """
+
+    def __init__(self, image_name: str, dockerfile_path: str, context_dir: str):
+        self.image_name = image_name
+        self.dockerfile_path = dockerfile_path
+        self.context_dir = context_dir
+        self._tag: Optional[str] = None
+        # endpoint -> build on that daemon
+        self._build_tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def image_ref(self) -> str:
+        if self._tag is None:
+            self._tag = compute_image_tag(self.dockerfile_path, self.context_dir)
+        return f"{self.image_name}:{self._tag}"
+
+    async def is_built(self, client: DockerAPIClient) -> bool:
+        return await client.inspect_image(self.image_ref) is not None
+
+    async def ensure_built(self, client: DockerAPIClient) -> str:
+        """Build the image on `client`'s daemon unless it exists; returns the reference."""
+        task = self._build_tasks.get(client.endpoint)
+        if task is None or (task.done() and task.exception() is not None):
+            task = asyncio.create_task(self._build(client))
+            self._build_tasks[client.endpoint] = task
+
+        # Shielded so a cancelled waiter doesn't abort the build for everyone else
+        return await asyncio.shield(task)
+
+    async def _build(self, client: DockerAPIClient) -> str:
+        image_ref = self.image_ref
+
+        if await self.is_built(client):
+            return image_ref
+
+        print(f"Building terminal image {image_ref} on {client.endpoint}")
+        process = await asyncio.create_subprocess_exec(
+            *client.cli(
+                "build",
+                "-t",
+                image_ref,
+                "-f",
+                self.dockerfile_path,
+                self.context_dir,
+            ),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        _, stderr = await process.communicate()
+
+        if process.returncode != 0:
+            raise Exception(f"Failed to build Docker image: {stderr.decode()[-2000:]}")
+
+        return image_ref
+
+
+image_builders: Dict[Tuple[str, str], ImageBuilder] = {}
+
+
+def get_image_builder(
+    image_name: str = TerminalConfig.DEFAULT_IMAGE_NAME,
+    dockerfile_path: str = TerminalConfig.DEFAULT_DOCKERFILE_PATH,
+) -> ImageBuilder:
+    key = (image_name, dockerfile_path)
+
+    if key not in image_builders:
+        context_dir = os.path.dirname(os.path.abspath(dockerfile_path))
+        image_builders[key] = ImageBuilder(image_name, dockerfile_path, context_dir)
+
+    return image_builders[key]
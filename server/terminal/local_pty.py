@@ -0,0 +1,41 @@
+# local_pty.py - PTY controller running bash on this machine instead of in a container
+#
+# Used by benchmarks/ and tests/ to exercise the PTY stack without Docker, like
+# docker_standin.py does for the daemon; the server never creates one.
+import asyncio
+import fcntl
+import os
+import pty
+from typing import Sequence
+
+from terminal.pty_controller import PtyController
+
+BASH = ("bash", "--norc", "--noprofile", "-i")
+
+
+class LocalPtyController(PtyController):
+    async def spawn(self, argv: Sequence[str] = BASH) -> None:
+        """Run `argv` on a new PTY, what create_pty() does with `docker exec`."""
+        self.pid, self.fd = pty.fork()
+
+        if self.pid == 0:  # Child process
+            os.execvp(argv[0], list(argv))
+        else:
+            flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
+            fcntl.fcntl(self.fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            self.set_raw_mode()
+            self._start_reader()
+
+            # Give the shell a moment to initialize
+            await asyncio.sleep(0.1)
+
+    async def start_shell(self) -> None:
+        """bash with the server's prompt, ready for a command."""
+        await self.spawn()
+        await self.configure_terminal()
+        async for _ in self.read_continuous_until_prompt(timeout=5):
+            pass
+        # Output of configure_terminal coming after the first prompt
+        await self.read_immediate_output(timeout=0.2)
+        self.take_prompt_info()
+        self.take_last_command()
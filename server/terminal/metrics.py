@@ -0,0 +1,91 @@
+# metrics.py - Small in-memory latency statistics
+import time
+from collections import deque
+from typing import Dict
+
+
+class LatencyStats:
+    """Keeps the most recent samples (in seconds) and reports percentiles over them."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def _percentile(self, ordered: list, fraction: float) -> float:
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"count": self.count}
+
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 2),
+            "p50_ms": round(self._percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(self._percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(self._percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+
+class Histogram:
+    """Cumulative latency buckets (like Prometheus `le` buckets) plus LatencyStats."""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS_MS)
+        self.stats = LatencyStats()
+
+    def record(self, seconds: float) -> None:
+        milliseconds = seconds * 1000
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if milliseconds <= bound:
+                self.counts[i] += 1
+        self.stats.record(seconds)
+
+    def summary(self) -> Dict:
+        return {
+            **self.stats.summary(),
+            "buckets": {
+                **{f"le_{bound}ms": n for bound, n in zip(self.BUCKETS_MS, self.counts)},
+                "le_inf": self.stats.count,
+            },
+        }
+
+
+class ThroughputStats:
+    """Frames and bytes sent, with rates over a sliding window of recent seconds."""
+
+    def __init__(self, window: float = 10.0):
+        self.window = window
+        self.frames = 0
+        self.bytes = 0
+        self._recent = deque()
+
+    def record(self, size: int) -> None:
+        now = time.monotonic()
+        self.frames += 1
+        self.bytes += size
+        self._recent.append((now, size))
+        while self._recent and self._recent[0][0] < now - self.window:
+            self._recent.popleft()
+
+    def summary(self) -> Dict[str, float]:
+        now = time.monotonic()
+        recent = [size for at, size in self._recent if at >= now - self.window]
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "avg_frame_bytes": round(self.bytes / self.frames, 1) if self.frames else None,
+            "frames_per_s": round(len(recent) / self.window, 2),
+            "mb_per_s": round(sum(recent) / self.window / 1_000_000, 3),
+        }
@@ -0,0 +1,165 @@
+# output_pipeline.py - Single pass post-processing of PTY output chunks
+import re
+from typing import Dict, List, Sequence, Tuple
+
+# A token cut off at the end of a chunk is held back at most this long
+MAX_TOKEN = 4096
+
+
+class OutputStage:
+    """
+    One kind of token in the output: its first byte `lead`, then what `pattern` matches
+    (`partial` matches the start of that, for a token cut off at the end of a chunk; both
+    bytes regexes without named groups). `handle()` returns what the whole token becomes
+    in the output, and may add events or set `pipeline.suppress` (drop everything until
+    it's cleared).
+    """
+
+    lead: bytes = b"\x1b"
+    pattern: bytes = b""
+    partial: bytes = b""
+
+    def handle(self, token: bytes, pipeline: "OutputPipeline") -> bytes:
+        return token
+
+
+class ScreenSwitches(OutputStage):
+    """Alternate screen switches, kept in the output; the event's offset is right after them."""
+
+    pattern = rb"\[\?1049[hl]"
+    partial = rb"\[(?:\?(?:1(?:0(?:4(?:9)?)?)?)?)?"
+
+    def handle(self, token: bytes, pipeline: "OutputPipeline") -> bytes:
+        if pipeline.suppress:
+            # Never reaches the terminal
+            return token
+        pipeline.event(
+            "alternate_enter" if token.endswith(b"h") else "alternate_exit", None, len(token)
+        )
+        return token
+
+
+class AnsiStrip(OutputStage):
+    """Escape sequences (colors, cursor movement, titles), removed."""
+
+    pattern = rb"\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]{0,4096}(?:\x07|\x1b\\)|[@-Z\\^_]"
+    partial = rb"\[[0-?]*[ -/]*|\][^\x07\x1b]{0,4096}\x1b?"
+
+    def handle(self, token: bytes, pipeline: "OutputPipeline") -> bytes:
+        return b""
+
+
+class Newlines(OutputStage):
+    """Terminal line endings (\\r\\n) as plain \\n."""
+
+    lead = b"\r"
+    pattern = rb"\n"
+
+    def handle(self, token: bytes, pipeline: "OutputPipeline") -> bytes:
+        return b"\n"
+
+
+class OutputPipeline:
+    """
+    Stages composed into one compiled regex: a chunk is walked once whatever the number
+    of stages, plain output between tokens is copied as is. Earlier stages win when two
+    with the same lead match at the same place. State carries over between chunks: a
+    token split across two reads is held back until its end arrives, `suppress` stays set.
+
+    `feed()` returns the output and the events of the chunk as (name, value, offset),
+    offsets counting in the returned output.
+    """
+
+    def __init__(self, stages: Sequence[OutputStage]):
+        self.stages = list(stages)
+
+        # Stages grouped by lead byte: with a single literal lead the regex engine skips
+        # to it at C speed, with alternatives starting with it each position is tried
+        by_lead: Dict[bytes, List[int]] = {}
+        for index, stage in enumerate(self.stages):
+            by_lead.setdefault(stage.lead, []).append(index)
+
+        tokens, partials = [], []
+        for lead, indexes in by_lead.items():
+            stages = [self.stages[index] for index in indexes]
+            tokens.append(
+                re.escape(lead)
+                + b"(?:%s)"
+                % b"|".join(
+                    b"(?P<s%d>%s)" % (index, stage.pattern)
+                    for index, stage in zip(indexes, stages)
+                )
+            )
+            # The lead alone is the start of a token too
+            rests = [b"(?:%s)" % stage.partial for stage in stages if stage.partial]
+            partials.append(
+                re.escape(lead) + (b"(?:%s)?" % b"|".join(rests) if rests else b"")
+            )
+
+        self._tokens = re.compile(b"|".join(tokens))
+        self._partial = re.compile(b"|".join(partials))
+        self._leads = list(by_lead)
+        self._handlers = {
+            f"s{index}": stage.handle for index, stage in enumerate(self.stages)
+        }
+
+        self.suppress = False
+        self._held = b""
+        self._output: List[bytes] = []
+        self._events: List[Tuple[str, object, int]] = []
+
+    @classmethod
+    def plain_text(cls) -> "OutputPipeline":
+        """Output as text for programs: no escape sequences, \\n line endings."""
+        return cls([AnsiStrip(), Newlines()])
+
+    def event(self, name: str, value: object = None, after: int = 0) -> None:
+        """Record an event at the current output offset (`after` bytes of a kept token later)."""
+        # Events are rare next to output pieces, the offset is summed when needed
+        self._events.append((name, value, sum(map(len, self._output)) + after))
+
+    def feed(self, data: bytes) -> Tuple[bytes, List[Tuple[str, object, int]]]:
+        if self._held:
+            data = self._held + data
+            self._held = b""
+
+        output = self._output
+        handlers = self._handlers
+        position = 0
+        for match in self._tokens.finditer(data):
+            start = match.start()
+            if start > position and not self.suppress:
+                output.append(data[position:start])
+            replacement = handlers[match.lastgroup](match.group(), self)
+            if replacement and not self.suppress:
+                output.append(replacement)
+            position = match.end()
+
+        cut = self._cut_token(data, position)
+        if cut > position and not self.suppress:
+            output.append(data[position:cut])
+        self._held = data[cut:]
+
+        events = self._events
+        self._output, self._events = [], []
+        return b"".join(output), events
+
+    def flush(self) -> bytes:
+        """Whatever is held back, once no more output will come."""
+        held, self._held = self._held, b""
+        return held if not self.suppress else b""
+
+    def _cut_token(self, data: bytes, position: int) -> int:
+        """Start of a token cut off at the end of `data`, len(data) if there's none."""
+        start = max(position, len(data) - MAX_TOKEN)
+        candidates: List[int] = []
+        for lead in self._leads:
+            found = data.rfind(lead, start)
+            if found != -1:
+                candidates.append(found)
+
+        for candidate in sorted(candidates):
+            if self._partial.fullmatch(data, candidate):
+                return candidate
+        return len(data)
+
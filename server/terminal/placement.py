@@ -0,0 +1,194 @@
+# placement.py - Spread users over several Docker daemons with consistent hashing
+import asyncio
+import bisect
+import hashlib
+import math
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from terminal.capacity import CapacityManager
+from terminal.container_pool import (
+    POOL_KEY_PREFIX,
+    ContainerPool,
+    VolumeBindings,
+    volume_bindings,
+)
+from terminal.container_state import ContainerStateCache
+from terminal.docker_client import DockerAPIClient, normalize_endpoint
+from terminal.image_builder import get_image_builder
+from terminal.terminal_config import TerminalConfig
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class DockerNode:
+    """Everything bound to one Docker daemon: API client, state, capacity and warm pool."""
+
+    def __init__(self, endpoint: str, placement: "Placement"):
+        self.endpoint = normalize_endpoint(endpoint)
+        self.placement = placement
+        self.client = DockerAPIClient(self.endpoint)
+        self.state = ContainerStateCache(self.client)
+        self.capacity = CapacityManager(check_host_memory=self.client.is_local)
+        self.pool = ContainerPool(self.client, self.state, self.capacity)
+
+        self.capacity.is_idle = self._is_idle
+        self.capacity.evict = self._evict
+
+    def _is_idle(self, key: str) -> bool:
+        if key.startswith(POOL_KEY_PREFIX):
+            return self.pool.is_evictable(key)
+        return self.placement.session_is_idle(key)
+
+    async def _evict(self, key: str) -> None:
+        if key.startswith(POOL_KEY_PREFIX):
+            await self.pool.evict(key)
+        elif self.placement.evict_session is not None:
+            await self.placement.evict_session(key)
+
+    async def start(self) -> None:
+        # Single events subscription feeding container liveness checks
+        await self.state.start()
+        # Build the terminal image before accepting users, so no request waits on it
+        try:
+            image_ref = await get_image_builder().ensure_built(self.client)
+            print(f"Terminal image ready on {self.endpoint}: {image_ref}")
+        except Exception as e:
+            print(f"Terminal image build failed on {self.endpoint}: {e}")
+        # Evicts idle sessions when the host runs low on memory
+        await self.capacity.start()
+        # Start warming up containers in the background
+        await self.pool.start()
+
+    async def stop(self) -> None:
+        await self.pool.stop()
+        await self.capacity.stop()
+        await self.state.stop()
+        await self.client.close()
+
+
+class HashRing:
+    """Consistent hash ring, each node is placed at `vnodes` points."""
+
+    def __init__(self, vnodes: int = TerminalConfig.PLACEMENT_VNODES):
+        self.vnodes = vnodes
+        self._points: List[Tuple[int, str]] = []
+
+    def add(self, node: str) -> None:
+        for i in range(self.vnodes):
+            bisect.insort(self._points, (_hash(f"{node}#{i}"), node))
+
+    def walk(self, key: str) -> Iterator[str]:
+        """Distinct nodes in ring order, starting at the key's position."""
+        if not self._points:
+            return
+
+        start = bisect.bisect(self._points, (_hash(key), ""))
+        seen = set()
+        for i in range(len(self._points)):
+            node = self._points[(start + i) % len(self._points)][1]
+            if node not in seen:
+                seen.add(node)
+                yield node
+
+
+class Placement:
+    """
+    Places each user on a Docker node with consistent hashing and bounded loads: a user
+    goes to the first node clockwise from their hash whose number of placed users stays
+    under `load_factor` times the average, so a hot spot spills to the next node.
+
+    Placement is sticky: home volumes live on the daemon that created them, so a user
+    stays on the node recorded with their volume binding, across sessions and restarts.
+    Only users without a volume (or whose node is no longer configured) are hashed, so
+    a node added to DOCKER_ENDPOINTS takes its share of new users.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[str] = TerminalConfig.DOCKER_ENDPOINTS,
+        vnodes: int = TerminalConfig.PLACEMENT_VNODES,
+        load_factor: float = TerminalConfig.PLACEMENT_LOAD_FACTOR,
+        bindings: VolumeBindings = volume_bindings,
+    ):
+        self.load_factor = load_factor
+        self.bindings = bindings
+        self.ring = HashRing(vnodes)
+        self.nodes: Dict[str, DockerNode] = {}
+        # user id -> endpoint, for users with a session
+        self.assignments: Dict[str, str] = {}
+
+        # Wired by DockerManager
+        self.session_is_idle: Callable[[str], bool] = lambda user_id: False
+        self.evict_session: Optional[Callable[[str], Awaitable[None]]] = None
+
+        for endpoint in endpoints:
+            self._add(endpoint)
+
+    def _add(self, endpoint: str) -> DockerNode:
+        node = DockerNode(endpoint, self)
+        self.nodes[node.endpoint] = node
+        self.ring.add(node.endpoint)
+        return node
+
+    @property
+    def default_node(self) -> DockerNode:
+        return next(iter(self.nodes.values()))
+
+    # ------------------------------------------------------------- placement
+
+    def _load(self, endpoint: str) -> int:
+        return sum(1 for assigned in self.assignments.values() if assigned == endpoint)
+
+    def _max_load(self) -> int:
+        return math.ceil(self.load_factor * (len(self.assignments) + 1) / len(self.nodes))
+
+    def _choose(self, user_id: str) -> str:
+        max_load = self._max_load()
+        for endpoint in self.ring.walk(user_id):
+            if self._load(endpoint) < max_load:
+                return endpoint
+
+        # Can't happen with load_factor >= 1, kept as a safety net
+        return next(self.ring.walk(user_id))
+
+    def node_for(self, user_id: str) -> DockerNode:
+        """Node the user is placed on, placing them if they aren't yet."""
+        endpoint = self.assignments.get(user_id)
+        if endpoint not in self.nodes:
+            endpoint = self.bindings.node_for(user_id)
+            if endpoint not in self.nodes:
+                endpoint = self._choose(user_id)
+            self.assignments[user_id] = endpoint
+
+        return self.nodes[endpoint]
+
+    def release(self, user_id: str) -> None:
+        """The user's session ended, they no longer count in their node's load. Their
+        volume binding brings them back to the same node next time."""
+        self.assignments.pop(user_id, None)
+
+    # ------------------------------------------------------------- lifecycle
+
+    async def start(self) -> None:
+        await asyncio.gather(*(node.start() for node in self.nodes.values()))
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(node.stop() for node in self.nodes.values()))
+
+    def get_metrics(self) -> Dict:
+        return {
+            "load_factor": self.load_factor,
+            "max_load": self._max_load(),
+            "nodes": {
+                endpoint: {
+                    "users": self._load(endpoint),
+                    "events_connected": node.state.connected,
+                }
+                for endpoint, node in self.nodes.items()
+            },
+        }
+
+
+placement = Placement()
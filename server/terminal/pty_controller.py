@@ -3,16 +3,34 @@ import os
 import pty
 import fcntl
 import signal
-import select
 import termios
 import struct
-import re
 import asyncio
+import codecs
+import time
 import tty
-from typing import Dict, AsyncGenerator
+from typing import Dict, AsyncGenerator, List, Optional, Sequence, Tuple
+
+
+from terminal.metrics import ThroughputStats
+from terminal.scrollback import ScrollbackBuffer
+from terminal.output_pipeline import OutputPipeline, ScreenSwitches
+from terminal.shell_integration import (
+    PS0,
+    PS1,
+    ShellMarks,
+    parse_exit_code,
+    parse_prompt,
+    parse_time,
+)
+from terminal.terminal_config import TerminalConfig
+from terminal.vt_screen import VtScreen
 
+ALTERNATE_SCREEN_ENTER = b"\x1b[?1049h"
+ALTERNATE_SCREEN_EXIT = b"\x1b[?1049l"
 
-from terminal.terminal_config import TerminalConfig
+# Frames handed to websockets by every PTY
+output_throughput = ThroughputStats()
 
 
 class PtyController:
@@ -23,32 +41,75 @@ class PtyController:
         self.rows = config.DEFAULT_ROWS
         self.cols = config.DEFAULT_COLS
         self.in_alternate_screen = False
+        # Model of the alternate screen, only fed while an app is on it
+        self.screen = VtScreen(self.rows, self.cols)
+        # Filled by the event loop as soon as the PTY is readable, b"" marks EOF
+        self._output: "asyncio.Queue[bytes]" = asyncio.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._eof = False
+        # Every byte read, for replay after a reconnect. `delivered` is the offset
+        # right after the last byte handed to a reader
+        self.scrollback = ScrollbackBuffer(config.SCROLLBACK_BYTES)
+        self.delivered = 0
+        # No websocket attached: output only goes to the scrollback (and the scanner)
+        self.detached = False
+        # Output read but not sent to the client yet. Reading stops above the high
+        # watermark, the kernel's PTY buffer then blocks the process until the client
+        # catches up below the low watermark
+        self.buffered = 0
+        self.paused = False
+        self.pauses = 0
+        # Input not written yet, drained whenever the PTY is writable. Writers wait while
+        # more than INPUT_MAX_PENDING bytes are pending
+        self._input = bytearray()
+        self._input_space = asyncio.Event()
+        self._input_space.set()
+        # Keeps a character split across two reads whole
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Command boundaries marked by the shell (taken out of the output) and alternate
+        # screen switches, found in one pass over each chunk
+        self.output = OutputPipeline([ShellMarks(), ScreenSwitches()])
+        # Prompt (user, host, cwd) completed since `take_prompt_info()` last ran, and
+        # the exit code and duration of the last command
+        self._prompt: Optional[Dict[str, str]] = None
+        self._prompt_starting: Dict[str, str] = {}
+        # Start of the running command: the shell's clock and ours, for shells without one
+        self._command_started: Optional[Tuple[Optional[float], float]] = None
+        # When it started (wall clock) and its output so far
+        self._command_started_at = 0.0
+        self._command_output = 0
+        self._last_command: Optional[Dict] = None
 
     def set_raw_mode(self):
         """Set the PTY to raw mode."""
         if self.fd is not None:
             tty.setraw(self.fd)
 
-    async def create_pty(self, container_id: str) -> None:
-        """Create a new PTY connected to the container."""
+    async def create_pty(
+        self, container_id: str, docker_cli: Sequence[str] = ("docker",)
+    ) -> None:
+        """Create a new PTY connected to the container (`docker_cli` targets its daemon)."""
         self.pid, self.fd = pty.fork()
 
         if self.pid == 0:  # Child process
             # Execute docker exec to connect to the container
-            os.execvp("docker", ["docker", "exec", "-it", container_id, "bash"])
+            os.execvp(
+                docker_cli[0], [*docker_cli, "exec", "-it", container_id, "bash"]
+            )
         else:  # Parent process
             # Make the PTY non-blocking
             flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
             fcntl.fcntl(self.fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
             self.set_raw_mode()
+            self._start_reader()
 
             # Give the shell a moment to initialize
             await asyncio.sleep(0.1)
 
     async def configure_terminal(self) -> None:
         """Configure terminal settings."""
-        prompt_template = f'export PS1="{self.config.PROMPT_PREFIX}\\u@\\h:\\w{self.config.PROMPT_SUFFIX}"\n'
-        await self.write(prompt_template)
+        # Prompts made only of command boundary marks, see shell_integration.py
+        await self.write(f"export PS1='{PS1}' PS0='{PS0}'\n")
         await self.write("export TERM=xterm-256color\n")
 
         await self.write("stty sane\n")  # Reset to sane defaults
@@ -60,89 +121,314 @@ class PtyController:
 
         await self.resize(self.rows, self.cols)
 
-    # [TODO] This should be avoiding writing it down at the os level
+    def _start_reader(self) -> None:
+        """Have the event loop read the PTY whenever it becomes readable."""
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.fd, self._on_readable)
+
+    def _stop_reader(self) -> None:
+        if self._loop is not None and self.fd is not None:
+            self._loop.remove_reader(self.fd)
+        self._loop = None
+
+    def _on_readable(self) -> None:
+        try:
+            chunk = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO once the shell side of the PTY is gone
+            chunk = b""
+
+        if not chunk:
+            self._stop_reader()
+        self._feed_output(chunk)
+
+    def _feed_output(self, chunk: bytes) -> None:
+        """Hand output (b"" once the PTY is closed) to the readers, or only keep it while detached."""
+        if not chunk:
+            self._eof = True
+        self.scrollback.append(chunk)
+
+        if self.detached:
+            self.scan(chunk)
+            return
+
+        self._output.put_nowait(chunk)
+        self.buffered += len(chunk)
+        if not self.paused and self.buffered >= self.config.OUTPUT_HIGH_WATERMARK:
+            self.paused = True
+            self.pauses += 1
+            self._pause_reading()
+
+    def _release(self, size: int) -> None:
+        """`size` bytes of output were sent (or dropped), resume reading once below the low watermark."""
+        self.buffered = max(0, self.buffered - size)
+        if self.paused and self.buffered <= self.config.OUTPUT_LOW_WATERMARK:
+            self.paused = False
+            self._resume_reading()
+
+    def _pause_reading(self) -> None:
+        if self._loop is not None and self.fd is not None:
+            self._loop.remove_reader(self.fd)
+
+    def _resume_reading(self) -> None:
+        if self._loop is not None and self.fd is not None:
+            self._loop.add_reader(self.fd, self._on_readable)
+
+    def detach(self) -> None:
+        """Stop queueing output for a reader, it's kept in the scrollback until a reattach."""
+        # Output nobody read yet still moves the prompt and alternate screen state
+        while not self._output.empty():
+            chunk = self._output.get_nowait()
+            if chunk:
+                self.scan(chunk)
+        self.detached = True
+        # Nothing waits on the client anymore, the scrollback keeps the latest output
+        self._release(self.buffered)
+
+    def attach(self) -> None:
+        """Queue output for readers again, the new client catches up through `replay()`."""
+        self.detached = False
+        self.delivered = self.scrollback.end
+
+    def replay(self, offset: int) -> Tuple[int, bytes]:
+        """Output from `offset` on that is still in the scrollback, and where it starts."""
+        return self.scrollback.read_from(offset)
+
+    async def _next_chunk(self, timeout: Optional[float]) -> Optional[bytes]:
+        """Next chunk of output, None on timeout, b"" once the PTY is closed."""
+        if self._eof and self._output.empty():
+            return b""
+        if timeout is not None and timeout <= 0:
+            return None
+        try:
+            data = await asyncio.wait_for(self._output.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+        self.delivered += len(data)
+        return data
+
     async def write(self, data: str) -> None:
-        """Write raw data to the PTY."""
-        # [TO-DO]: We should use is_process_alive for that
-        if self.fd is not None:
-            os.write(self.fd, data.encode())
+        """Write raw data to the PTY, waiting while too much earlier input is still pending."""
+        if self.fd is None:
+            return
+
+        writing = bool(self._input)
+        self._input += data.encode()
+        if not writing:
+            self._flush_input()
+
+        # Pushes back on the websocket reader during a large paste
+        while len(self._input) > self.config.INPUT_MAX_PENDING and self.fd is not None:
+            self._input_space.clear()
+            await self._input_space.wait()
+
+    def _flush_input(self) -> None:
+        """Write pending input in chunks until the PTY would block, then wait for it to be writable."""
+        try:
+            while self._input:
+                written = os.write(self.fd, self._input[: self.config.INPUT_WRITE_CHUNK])
+                del self._input[:written]
+        except BlockingIOError:
+            pass
+        except OSError:
+            # The shell is gone, nobody will read it
+            self._input.clear()
+
+        loop = asyncio.get_running_loop()
+        if self._input:
+            loop.add_writer(self.fd, self._flush_input)
+        else:
+            loop.remove_writer(self.fd)
+
+        if len(self._input) <= self.config.INPUT_MAX_PENDING:
+            self._input_space.set()
+
+    def scan(self, data: bytes) -> Tuple[bytes, bool]:
+        """Track command boundaries and alternate screen switches in a chunk.
+
+        Returns the chunk's output without the shell's marks, and True if it completes a prompt.
+        """
+        data, events = self.output.feed(data)
+
+        prompt_seen = False
+        # Start of the alternate screen output in this chunk
+        screen_start = 0 if self.in_alternate_screen else None
+
+        for name, value, offset in events:
+            if name == "alternate_enter":
+                self.in_alternate_screen = True
+                self.screen.reset()
+                screen_start = offset
+            elif name == "alternate_exit":
+                if screen_start is not None:
+                    self.screen.feed(data[screen_start:offset])
+                self.in_alternate_screen = False
+                screen_start = None
+            else:
+                prompt_seen = self._on_mark(*value, offset) or prompt_seen
+
+        if screen_start is not None:
+            self.screen.feed(data[screen_start:])
+        if self._command_started is not None:
+            self._command_output += len(data)
+
+        return data, prompt_seen
+
+    def _on_mark(self, mark: str, params: str, offset: int) -> bool:
+        """Update the command state from a shell mark at `offset` in the chunk's output;
+        True if it completes a prompt."""
+        if mark == "A":
+            self._prompt_starting = parse_prompt(params)
+        elif mark == "B":
+            self._prompt = self._prompt_starting
+            return True
+        elif mark == "C":
+            self._command_started = (parse_time(params), time.perf_counter())
+            self._command_started_at = time.time()
+            # The chunk's output is added once it's scanned, minus what came before
+            self._command_output = -offset
+        elif mark == "D" and self._command_started is not None:
+            shell_started, started = self._command_started
+            shell_ended = parse_time(params)
+            self._last_command = {
+                "exit_code": parse_exit_code(params),
+                "duration": (
+                    shell_ended - shell_started
+                    if shell_started is not None and shell_ended is not None
+                    else time.perf_counter() - started
+                ),
+                "started_at": self._command_started_at,
+                "output_bytes": self._command_output + offset,
+            }
+            self._command_started = None
+        return False
+
+    def command_running(self) -> bool:
+        """A command line was submitted and its prompt hasn't come back yet."""
+        return self._command_started is not None
+
+    def take_prompt_info(self) -> Dict[str, str]:
+        """user, host and cwd of the prompt read since the last call, {} if there was none."""
+        prompt, self._prompt = self._prompt, None
+        return prompt or {}
+
+    def take_last_command(self) -> Optional[Dict]:
+        """Exit code, duration, start time and output size of the command finished since
+        the last call, if any."""
+        command, self._last_command = self._last_command, None
+        return command
 
     async def read_continuous_until_prompt(
-        self, timeout: float = 120.0
-    ) -> AsyncGenerator[str, None]:
-        """Continuously read from PTY and yield chunks until prompt appears or alternate screen is entered."""
-        output_buffer = ""
-        end_time = asyncio.get_event_loop().time() + timeout
+        self,
+        timeout: Optional[float] = 120.0,
+        flush_interval: float = TerminalConfig.OUTPUT_FLUSH_INTERVAL,
+        max_frame_bytes: int = TerminalConfig.OUTPUT_MAX_FRAME_BYTES,
+        through_alternate_screen: bool = False,
+    ) -> AsyncGenerator[bytes, None]:
+        """Continuously read from PTY and yield chunks until prompt appears or alternate screen is entered.
+
+        With `through_alternate_screen`, reading goes on while an app is on the alternate
+        screen and ends with the prompt after it exits. A `timeout` of None never expires.
+
+        Output arriving after a quiet period is yielded right away (keystroke echo), while
+        a steady stream is coalesced into one chunk per `flush_interval` or `max_frame_bytes`.
+        A chunk counts as buffered until the consumer asks for the next one.
+        """
+        loop = asyncio.get_running_loop()
+        end_time = loop.time() + timeout if timeout is not None else None
+        pending: List[bytes] = []
+        pending_size = 0
+        last_flush = float("-inf")
+        finished = False
+        # Taken from the queue, not released yet
+        held = 0
 
-        while asyncio.get_event_loop().time() < end_time:
-            r, _, _ = select.select([self.fd], [], [], 0.05)
+        try:
+            while not finished:
+                wait = end_time - loop.time() if end_time is not None else None
+                if pending:
+                    flush_wait = last_flush + flush_interval - loop.time()
+                    wait = flush_wait if wait is None else min(wait, flush_wait)
 
-            if r:
-                try:
-                    chunk = os.read(self.fd, 4096).decode(errors="replace")
-                    output_buffer += chunk
-                    yield chunk
+                data = await self._next_chunk(wait)
 
-                    # Check if we've entered alternate screen mode
-                    if self.check_alternate_screen(chunk):
-                        break
+                if data is None and pending:
+                    # Window elapsed with output still pending
+                    pass
+                elif not data:
+                    # Timed out, or the shell is gone
+                    finished = True
+                else:
+                    # Markers split across two reads are still seen, the scanner keeps its state
+                    held += len(data)
+                    data, prompt_seen = self.scan(data)
+                    if data:
+                        pending.append(data)
+                        pending_size += len(data)
+                    elif not pending:
+                        # Nothing of it goes out (marks, the command line echo)
+                        self._release(held)
+                        held = 0
+
+                    # Check if we've entered alternate screen mode, or received the complete
+                    # prompt (only if not in alternate screen)
+                    if through_alternate_screen:
+                        finished = prompt_seen and not self.in_alternate_screen
+                    else:
+                        finished = self.in_alternate_screen or prompt_seen
 
-                    # Check if we've received the complete prompt (only if not in alternate screen)
                     if (
-                        not self.in_alternate_screen
-                        and self.config.PROMPT_SUFFIX in chunk
+                        not finished
+                        and pending_size < max_frame_bytes
+                        and loop.time() - last_flush < flush_interval
                     ):
-                        break
-
-                except (OSError, BlockingIOError):
-                    continue
-
-            await asyncio.sleep(0.05)
+                        continue
+
+                if pending:
+                    frame = b"".join(pending)
+                    pending.clear()
+                    pending_size = 0
+                    last_flush = loop.time()
+                    output_throughput.record(len(frame))
+                    yield frame
+                    # Everything taken so far went out in this frame
+                    self._release(held)
+                    held = 0
+        finally:
+            # Closed early, or ended with output taken but never yielded
+            self._release(held)
 
     # This value must be tested to determine a good approach when deploying as well =')
     async def read_immediate_output(self, timeout: float = 0.03) -> str:
-        """Quickly read available output from PTY."""
-        output = ""
-        end_time = asyncio.get_event_loop().time() + timeout
-
-        while asyncio.get_event_loop().time() < end_time:
-            r, _, _ = select.select([self.fd], [], [], 0.03)
-            if r:
-                chunk = os.read(self.fd, 4096).decode(errors="replace")
-                output += chunk
-            await asyncio.sleep(0.01)
-
-        return output
-
-    def parse_prompt_info(self, output: str) -> Dict[str, str]:
-        """Extract user and working directory from the prompt."""
-        match = re.search(
-            f"{self.config.PROMPT_PREFIX}(.+?){self.config.PROMPT_SUFFIX[:-1]}", output
-        )
-        if match:
-            prompt_content = match.group(1)
-            try:
-                user_host, cwd = prompt_content.split(":", 1)
-                user, host = user_host.split("@")
-                return {"user": user, "host": host, "cwd": cwd}
-            except ValueError:
-                return {}
-        return {}
-
-    def check_alternate_screen(self, data: str) -> bool:
-        """Check if alternate screen mode is entered or exited."""
-        if "\x1b[?1049h" in data:
-            self.in_alternate_screen = True
-        elif "\x1b[?1049l" in data:
-            self.in_alternate_screen = False
-
-        return self.in_alternate_screen
+        """Collect the output that arrives within `timeout`."""
+        loop = asyncio.get_running_loop()
+        end_time = loop.time() + timeout
+        chunks = []
+
+        while True:
+            data = await self._next_chunk(end_time - loop.time())
+            if not data:
+                break
+            # Handed straight to the caller
+            self._release(len(data))
+            data, _ = self.scan(data)
+            chunks.append(data)
+
+        return self.decode(b"".join(chunks))
+
+    def decode(self, data: bytes) -> str:
+        """Decode output in stream order, a character split between calls comes out whole."""
+        return self._decoder.decode(data)
 
     async def resize(self, rows: int, cols: int, capture_output: bool = True) -> str:
         """Resize the terminal, optionally capturing any immediate response."""
         if self.fd is not None:
             self.rows = rows
             self.cols = cols
+            self.screen.resize(rows, cols)
 
             # Create the window size structure
             winsize = struct.pack("HHHH", rows, cols, 0, 0)
@@ -174,6 +460,14 @@ class PtyController:
         if self.pid is None:
             return False
 
+        try:
+            # Reap it if it already exited, a zombie would still answer kill(pid, 0)
+            pid, _ = os.waitpid(self.pid, os.WNOHANG)
+            if pid != 0:
+                return False
+        except ChildProcessError:
+            pass
+
         try:
             os.kill(self.pid, 0)
             return True
@@ -191,7 +485,20 @@ class PtyController:
                 pass
 
         if self.fd:
+            self._stop_reader()
+            asyncio.get_running_loop().remove_writer(self.fd)
             os.close(self.fd)
 
+        # Writers waiting on a full buffer give up
+        self._input.clear()
+        self._input_space.set()
+        self._end_output()
+
         self.pid = None
         self.fd = None
+
+    def _end_output(self) -> None:
+        """Wake readers waiting for output (even with no timeout): none will come anymore."""
+        if not self._eof:
+            self._eof = True
+            self._output.put_nowait(b"")
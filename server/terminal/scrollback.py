@@ -0,0 +1,62 @@
+# scrollback.py - Bounded record of a terminal's output, addressed by byte offset
+from typing import Tuple
+
+
+class ScrollbackBuffer:
+    """
+    Ring buffer over the last `capacity` bytes of output. Offsets count every byte
+    ever appended, so a client can ask for everything after the last byte it saw.
+
+    The buffer grows up to `capacity` and is then overwritten in place, a quiet
+    session never allocates the full size.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = bytearray()
+        # Offset right after the last byte appended
+        self.end = 0
+
+    @property
+    def start(self) -> int:
+        """Offset of the oldest byte still kept."""
+        return max(0, self.end - self.capacity)
+
+    def append(self, data: bytes) -> None:
+        if len(data) >= self.capacity:
+            # Only the tail survives, laid out where the ring expects it
+            self.end += len(data)
+            data = data[-self.capacity :]
+            split = self.capacity - self.end % self.capacity
+            self._buffer = bytearray(data[split:] + data[:split])
+            return
+
+        # Still growing, no wrap around yet
+        room = self.capacity - len(self._buffer)
+        if room > 0:
+            taken = data[:room]
+            self._buffer += taken
+            self.end += len(taken)
+            data = data[room:]
+            if not data:
+                return
+
+        position = self.end % self.capacity
+        first = min(len(data), self.capacity - position)
+        self._buffer[position : position + first] = data[:first]
+        self._buffer[: len(data) - first] = data[first:]
+        self.end += len(data)
+
+    def read_from(self, offset: int) -> Tuple[int, bytes]:
+        """Bytes from `offset` to the end, and the offset they actually start at
+        (later than `offset` if that part was already overwritten)."""
+        offset = min(max(offset, self.start), self.end)
+        size = self.end - offset
+        if size == 0:
+            return offset, b""
+
+        position = offset % self.capacity
+        first = min(size, self.capacity - position)
+        return offset, bytes(self._buffer[position : position + first]) + bytes(
+            self._buffer[: size - first]
+        )
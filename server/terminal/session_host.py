@@ -0,0 +1,96 @@
+# session_host.py - The terminals (tabs) of one user's container
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from terminal.agent_pty import AgentPtyController
+from terminal.metrics import LatencyStats
+from terminal.xoblas_editor import XoblasEditor
+
+# Time to open a tab in a running container, and to close one
+terminal_metrics = {"open": LatencyStats(), "close": LatencyStats()}
+
+
+class SessionHost:
+    """
+    Named terminals of one user, each a PTY in the same container. They share the
+    container, its exec agent and the user's websocket, so opening a tab is a PTY
+    in the container rather than another host process.
+    """
+
+    # Hosts kept across websocket connections, by session id
+    hosts: Dict[str, "SessionHost"] = {}
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.terminals: Dict[str, XoblasEditor] = {}
+        # A websocket is using this host right now
+        self.attached = False
+
+    def get(self, terminal_id: str) -> Optional[XoblasEditor]:
+        """The terminal if its shell is still running."""
+        editor = self.terminals.get(terminal_id)
+        if editor is not None and editor.pty.is_process_alive():
+            return editor
+        return None
+
+    async def open(
+        self,
+        terminal_id: str,
+        on_queue_position: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> XoblasEditor:
+        """Start a new terminal, replacing one with the same id."""
+        started = time.perf_counter()
+        editor = XoblasEditor(user_id=self.user_id, terminal_id=terminal_id)
+        await editor.start(on_queue_position)
+
+        previous = self.terminals.get(terminal_id)
+        if previous is not None:
+            await previous.close()
+        self.terminals[terminal_id] = editor
+
+        terminal_metrics["open"].record(time.perf_counter() - started)
+        return editor
+
+    async def close(self, terminal_id: str) -> None:
+        editor = self.terminals.pop(terminal_id, None)
+        if editor is not None:
+            started = time.perf_counter()
+            await editor.close()
+            terminal_metrics["close"].record(time.perf_counter() - started)
+
+    async def close_all(self) -> None:
+        for terminal_id in list(self.terminals):
+            await self.close(terminal_id)
+
+    def detach(self) -> None:
+        """The websocket is gone, output goes to each terminal's scrollback."""
+        self.attached = False
+        for editor in self.terminals.values():
+            editor.pty.detach()
+
+    def list(self) -> List[str]:
+        return [terminal_id for terminal_id in self.terminals if self.get(terminal_id)]
+
+    @classmethod
+    def get_metrics(cls) -> Dict:
+        editors = [
+            editor for host in cls.hosts.values() for editor in host.terminals.values()
+        ]
+        agent_hosted = sum(
+            1 for editor in editors if isinstance(editor.pty, AgentPtyController)
+        )
+        return {
+            "sessions": len(cls.hosts),
+            "terminals": len(editors),
+            # One `docker exec` client process on the host for each of these
+            "host_processes": len(editors) - agent_hosted,
+            "agent_hosted": agent_hosted,
+            # Output waiting on each session's client, and terminals stopped on it
+            "buffered_bytes": {
+                session_id: sum(editor.pty.buffered for editor in host.terminals.values())
+                for session_id, host in cls.hosts.items()
+            },
+            "paused": sum(1 for editor in editors if editor.pty.paused),
+            "pauses": sum(editor.pty.pauses for editor in editors),
+            **{name: stats.summary() for name, stats in terminal_metrics.items()},
+        }
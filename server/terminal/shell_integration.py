@@ -0,0 +1,80 @@
+# shell_integration.py - Command boundaries marked by the shell itself (OSC 133)
+#
+# The prompts set by `PtyController.configure_terminal` print nothing visible (the client
+# draws the prompt from user, host and cwd), only marks: ESC ] 133 ; <mark> BEL
+#
+#   D;<exit code>;t=<time>           the previous command ended
+#   A;user=<u>;host=<h>;cwd=<dir>    the prompt starts
+#   B                                the prompt ends, the shell reads a command
+#   C;t=<time>                       the command was read, its output follows (from PS0)
+#
+# Times are the shell's $EPOCHREALTIME (bash 5), empty on older shells.
+#
+# Between B and C the terminal only shows the command line being read (readline echo).
+from typing import Dict, Optional
+
+from terminal.output_pipeline import OutputPipeline, OutputStage
+
+MARK = b"\x1b]133;"
+BEL = b"\x07"
+# Longest mark parameters; an unterminated mark is passed through as output past that
+MAX_MARK = 4096
+
+PS1 = (
+    "\\[\\e]133;D;$?;t=${EPOCHREALTIME}\\a"
+    "\\e]133;A;user=\\u;host=\\h;cwd=\\w\\a\\e]133;B\\a\\]"
+)
+PS0 = "\\e]133;C;t=${EPOCHREALTIME}\\a"
+
+
+def parse_prompt(params: str) -> Dict[str, str]:
+    """user, host and cwd of an A mark; cwd comes last, it may contain ';'."""
+    info = {}
+    for field in params.split(";", 2):
+        key, _, value = field.partition("=")
+        info[key] = value
+    return info
+
+
+def parse_exit_code(params: str) -> Optional[int]:
+    try:
+        return int(params.split(";", 1)[0])
+    except ValueError:
+        return None
+
+
+def parse_time(params: str) -> Optional[float]:
+    """The shell's clock in a C or D mark, None if it didn't give one."""
+    for field in params.split(";"):
+        if field.startswith("t="):
+            try:
+                # The decimal separator follows the shell's locale
+                return float(field[2:].replace(",", "."))
+            except ValueError:
+                return None
+    return None
+
+
+class ShellMarks(OutputStage):
+    """
+    The marks as a pipeline stage: they come out of the output as ("mark", (mark, params))
+    events, and the command line echo between B and C is suppressed, so nothing has to be
+    matched against the output afterwards. An unterminated mark past MAX_MARK is output.
+    """
+
+    pattern = rb"\]133;[^\x07]{0,%d}\x07" % MAX_MARK
+    partial = rb"\](?:1(?:3(?:3(?:;[^\x07]{0,%d})?)?)?)?" % MAX_MARK
+
+    def handle(self, token: bytes, pipeline: OutputPipeline) -> bytes:
+        mark, _, params = token[len(MARK) : -len(BEL)].decode(errors="replace").partition(";")
+        pipeline.event("mark", (mark, params))
+        # Between B and C: the shell is reading a command line
+        pipeline.suppress = mark == "B"
+        return b""
+
+
+def strip_marks(data: bytes) -> bytes:
+    """`data` without marks, for output read outside the stream (scrollback replay)."""
+    pipeline = OutputPipeline([ShellMarks()])
+    output, _ = pipeline.feed(data)
+    return output + pipeline.flush()
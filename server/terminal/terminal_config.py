@@ -7,7 +7,71 @@ class TerminalConfig:
     DEFAULT_IMAGE_NAME = "pty-shell-image"
     DEFAULT_ROWS = 24
     DEFAULT_COLS = 80
-    PROMPT_PREFIX = "__START__"
-    PROMPT_SUFFIX = "__END__$"
+    # Docker Engine API (unix socket of the local daemon)
+    DOCKER_SOCKET_PATH = os.getenv("DOCKER_SOCKET_PATH", "/var/run/docker.sock")
+    DOCKER_API_VERSION = os.getenv("DOCKER_API_VERSION", "v1.41")
+    DOCKER_API_POOL_SIZE = int(os.getenv("DOCKER_API_POOL_SIZE", "16"))
+    # Daemons user containers are spread over (comma separated unix:// or tcp:// URLs)
+    DOCKER_ENDPOINTS = [
+        endpoint.strip()
+        for endpoint in os.getenv("DOCKER_ENDPOINTS", DOCKER_SOCKET_PATH).split(",")
+        if endpoint.strip()
+    ]
+    # Consistent hashing: ring points per endpoint, and how far above the average
+    # number of users an endpoint may go before users spill over to the next one
+    PLACEMENT_VNODES = int(os.getenv("PLACEMENT_VNODES", "160"))
+    PLACEMENT_LOAD_FACTOR = float(os.getenv("PLACEMENT_LOAD_FACTOR", "1.25"))
+    # Seconds an inspect result is trusted while the events stream is down
+    CONTAINER_STATE_TTL = float(os.getenv("CONTAINER_STATE_TTL", "1.0"))
+    # Idle sessions (no websocket left) are paused first, then stopped
+    IDLE_PAUSE_AFTER = float(os.getenv("IDLE_PAUSE_AFTER", "30"))
+    IDLE_STOP_AFTER = float(os.getenv("IDLE_STOP_AFTER", "900"))
+    # Pre-started containers handed to new users (0 disables the pool)
+    WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "2"))
+    POOL_BINDINGS_PATH = os.getenv(
+        "POOL_BINDINGS_PATH", os.getcwd() + "/pool_bindings.json"
+    )
+    # Host capacity: container count, memory budget (count x per-container limit) and
+    # the host's MemAvailable floor below which idle sessions get evicted
+    MAX_CONTAINERS = int(os.getenv("MAX_CONTAINERS", "50"))
+    MAX_MEMORY_MB = int(os.getenv("MAX_MEMORY_MB", "16384"))
+    CONTAINER_MEMORY_MB = int(os.getenv("CONTAINER_MEMORY_MB", "512"))
+    MIN_HOST_AVAILABLE_MB = int(os.getenv("MIN_HOST_AVAILABLE_MB", "512"))
+    CAPACITY_CHECK_INTERVAL = float(os.getenv("CAPACITY_CHECK_INTERVAL", "15"))
+    # Terminal output is coalesced into one websocket frame per interval or size,
+    # output after a quiet period is still sent immediately
+    OUTPUT_FLUSH_INTERVAL = float(os.getenv("OUTPUT_FLUSH_INTERVAL", "0.016"))
+    OUTPUT_MAX_FRAME_BYTES = int(os.getenv("OUTPUT_MAX_FRAME_BYTES", "65536"))
+    # Flow control: a terminal stops reading its PTY once this much output waits for a
+    # slow client, and reads again when it's down to the low watermark
+    OUTPUT_HIGH_WATERMARK = int(os.getenv("OUTPUT_HIGH_WATERMARK", "1048576"))
+    OUTPUT_LOW_WATERMARK = int(os.getenv("OUTPUT_LOW_WATERMARK", "262144"))
+    # Input is written to the PTY in chunks as it drains, a writer waits while more
+    # than INPUT_MAX_PENDING bytes (a large paste) are still pending
+    INPUT_WRITE_CHUNK = int(os.getenv("INPUT_WRITE_CHUNK", "4096"))
+    INPUT_MAX_PENDING = int(os.getenv("INPUT_MAX_PENDING", "1048576"))
+    # Commands run in terminals: the latest COMMAND_HISTORY_SIZE are kept in memory and
+    # written to the database in batches, every COMMAND_HISTORY_FLUSH_INTERVAL seconds
+    # or once COMMAND_HISTORY_BATCH are waiting. Longer command lines are cut
+    COMMAND_HISTORY_SIZE = int(os.getenv("COMMAND_HISTORY_SIZE", "10000"))
+    COMMAND_HISTORY_BATCH = int(os.getenv("COMMAND_HISTORY_BATCH", "500"))
+    COMMAND_HISTORY_FLUSH_INTERVAL = float(
+        os.getenv("COMMAND_HISTORY_FLUSH_INTERVAL", "10")
+    )
+    COMMAND_HISTORY_MAX_LENGTH = int(os.getenv("COMMAND_HISTORY_MAX_LENGTH", "1024"))
+    # Output kept per terminal for replay to a reconnecting client
+    SCROLLBACK_BYTES = int(os.getenv("SCROLLBACK_BYTES", "262144"))
+    # Workspace indexed for `xoblas` (in the container) and the directories its index
+    # doesn't enter, hidden ones included. A tree page holds at most TREE_PAGE_SIZE entries
+    CONTAINER_HOME = "/home/termuser"
+    WORKSPACE_ROOT = "/home/termuser/root"
+    TREE_IGNORE = tuple(
+        name.strip()
+        for name in os.getenv(
+            "TREE_IGNORE", "node_modules,__pycache__,venv,site-packages"
+        ).split(",")
+        if name.strip()
+    )
+    TREE_PAGE_SIZE = int(os.getenv("TREE_PAGE_SIZE", "500"))
     # This will be used to create a file structure to be rendered in the future
     CURRENT_WORKDIR = "/home/termuser/root/"
@@ -0,0 +1,131 @@
+# tracing.py - Per-session bring-up traces and per-stage latency histograms
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, List, Optional
+
+from terminal.metrics import Histogram
+
+# Trace of the session being brought up by the current task (inherited by tasks it creates)
+current_trace: ContextVar[Optional["SessionTrace"]] = ContextVar(
+    "current_trace", default=None
+)
+
+
+class SessionTrace:
+    """Timed stages of one session bring-up (terminal or LSP), offsets relative to its start."""
+
+    def __init__(self, kind: str, user_id: str):
+        self.kind = kind
+        self.user_id = user_id
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self.stages: List[Dict] = []
+
+    def add_stage(
+        self, name: str, started: float, duration: float, error: Optional[str] = None
+    ) -> None:
+        self.stages.append(
+            {
+                "stage": name,
+                "offset_ms": round((started - self._started) * 1000, 2),
+                "duration_ms": round(duration * 1000, 2),
+                **({"error": error} if error else {}),
+            }
+        )
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.duration = time.perf_counter() - self._started
+        self.error = error
+
+    def to_dict(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "started_at": self.started_at,
+            "duration_ms": (
+                round(self.duration * 1000, 2) if self.duration is not None else None
+            ),
+            "error": self.error,
+            "stages": self.stages,
+        }
+
+
+class Tracer:
+    """
+    Every `stage()` lands in a histogram per stage name, and in the trace of the session
+    being brought up when there is one. Startup work shared by several callers (a
+    single-flight task) is traced once, in the trace of the caller that started it.
+    """
+
+    def __init__(self, max_traces: int = 200):
+        self.stage_histograms: Dict[str, Histogram] = {}
+        self.total_histograms: Dict[str, Histogram] = {}
+        self.recent: Deque[SessionTrace] = deque(maxlen=max_traces)
+
+    @contextmanager
+    def trace(self, kind: str, user_id: str) -> Iterator[SessionTrace]:
+        """Trace a session bring-up: every stage run inside the block is recorded."""
+        session_trace = SessionTrace(kind, user_id)
+        token = current_trace.set(session_trace)
+        try:
+            yield session_trace
+        except BaseException as e:
+            session_trace.finish(error=f"{type(e).__name__}: {e}")
+            raise
+        else:
+            session_trace.finish()
+            self.total_histograms.setdefault(kind, Histogram()).record(
+                session_trace.duration
+            )
+        finally:
+            current_trace.reset(token)
+            self.recent.append(session_trace)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self.stage_histograms.setdefault(name, Histogram()).record(duration)
+
+            session_trace = current_trace.get()
+            if session_trace is not None:
+                session_trace.add_stage(name, started, duration, error)
+
+    def get_traces(self, user_id: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        traces = [
+            t for t in reversed(self.recent) if user_id is None or t.user_id == user_id
+        ]
+        return [t.to_dict() for t in traces[:limit]]
+
+    def get_stage_metrics(self) -> Dict:
+        return {
+            "total": {
+                kind: histogram.summary()
+                for kind, histogram in self.total_histograms.items()
+            },
+            # Slowest stage first, by p95
+            "stages": dict(
+                sorted(
+                    (
+                        (name, histogram.summary())
+                        for name, histogram in self.stage_histograms.items()
+                    ),
+                    key=lambda item: item[1].get("p95_ms", 0),
+                    reverse=True,
+                )
+            ),
+        }
+
+
+tracer = Tracer()
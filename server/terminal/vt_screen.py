@@ -0,0 +1,579 @@
+# vt_screen.py - Server-side model of the alternate screen (VT100/xterm subset)
+import codecs
+import re
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+# A cell is (text, sgr): the character and the SGR parameters it was written with.
+# The right half of a wide character is an empty text cell
+Cell = Tuple[str, str]
+
+_TOKEN = re.compile(
+    r"\x1b\[([?>=!]?)([0-9;:]*)[ -/]*([@-~])"  # CSI
+    r"|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)"  # OSC (window title...)
+    r"|\x1bP[^\x1b]*\x1b\\"  # DCS
+    r"|\x1b[()*+]."  # Character set designation
+    r"|\x1b(?![\[\]P()*+])[ -/]*([0-~])"  # Other escapes
+    r"|[\x00-\x1f\x7f]"
+)
+
+# Longest escape sequence kept around while waiting for the rest of it
+_MAX_PENDING = 4096
+
+_ALTERNATE_MODES = ("47", "1047", "1049")
+# Modes that change what the client sends (cursor keys, mouse reporting, bracketed
+# paste), the client has to mirror them
+_INPUT_MODES = (1, 1000, 1002, 1003, 1005, 1006, 2004)
+
+
+def _parse_params(params: str) -> List[int]:
+    return [int(p) if p else 0 for p in params.replace(":", ";").split(";")]
+
+
+class VtScreen:
+    """
+    Cell grid driven by a VT100/xterm state machine: cursor movement, erasing,
+    insert/delete, scroll regions and SGR attributes, which is what full-screen
+    apps (vim, nano, htop) use.
+
+    `diff()` renders what changed since the previous frame as ANSI text (only the
+    changed span of every damaged row), `snapshot()` renders the whole screen, so a
+    client that reconnects or resizes gets a single repaint.
+    """
+
+    def __init__(self, rows: int, cols: int):
+        self.rows = rows
+        self.cols = cols
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.reset()
+
+    def reset(self) -> None:
+        """Blank screen with the cursor at home, as right after entering the alternate screen."""
+        self._decoder.reset()
+        self._pending = ""
+        self.grid: List[List[Cell]] = [self._blank_row("") for _ in range(self.rows)]
+        self.y = 0
+        self.x = 0
+        self.wrap_pending = False
+        self.autowrap = True
+        self.cursor_visible = True
+        self.modes: Dict[int, bool] = {}
+        self._sent_modes: Dict[int, bool] = {}
+        self.top = 0
+        self.bottom = self.rows - 1
+        self._saved: Optional[Tuple[int, int, Dict]] = None
+        self._attrs: Dict = {}
+        self.sgr = ""
+        self._erase_sgr = ""
+        self._last_char = " "
+        # What the client was last sent
+        self._sent: List[List[Cell]] = [self._blank_row("") for _ in range(self.rows)]
+        self._sent_cursor: Optional[Tuple[int, int, bool]] = None
+        self.dirty: Set[int] = set(range(self.rows))
+        # Scrolls since the last frame as (top, bottom, rows up (or down if negative),
+        # erase sgr), replayed on the client instead of repainting the shifted rows
+        self._scrolls: List[Tuple[int, int, int, str]] = []
+
+    def resize(self, rows: int, cols: int) -> None:
+        if (rows, cols) == (self.rows, self.cols):
+            return
+
+        for row in self.grid:
+            del row[cols:]
+            row.extend([(" ", "")] * (cols - len(row)))
+        del self.grid[rows:]
+        self.grid.extend(self._blank_row("") for _ in range(rows - len(self.grid)))
+
+        self.rows, self.cols = rows, cols
+        self.y = min(self.y, rows - 1)
+        self.x = min(self.x, cols - 1)
+        self.wrap_pending = False
+        self.top, self.bottom = 0, rows - 1
+        # The client repaints from a snapshot after a resize
+        self._sent = [self._blank_row("") for _ in range(rows)]
+        self._sent_cursor = None
+        self.dirty = set(range(rows))
+        self._scrolls.clear()
+
+    def feed(self, data: bytes) -> None:
+        """Apply a chunk of PTY output, sequences split across chunks are completed later."""
+        text = self._pending + self._decoder.decode(data)
+        self._pending = ""
+
+        # Hold back a trailing escape sequence that isn't complete yet
+        last_escape = text.rfind("\x1b")
+        if last_escape != -1:
+            match = _TOKEN.match(text, last_escape)
+            if match is None or match.group() == "\x1b":
+                if len(text) - last_escape <= _MAX_PENDING:
+                    self._pending = text[last_escape:]
+                text = text[:last_escape]
+
+        position = 0
+        for match in _TOKEN.finditer(text):
+            if match.start() > position:
+                self._write_text(text[position : match.start()])
+            position = match.end()
+
+            token = match.group()
+            if match.group(3) is not None:
+                self._csi(match.group(1), match.group(2), match.group(3))
+            elif match.group(4) is not None:
+                self._escape(token)
+            elif len(token) == 1:
+                self._control(token)
+
+        if position < len(text):
+            self._write_text(text[position:])
+
+    def snapshot(self) -> str:
+        """Full repaint of the screen, the client ends up identical to the model."""
+        parts = ["\x1b[0m\x1b[r\x1b[H\x1b[2J"]
+        for y, row in enumerate(self.grid):
+            end = self._content_end(row)
+            if end:
+                parts.append(f"\x1b[{y + 1};1H")
+                parts.append(self._render(row, 0, end))
+            self._sent[y] = row[:]
+
+        self.dirty.clear()
+        self._scrolls.clear()
+        self._sent_modes = {}
+        parts.append(self._render_modes())
+        parts.append(self._render_cursor())
+        return "".join(parts)
+
+    def diff(self) -> str:
+        """Repaint of the cells damaged since the last frame, "" if nothing changed."""
+        parts = self._replay_scrolls()
+        for y in sorted(self.dirty):
+            row, sent = self.grid[y], self._sent[y]
+            first = next((x for x in range(self.cols) if row[x] != sent[x]), None)
+            if first is None:
+                continue
+            last = next(x for x in range(self.cols - 1, -1, -1) if row[x] != sent[x])
+            end = self._content_end(row)
+
+            # Wide characters are always repainted whole
+            if first > 0 and row[first][0] == "":
+                first -= 1
+
+            parts.append(f"\x1b[{y + 1};{first + 1}H")
+            if first < end:
+                parts.append(self._render(row, first, min(last + 1, end)))
+            if last >= end:
+                # The rest of the row is blank
+                parts.append("\x1b[K")
+            self._sent[y] = row[:]
+
+        self.dirty.clear()
+        parts.append(self._render_modes())
+        cursor = (self.y, self.x, self.cursor_visible)
+        if any(parts) or cursor != self._sent_cursor:
+            parts.append(self._render_cursor())
+        return "".join(parts)
+
+    def _replay_scrolls(self) -> List[str]:
+        """Scroll the client the way the app scrolled the model, keeping `_sent` in step."""
+        parts = []
+        for top, bottom, n, erase_sgr in self._scrolls:
+            region = self._sent[top : bottom + 1]
+            blanks = [[(" ", erase_sgr)] * self.cols for _ in range(abs(n))]
+            self._sent[top : bottom + 1] = (
+                region[n:] + blanks if n > 0 else blanks + region[:n]
+            )
+            parts.append(f"\x1b[{top + 1};{bottom + 1}r")
+            scroll = f"\x1b[{abs(n)}{'S' if n > 0 else 'T'}"
+            parts.append(f"\x1b[0;{erase_sgr}m{scroll}\x1b[0m" if erase_sgr else scroll)
+
+        if parts:
+            parts.append("\x1b[r")
+        self._scrolls.clear()
+        return parts
+
+    def _render(self, row: List[Cell], start: int, end: int) -> str:
+        # Every frame leaves the client with default attributes
+        parts = []
+        current = ""
+        for text, sgr in row[start:end]:
+            if not text:
+                continue
+            if sgr != current:
+                parts.append(f"\x1b[0;{sgr}m" if sgr else "\x1b[0m")
+                current = sgr
+            parts.append(text)
+        if current:
+            parts.append("\x1b[0m")
+        return "".join(parts)
+
+    def _render_modes(self) -> str:
+        changed = [
+            f"\x1b[?{mode}{'h' if enabled else 'l'}"
+            for mode, enabled in self.modes.items()
+            if self._sent_modes.get(mode, False) != enabled
+        ]
+        self._sent_modes = dict(self.modes)
+        return "".join(changed)
+
+    def _render_cursor(self) -> str:
+        self._sent_cursor = (self.y, self.x, self.cursor_visible)
+        visibility = "\x1b[?25h" if self.cursor_visible else "\x1b[?25l"
+        return f"\x1b[{self.y + 1};{self.x + 1}H{visibility}"
+
+    def _content_end(self, row: List[Cell]) -> int:
+        """Index after the last cell that isn't a default blank."""
+        end = len(row)
+        while end and row[end - 1] == (" ", ""):
+            end -= 1
+        return end
+
+    def _blank_row(self, sgr: str) -> List[Cell]:
+        return [(" ", sgr)] * self.cols
+
+    # Text
+
+    def _write_text(self, text: str) -> None:
+        if text.isascii():
+            self._write_ascii(text)
+            return
+
+        for char in text:
+            if unicodedata.combining(char):
+                # Combining marks join the character before the cursor
+                x = self.x if self.wrap_pending else self.x - 1
+                if x > 0 and self.grid[self.y][x][0] == "":
+                    x -= 1
+                if x >= 0:
+                    cell_text, sgr = self.grid[self.y][x]
+                    self.grid[self.y][x] = (cell_text + char, sgr)
+                    self.dirty.add(self.y)
+            elif unicodedata.east_asian_width(char) in ("W", "F"):
+                self._write_wide(char)
+            else:
+                self._write_ascii(char)
+
+    def _write_ascii(self, text: str) -> None:
+        sgr = self.sgr
+        while text:
+            if self.wrap_pending:
+                self._wrap()
+
+            row = self.grid[self.y]
+            room = self.cols - self.x
+            if not self.autowrap and len(text) > room:
+                # Without autowrap, the extra characters overwrite the last column
+                text = text[: room - 1] + text[-1]
+            piece, text = text[:room], text[room:]
+            self._split_wide(row, self.x)
+            self._split_wide(row, self.x + len(piece))
+            row[self.x : self.x + len(piece)] = [(char, sgr) for char in piece]
+            self.dirty.add(self.y)
+            self._last_char = piece[-1]
+
+            self.x += len(piece)
+            if self.x >= self.cols:
+                self.x = self.cols - 1
+                self.wrap_pending = self.autowrap
+
+    def _write_wide(self, char: str) -> None:
+        if self.wrap_pending or self.x == self.cols - 1:
+            if not self.autowrap:
+                return
+            self._wrap()
+
+        row = self.grid[self.y]
+        self._split_wide(row, self.x)
+        self._split_wide(row, self.x + 2)
+        row[self.x] = (char, self.sgr)
+        row[self.x + 1] = ("", self.sgr)
+        self.dirty.add(self.y)
+        self._last_char = char
+
+        self.x += 2
+        if self.x >= self.cols:
+            self.x = self.cols - 1
+            self.wrap_pending = True
+
+    def _split_wide(self, row: List[Cell], x: int) -> None:
+        """Erase the wide character across the edge before column `x`, an edit is about
+        to change one of its halves."""
+        if 0 < x < self.cols and row[x][0] == "":
+            row[x - 1] = (" ", row[x - 1][1])
+            row[x] = (" ", row[x][1])
+
+    def _wrap(self) -> None:
+        self.wrap_pending = False
+        self.x = 0
+        self._linefeed()
+
+    # Controls and escapes
+
+    def _control(self, char: str) -> None:
+        if char == "\r":
+            self.x = 0
+            self.wrap_pending = False
+        elif char in "\n\x0b\x0c":
+            self._linefeed()
+        elif char == "\b":
+            if self.wrap_pending:
+                self.wrap_pending = False
+            elif self.x > 0:
+                self.x -= 1
+        elif char == "\t":
+            self.x = min(self.cols - 1, (self.x // 8 + 1) * 8)
+            self.wrap_pending = False
+
+    def _escape(self, token: str) -> None:
+        final = token[-1]
+        if final == "7":
+            self._save_cursor()
+        elif final == "8":
+            self._restore_cursor()
+        elif final == "D":
+            self._linefeed()
+        elif final == "E":
+            self.x = 0
+            self._linefeed()
+        elif final == "M":
+            self.wrap_pending = False
+            if self.y == self.top:
+                self._scroll_down(1)
+            elif self.y > 0:
+                self.y -= 1
+        elif final == "c":
+            self.reset()
+
+    def _linefeed(self) -> None:
+        self.wrap_pending = False
+        if self.y == self.bottom:
+            self._scroll_up(1)
+        elif self.y < self.rows - 1:
+            self.y += 1
+
+    def _save_cursor(self) -> None:
+        self._saved = (self.y, self.x, dict(self._attrs))
+
+    def _restore_cursor(self) -> None:
+        if self._saved is None:
+            self.y, self.x = 0, 0
+            self._set_attrs({})
+        else:
+            self.y, self.x, attrs = self._saved
+            self.y = min(self.y, self.rows - 1)
+            self.x = min(self.x, self.cols - 1)
+            self._set_attrs(dict(attrs))
+        self.wrap_pending = False
+
+    # CSI sequences
+
+    def _csi(self, private: str, params: str, final: str) -> None:
+        if private == "?":
+            if final in "hl":
+                self._private_mode(_parse_params(params), final == "h")
+            return
+        if private:
+            return
+
+        if final == "m":
+            self._apply_sgr(_parse_params(params))
+            return
+
+        args = _parse_params(params)
+        n = args[0] or 1
+        self.wrap_pending = False
+
+        if final == "A":
+            self.y = max(self.top if self.y >= self.top else 0, self.y - n)
+        elif final in "Be":
+            self.y = min(self.bottom if self.y <= self.bottom else self.rows - 1, self.y + n)
+        elif final in "Ca":
+            self.x = min(self.cols - 1, self.x + n)
+        elif final == "D":
+            self.x = max(0, self.x - n)
+        elif final == "E":
+            self.y, self.x = min(self.rows - 1, self.y + n), 0
+        elif final == "F":
+            self.y, self.x = max(0, self.y - n), 0
+        elif final in "G`":
+            self.x = min(self.cols - 1, n - 1)
+        elif final == "d":
+            self.y = min(self.rows - 1, n - 1)
+        elif final in "Hf":
+            column = args[1] if len(args) > 1 else 0
+            self.y = min(self.rows - 1, n - 1)
+            self.x = min(self.cols - 1, (column or 1) - 1)
+        elif final == "J":
+            self._erase_display(args[0])
+        elif final == "K":
+            self._erase_line(args[0])
+        elif final == "@":
+            self._insert_cells(n)
+        elif final == "P":
+            self._delete_cells(n)
+        elif final == "X":
+            row = self.grid[self.y]
+            end = min(self.cols, self.x + n)
+            self._split_wide(row, self.x)
+            self._split_wide(row, end)
+            row[self.x : end] = [(" ", self._erase_sgr)] * (end - self.x)
+            self.dirty.add(self.y)
+        elif final == "L":
+            if self.top <= self.y <= self.bottom:
+                self._scroll_down(n, self.y)
+        elif final == "M":
+            if self.top <= self.y <= self.bottom:
+                self._scroll_up(n, self.y)
+        elif final == "S":
+            self._scroll_up(n)
+        elif final == "T":
+            self._scroll_down(n)
+        elif final == "b":
+            self._write_text(self._last_char * n)
+        elif final == "r":
+            top = (args[0] or 1) - 1
+            bottom = (args[1] if len(args) > 1 and args[1] else self.rows) - 1
+            if top < bottom < self.rows:
+                self.top, self.bottom = top, bottom
+                self.y, self.x = 0, 0
+        elif final == "s":
+            self._save_cursor()
+        elif final == "u":
+            self._restore_cursor()
+
+    def _private_mode(self, modes: List[int], enabled: bool) -> None:
+        for mode in modes:
+            if mode == 25:
+                self.cursor_visible = enabled
+            elif mode == 7:
+                self.autowrap = enabled
+            elif mode in _INPUT_MODES:
+                self.modes[mode] = enabled
+            elif str(mode) in _ALTERNATE_MODES and enabled:
+                # Switching again while already on the alternate screen clears it
+                self._erase_display(2)
+                self.y, self.x = 0, 0
+
+    def _erase_display(self, mode: int) -> None:
+        if mode == 0:
+            self._erase_line(0)
+            rows = range(self.y + 1, self.rows)
+        elif mode == 1:
+            self._erase_line(1)
+            rows = range(0, self.y)
+        elif mode in (2, 3):
+            rows = range(self.rows)
+        else:
+            return
+
+        for y in rows:
+            self.grid[y] = self._blank_row(self._erase_sgr)
+            self.dirty.add(y)
+
+    def _erase_line(self, mode: int) -> None:
+        row = self.grid[self.y]
+        if mode == 0:
+            start, end = self.x, self.cols
+        elif mode == 1:
+            start, end = 0, self.x + 1
+        elif mode == 2:
+            start, end = 0, self.cols
+        else:
+            return
+        self._split_wide(row, start)
+        self._split_wide(row, end)
+        row[start:end] = [(" ", self._erase_sgr)] * (end - start)
+        self.dirty.add(self.y)
+
+    def _insert_cells(self, n: int) -> None:
+        row = self.grid[self.y]
+        n = min(n, self.cols - self.x)
+        self._split_wide(row, self.x)
+        # Cells pushed past the right margin are lost
+        self._split_wide(row, self.cols - n)
+        row[self.x : self.x] = [(" ", self._erase_sgr)] * n
+        del row[self.cols :]
+        self.dirty.add(self.y)
+
+    def _delete_cells(self, n: int) -> None:
+        row = self.grid[self.y]
+        n = min(n, self.cols - self.x)
+        self._split_wide(row, self.x)
+        self._split_wide(row, self.x + n)
+        del row[self.x : self.x + n]
+        row.extend([(" ", self._erase_sgr)] * n)
+        self.dirty.add(self.y)
+
+    def _scroll_up(self, n: int, top: Optional[int] = None) -> None:
+        """Scroll the region from `top` (default: region top) to its bottom up by n rows."""
+        top = self.top if top is None else top
+        n = min(n, self.bottom - top + 1)
+        del self.grid[top : top + n]
+        for _ in range(n):
+            self.grid.insert(self.bottom - n + 1, self._blank_row(self._erase_sgr))
+        self.dirty.update(range(top, self.bottom + 1))
+        self._record_scroll(top, n)
+
+    def _scroll_down(self, n: int, top: Optional[int] = None) -> None:
+        top = self.top if top is None else top
+        n = min(n, self.bottom - top + 1)
+        del self.grid[self.bottom - n + 1 : self.bottom + 1]
+        for _ in range(n):
+            self.grid.insert(top, self._blank_row(self._erase_sgr))
+        self.dirty.update(range(top, self.bottom + 1))
+        self._record_scroll(top, -n)
+
+    def _record_scroll(self, top: int, n: int) -> None:
+        if top >= self.bottom:
+            # A single row isn't a scroll region for the client (DECSTBM needs two),
+            # the row is repainted instead
+            return
+        scrolls = self._scrolls
+        if scrolls and scrolls[-1][:2] == (top, self.bottom) and scrolls[-1][3] == self._erase_sgr:
+            # Consecutive scrolls of one region in the same direction add up
+            previous = scrolls[-1][2]
+            if (previous > 0) == (n > 0) and abs(previous + n) <= self.bottom - top:
+                scrolls[-1] = (top, self.bottom, previous + n, self._erase_sgr)
+                return
+        if len(scrolls) < self.rows:
+            scrolls.append((top, self.bottom, n, self._erase_sgr))
+
+    # SGR attributes
+
+    def _apply_sgr(self, params: List[int]) -> None:
+        attrs = dict(self._attrs)
+        i = 0
+        while i < len(params):
+            code = params[i]
+            if code == 0:
+                attrs = {}
+            elif code in (1, 2, 3, 4, 5, 7, 8, 9):
+                attrs[code] = str(code)
+            elif code == 22:
+                attrs.pop(1, None)
+                attrs.pop(2, None)
+            elif code in (23, 24, 25, 27, 28, 29):
+                attrs.pop(code - 20, None)
+            elif 30 <= code <= 37 or 90 <= code <= 97:
+                attrs["fg"] = str(code)
+            elif 40 <= code <= 47 or 100 <= code <= 107:
+                attrs["bg"] = str(code)
+            elif code == 39:
+                attrs.pop("fg", None)
+            elif code == 49:
+                attrs.pop("bg", None)
+            elif code in (38, 48):
+                kind = params[i + 1] if i + 1 < len(params) else None
+                width = 3 if kind == 5 else 5 if kind == 2 else 1
+                color = ";".join(str(p) for p in params[i : i + width])
+                attrs["fg" if code == 38 else "bg"] = color
+                i += width - 1
+            i += 1
+        self._set_attrs(attrs)
+
+    def _set_attrs(self, attrs: Dict) -> None:
+        self._attrs = attrs
+        flags = [attrs[code] for code in (1, 2, 3, 4, 5, 7, 8, 9) if code in attrs]
+        colors = [attrs[key] for key in ("fg", "bg") if key in attrs]
+        self.sgr = ";".join(flags + colors)
+        # Erased cells take the background color (xterm's bce)
+        self._erase_sgr = attrs.get("bg", "")
@@ -0,0 +1,179 @@
+# workspace_tree.py - In-memory index of a workspace's files, kept current by the exec agent
+import posixpath
+from fnmatch import fnmatch
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+from terminal.exec_agent import ExecAgent
+
+
+class WorkspaceTree:
+    """
+    Directory index of one workspace, listed once through the exec agent and then
+    updated from the agent's inotify events, so a tree request never walks the disk.
+
+    Nodes have the shape of `tree -J` ({"type": "directory", "name", "contents"}).
+    Directories matched by the ignore rules are listed with "ignored" and no contents.
+    Listeners get each change as a diff: {"added": [...], "removed": [...]} with paths
+    starting at the root's name, or {"reset": True} once the index can't be trusted.
+    """
+
+    _next_watch = 0
+
+    def __init__(self, agent: ExecAgent, root: str, ignore: Sequence[str] = ()):
+        self.agent = agent
+        self.root = root.rstrip("/")
+        self.name = posixpath.basename(self.root)
+        self.ignore = tuple(ignore)
+        # Directory (relative to root, "" for root) to its entries, name to is_directory
+        self.children: Dict[str, Dict[str, bool]] = {"": {}}
+        self.ignored: Set[str] = set()
+        self.listeners: List[Callable[[Dict], None]] = []
+        # Lost the agent or events: dropped, the next request builds a new one
+        self.stale = False
+
+        WorkspaceTree._next_watch += 1
+        self._watch = f"tree-{WorkspaceTree._next_watch}"
+        # Events that arrive before the initial listing is in
+        self._early: Optional[List[Dict]] = []
+
+    async def start(self) -> None:
+        entries = await self.agent.tree_watch(
+            self._watch, self.root, self.ignore, self._on_event
+        )
+        for path, is_directory, ignored in entries:
+            self._add(path, is_directory, ignored)
+
+        early, self._early = self._early, None
+        for event in early:
+            self._on_event(event)
+
+    async def close(self) -> None:
+        self.stale = True
+        self.listeners.clear()
+        if self.agent.is_alive:
+            await self.agent.tree_unwatch(self._watch)
+
+    def _on_event(self, event: Dict) -> None:
+        if self._early is not None:
+            self._early.append(event)
+            return
+
+        if event["event"] != "tree_change":
+            # Events were dropped (queue overflow), or the agent is gone
+            self.stale = True
+            self._notify({"reset": True})
+            return
+
+        added, removed = [], []
+        for change, path, is_directory, ignored in event["changes"]:
+            if change == "add":
+                self._add(path, is_directory, ignored)
+                added.append(
+                    {
+                        "path": f"{self.name}/{path}",
+                        "type": "directory" if is_directory else "file",
+                        **({"ignored": True} if ignored else {}),
+                    }
+                )
+            else:
+                self._remove(path)
+                removed.append(f"{self.name}/{path}")
+
+        self._notify({"added": added, "removed": removed})
+
+    def _notify(self, diff: Dict) -> None:
+        for listener in list(self.listeners):
+            listener(diff)
+
+    def _add(self, path: str, is_directory: bool, ignored: bool) -> None:
+        parent, name = posixpath.split(path)
+        self.children.setdefault(parent, {})[name] = is_directory
+        if ignored:
+            self.ignored.add(path)
+        elif is_directory:
+            self.children.setdefault(path, {})
+
+    def _remove(self, path: str) -> None:
+        parent, name = posixpath.split(path)
+        self.children.get(parent, {}).pop(name, None)
+
+        prefix = path + "/"
+        for directory in [
+            d for d in self.children if d == path or d.startswith(prefix)
+        ]:
+            del self.children[directory]
+        self.ignored = {
+            d for d in self.ignored if d != path and not d.startswith(prefix)
+        }
+
+    def has_directory(self, path: str) -> bool:
+        return path in self.children
+
+    def tree(
+        self,
+        path: str = "",
+        depth: Optional[int] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        ignore: Sequence[str] = (),
+        hidden: bool = False,
+    ) -> Dict:
+        """
+        Node of the directory `path` (relative to root). Below `depth` levels directories
+        come with "truncated" and no contents. `offset` and `limit` page the entries of
+        `path` itself, deeper directories show their first `limit` entries; "more" counts
+        those left out. `ignore` takes fnmatch patterns, hidden names need `hidden`.
+        """
+        name = posixpath.basename(path) if path else self.name
+        return self._node(path, name, depth, offset, limit, tuple(ignore), hidden)
+
+    def _node(
+        self,
+        path: str,
+        name: str,
+        depth: Optional[int],
+        offset: int,
+        limit: Optional[int],
+        ignore: Sequence[str],
+        hidden: bool,
+    ) -> Dict:
+        node = {"type": "directory", "name": name}
+        if path in self.ignored:
+            node["ignored"] = True
+            return node
+        if depth == 0:
+            node["truncated"] = True
+            return node
+
+        entries = self.children.get(path, {})
+        names = sorted(
+            entry
+            for entry in entries
+            if (hidden or not entry.startswith("."))
+            and not any(fnmatch(entry, pattern) for pattern in ignore)
+        )
+        page = names[offset : offset + limit if limit is not None else None]
+
+        contents = []
+        for entry in page:
+            if entries[entry]:
+                child = posixpath.join(path, entry) if path else entry
+                contents.append(
+                    self._node(
+                        child,
+                        entry,
+                        depth - 1 if depth is not None else None,
+                        0,
+                        limit,
+                        ignore,
+                        hidden,
+                    )
+                )
+            else:
+                contents.append({"type": "file", "name": entry})
+
+        node["contents"] = contents
+        more = len(names) - offset - len(page)
+        if more > 0:
+            node["more"] = more
+        return node
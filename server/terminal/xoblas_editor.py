@@ -1,12 +1,23 @@
-from typing import Dict, Optional, AsyncGenerator
+from typing import Any, AnyStr, Awaitable, Callable, Dict, Optional, AsyncGenerator
 from terminal.docker_manager import DockerManager
-from terminal.pty_controller import PtyController
+from terminal.pty_controller import (
+    ALTERNATE_SCREEN_ENTER,
+    ALTERNATE_SCREEN_EXIT,
+    PtyController,
+)
+from terminal.command_history import command_history
 from terminal.file_manager import FileManager
+from terminal.output_pipeline import OutputPipeline
+from terminal.shell_integration import strip_marks
 from terminal.terminal_config import TerminalConfig
+from terminal.tracing import tracer
+import asyncio
+import codecs
 import json
-
-
-import re
+import posixpath
+import secrets
+import shlex
+import time
 
 
 class XoblasEditor:
@@ -15,9 +26,12 @@ class XoblasEditor:
         user_id: str,
         dockerfile_path: Optional[str] = None,
         container_name: Optional[str] = None,
+        terminal_id: str = "main",
     ):
         """Initialize a new PTY shell session with Docker container."""
         self.user_id = user_id
+        # Tab name, several terminals can run in one container
+        self.terminal_id = terminal_id
 
         # Initialize configuration
         self.config = TerminalConfig()
@@ -28,59 +42,155 @@ class XoblasEditor:
 
         # Initialize components
         self.docker = DockerManager.get_or_create(user_id, self.config)
+
+        # Replaced by the container's PTY once started
         self.pty = PtyController(self.config)
         self.file_manager = None  # Will be initialized after container starts
-
-    async def start(self) -> None:
+        # Lets a reconnecting client prove it saw this session's output before
+        self.resume_token = secrets.token_urlsafe(16)
+        # `stream_screen()` is reading the output of the app on the alternate screen
+        self.streaming_screen = False
+        # Command line sent to the shell, recorded in the history once it finishes
+        self._running_command: Optional[str] = None
+        # user, host and cwd of the last prompt, what a reattaching client is shown
+        self.prompt_info: Dict[str, str] = {}
+
+    async def start(
+        self, on_queue_position: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> None:
         """Start the PTY shell session in a Docker container."""
         # Ensure container is running (this will build image and start container if needed)
-        container_id = await self.docker.ensure_container_running()
+        with tracer.stage("ensure_container"):
+            await self.docker.ensure_container_running(on_queue_position)
 
-        # Clean vim file listeners (lockers)
-        await self.docker.cleanup_vim_locks()
+        # Clean vim file listeners (lockers), other tabs may have vim open right now
+        if self.terminal_id == "main":
+            with tracer.stage("cleanup_vim_locks"):
+                await self.docker.cleanup_vim_locks()
 
         # Initialize the file manager now that we have a container
         self.file_manager = FileManager(self.docker)
 
         # Create and configure the PTY
-        await self.pty.create_pty(container_id)
-        await self.pty.configure_terminal()
+        with tracer.stage("create_pty"):
+            self.pty = await self.docker.open_pty(
+                f"{self.terminal_id}-{secrets.token_hex(4)}", self.config
+            )
+        with tracer.stage("configure_terminal"):
+            await self.pty.configure_terminal()
+
+    async def resume(
+        self, on_queue_position: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> None:
+        """Reattach to a session kept alive from a previous connection."""
+        # Unpauses the container if the idle policy hibernated it
+        with tracer.stage("ensure_container"):
+            await self.docker.ensure_container_running(on_queue_position)
 
     # Only used for alternate screen mode, fast and horrible
     async def execute(self, command: str) -> Dict[str, str]:
         """Execute a command simple command in the shell, useful for alternate screen inputs"""
+        # Grab the value before the output updates it
+        previously_in_raw = self.pty.in_alternate_screen
 
         await self.pty.write(command)
 
         output = await self.pty.read_immediate_output()
 
-        # Parse prompt info
-        prompt_info = self.pty.parse_prompt_info(output)
+        # Prompt info, if the output completed a prompt
+        prompt_info = self.pty.take_prompt_info()
 
         cwd, is_exiting_raw, is_raw_mode = self._update_and_parse_variables(
-            prompt_info, output.strip()
+            prompt_info, previously_in_raw
         )
 
-        return self._build_command_result(
-            (
-                output
-                if self.pty.in_alternate_screen
-                else self._filter_chunk(output.strip(), command)
-            ),
-            cwd,
-            prompt_info.get("user", ""),
-            prompt_info.get("host", ""),
-            is_raw_mode,
-            not is_raw_mode,
-            is_exiting_raw,
+        return self._finished_command(
+            self._build_command_result(
+                (
+                    self._screen_frame(output, previously_in_raw)
+                    if self.pty.in_alternate_screen
+                    else output.strip()
+                ),
+                cwd,
+                prompt_info.get("user", ""),
+                prompt_info.get("host", ""),
+                is_raw_mode,
+                not is_raw_mode,
+                is_exiting_raw,
+            )
+        )
+
+    async def send_input(self, data: str) -> None:
+        """Keystrokes for the app on the alternate screen, its output comes from `stream_screen()`."""
+        await self.pty.write(data)
+
+    async def stream_screen(self, binary: bool = False) -> AsyncGenerator[Dict, None]:
+        """Screen updates for as long as an app is on the alternate screen, then the result of leaving it."""
+        # Output from the alternate screen exit on, with the prompt
+        after_exit = []
+
+        self.streaming_screen = True
+        try:
+            # No coalescing window, a keystroke's echo goes out as soon as it's read
+            async for frame in self.pty.read_continuous_until_prompt(
+                timeout=None, flush_interval=0, through_alternate_screen=True
+            ):
+                if self.pty.in_alternate_screen:
+                    diff = self.pty.screen.diff()
+                    if diff:
+                        yield self._build_command_result(
+                            diff.encode() if binary else diff,
+                            "",
+                            "",
+                            "",
+                            True,
+                            False,
+                            False,
+                        )
+                    continue
+
+                if not after_exit:
+                    switch = frame.rfind(ALTERNATE_SCREEN_EXIT)
+                    frame = frame[switch:] if switch != -1 else frame
+                after_exit.append(frame)
+        finally:
+            self.streaming_screen = False
+
+        output = self.pty.decode(b"".join(after_exit))
+        prompt_info = self.pty.take_prompt_info()
+        cwd, is_exiting_raw, is_raw_mode = self._update_and_parse_variables(
+            prompt_info, True
+        )
+
+        yield self._finished_command(
+            self._build_command_result(
+                output.strip(),
+                cwd,
+                prompt_info.get("user", ""),
+                prompt_info.get("host", ""),
+                is_raw_mode,
+                not is_raw_mode,
+                is_exiting_raw,
+            )
         )
 
     async def execute_streaming(
-        self, command: str, complete_output: bool = False
+        self, command: str, complete_output: bool = False, binary: bool = False
     ) -> AsyncGenerator[Dict[str, str], None]:
-        """Execute a command and stream output chunks as they arrive, or return complete output."""
-        await self.pty.write(
-            command if self.pty.in_alternate_screen else command + "\n"
+        """Execute a command and stream output chunks as they arrive, or return complete output.
+
+        With `binary`, streamed chunks carry the output as read (bytes) instead of text.
+        """
+        # Grab the value before the output updates it
+        previously_in_raw = self.pty.in_alternate_screen
+
+        if not previously_in_raw and command.strip():
+            self._running_command = command
+
+        # Output is read while a large command line is still being written: the shell
+        # echoes it as it reads, and stops reading once the echo fills the PTY
+        writing = asyncio.create_task(
+            self.pty.write(command if self.pty.in_alternate_screen else command + "\n")
         )
 
         # if self.pty.in_alternate_screen:
@@ -90,78 +200,183 @@ class XoblasEditor:
         #     )
         #     return
 
-        complete_output_buffer = ""
+        try:
+            async for result in self._stream_until_prompt(
+                previously_in_raw, complete_output, binary
+            ):
+                yield result
+            await writing
+        finally:
+            # Closed early: input already queued is still written, nobody waits on it
+            writing.cancel()
+
+    async def follow_command(self, binary: bool = False) -> AsyncGenerator[Dict, None]:
+        """Output of the command a previous connection left running, then its prompt.
+
+        Nothing is written to the shell.
+        """
+        async for result in self._stream_until_prompt(
+            self.pty.in_alternate_screen, False, binary, timeout=None
+        ):
+            yield result
+
+    async def _stream_until_prompt(
+        self,
+        previously_in_raw: bool,
+        complete_output: bool,
+        binary: bool,
+        timeout: Optional[float] = 120.0,
+    ) -> AsyncGenerator[Dict[str, str], None]:
+        """Output chunks of the command running in the shell, then the result with its prompt."""
+        # Joined once at the end, appending to a string would copy it on every chunk.
+        # Complete output is for programs: plain text, without escape sequences
+        output_chunks = []
+        plain_text = OutputPipeline.plain_text()
+
+        async for frame in self.pty.read_continuous_until_prompt(timeout):
+            if complete_output:
+                output_chunks.append(plain_text.feed(frame)[0])
+                continue
+
+            chunk = frame if binary else self.pty.decode(frame)
 
-        async for chunk in self.pty.read_continuous_until_prompt():
-            complete_output_buffer += chunk
+            # The prompt and the command echo are already out of the frame
+            if self.pty.in_alternate_screen:
+                chunk = self._screen_frame(chunk, previously_in_raw)
 
-            if not complete_output:
-                # Filter out prompt patterns and command echo from this chunk
-                filtered_chunk = self._filter_chunk(chunk, command)
+            # Send the chunk immediately if it has content
+            if chunk.strip():
+                yield self._build_command_result(chunk, "", "", "", False, False, False)
 
-                # Send filtered chunk immediately if it has content
-                if filtered_chunk.strip():
-                    yield self._build_command_result(
-                        filtered_chunk, "", "", "", False, False, False
-                    )
+        output_chunks.append(plain_text.flush())
+        complete_output_buffer = b"".join(output_chunks).decode(errors="replace")
 
-        # Parse prompt info and build final result
-        prompt_info = self.pty.parse_prompt_info(complete_output_buffer)
+        # Prompt info and final result
+        prompt_info = self.pty.take_prompt_info()
         cwd, is_exiting_raw, is_raw_mode = self._update_and_parse_variables(
-            prompt_info, complete_output_buffer.strip()
+            prompt_info, previously_in_raw
         )
 
         # Final result - complete output or empty for streaming mode
-        filtered_output = (
-            self._filter_chunk(complete_output_buffer, command)
-            if complete_output
-            else ""
-        )
-
-        yield self._build_command_result(
-            filtered_output.strip(),
-            cwd,
-            prompt_info.get("user", ""),
-            prompt_info.get("host", ""),
-            is_raw_mode,
-            True,
-            is_exiting_raw,
+        yield self._finished_command(
+            self._build_command_result(
+                complete_output_buffer.strip() if complete_output else "",
+                cwd,
+                prompt_info.get("user", ""),
+                prompt_info.get("host", ""),
+                is_raw_mode,
+                True,
+                is_exiting_raw,
+            )
         )
 
-    def _update_and_parse_variables(self, prompt_info, output):
+    def _finished_command(self, result: Dict) -> Dict:
+        """Add the exit code and duration of the command that just ended, if one did,
+        and record it in the command history."""
+        finished = self.pty.take_last_command()
+        if finished is not None:
+            result["exit_code"] = finished["exit_code"]
+            result["duration"] = finished["duration"]
+
+            if self._running_command is not None:
+                command_history.record(
+                    self.user_id, self.terminal_id, self._running_command, **finished
+                )
+                self._running_command = None
+        return result
+
+    def _update_and_parse_variables(self, prompt_info, previously_in_raw):
         """Parse, get and update utils variables"""
-        cleaned_output = output.strip()
-
+        if prompt_info:
+            self.prompt_info = prompt_info
         cwd = prompt_info.get("cwd", "")
         self.config.CURRENT_WORKDIR = cwd
 
-        # Grab the value before check alternate screen
-        previously_in_raw = self.pty.in_alternate_screen
-        is_raw_mode = self.pty.check_alternate_screen(cleaned_output)
+        # The PTY tracks alternate screen switches as the output streams by
+        is_raw_mode = self.pty.in_alternate_screen
         is_exiting_raw = previously_in_raw and not is_raw_mode
 
         return cwd, is_exiting_raw, is_raw_mode
 
-    def _filter_chunk(self, chunk: str, command: str) -> str:
-        """Filter out prompt patterns and command echo from a chunk."""
-        # Remove prompt patterns
-        prompt_pattern = (
-            re.escape(self.config.PROMPT_PREFIX)
-            + r".+?"
-            + re.escape(self.config.PROMPT_SUFFIX)
-        )
-        chunk = re.sub(prompt_pattern, "", chunk)
+    def _screen_frame(self, output: AnyStr, previously_in_raw: bool) -> AnyStr:
+        """Output to send while an app is on the alternate screen, built from the screen model."""
+        binary = isinstance(output, bytes)
+
+        if previously_in_raw:
+            # Only the cells that changed since the last frame
+            diff = self.pty.screen.diff()
+            return diff.encode() if binary else diff
+
+        # The app just took over: text before the switch, then the whole screen
+        enter = ALTERNATE_SCREEN_ENTER if binary else ALTERNATE_SCREEN_ENTER.decode()
+        switch = output.rfind(enter)
+        before = output[:switch] if switch != -1 else output
+        snapshot = self.pty.screen.snapshot()
+        return before + enter + (snapshot.encode() if binary else snapshot)
+
+    def replay(self, offset: int) -> Dict:
+        """Output the client missed after `offset`, as far back as the scrollback goes."""
+        start, missed = self.pty.replay(offset)
+
+        return {
+            "type": "replay",
+            "output": strip_marks(missed).decode(errors="replace"),
+            "offset": start + len(missed),
+            # Part of what the client missed was already dropped from the scrollback
+            "truncated": start > offset,
+        }
+
+    def resume_replay(self, token: Any, offset: Any) -> Optional[Dict]:
+        """`replay()` for a reconnecting client, None unless it sent this session's
+        token and a byte offset (both come straight from the client)."""
+        if not isinstance(token, str) or not isinstance(offset, (str, int)):
+            return None
+        try:
+            offset = int(offset)
+        except ValueError:
+            return None
+        # As bytes, compare_digest refuses str with non-ASCII characters
+        if offset < 0 or not secrets.compare_digest(
+            token.encode(), self.resume_token.encode()
+        ):
+            return None
+
+        return self.replay(offset)
 
-        # Remove command echo (exact command match)
-        if command.strip() in chunk:
-            chunk = chunk.replace(
-                command.strip(), "", 1
-            )  # Remove only first occurrence
+    async def restore_screen(self) -> Optional[Dict[str, str]]:
+        """Repaint of the app a previous connection left on the alternate screen."""
+        # Output produced while detached goes through the screen model first
+        await self.pty.read_immediate_output(timeout=0.01)
+        if not self.pty.in_alternate_screen:
+            return None
 
-        # Clean up extra newlines that might be left
-        chunk = re.sub(r"\n\s*\n", "\n", chunk)
+        return self._build_command_result(
+            ALTERNATE_SCREEN_ENTER.decode() + self.pty.screen.snapshot(),
+            "",
+            "",
+            "",
+            True,
+            False,
+            False,
+        )
 
-        return chunk
+    def current_prompt(self) -> Dict[str, str]:
+        """The shell's prompt, for a client reattaching while no command runs."""
+        prompt_info = self.pty.take_prompt_info() or self.prompt_info
+        cwd, _, _ = self._update_and_parse_variables(prompt_info, False)
+
+        # With the exit code of a command that finished while detached
+        return self._finished_command(
+            self._build_command_result(
+                "",
+                cwd,
+                prompt_info.get("user", ""),
+                prompt_info.get("host", ""),
+                False,
+                True,
+                False,
+            )
+        )
 
     # TODO Make it based on a structure
     def _build_command_result(
@@ -184,25 +399,80 @@ class XoblasEditor:
             "raw_mode": raw_mode,
             "is_complete": is_complete,
             "is_exiting_raw": is_exiting_raw,
+            # Resume point for a reconnect
+            "offset": self.pty.delivered,
         }
 
-    # Very poor solution, we actually dont want to have to strip out characters since that can break unexpectedly
-    # The ideal solution is to stop using PTY inside the main python code and just invoke the pty inside of the container
-    async def xoblas_editor_command(self, command: str):
-        async for result in self.execute_streaming(
-            f"NO_COLOR=1 TERM=dumb {command}", True
-        ):
-            break
-
-        output = result.get("output")
-
-        clean_pattern = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])|\r|\n")
-
-        cleaned = clean_pattern.sub("", output)
+    async def run_structured(self, command: str) -> AsyncGenerator[Dict, None]:
+        """Run a non-interactive command beside the shell, in its working directory.
+
+        Streams stdout and stderr apart ("exec_output"), then the exit code and duration
+        ("exec_exit"). The interactive shell is never written to.
+        """
+        started = time.perf_counter()
+        # A character may be split between two reads of a stream
+        decoders = {
+            stream: codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for stream in ("stdout", "stderr")
+        }
 
-        print(cleaned)
+        async for event in self.docker.stream_command(
+            command, self.config.CURRENT_WORKDIR or TerminalConfig.CURRENT_WORKDIR
+        ):
+            if "stream" in event:
+                yield {
+                    "type": "exec_output",
+                    "stream": event["stream"],
+                    "data": decoders[event["stream"]].decode(event["data"]),
+                }
+            else:
+                yield {
+                    "type": "exec_exit",
+                    "exit_code": event["exit_code"],
+                    "duration": time.perf_counter() - started,
+                }
+
+    def _container_path(self, path: str) -> str:
+        """Absolute path in the container, a relative one starts at the shell's directory."""
+        cwd = self.config.CURRENT_WORKDIR or TerminalConfig.CURRENT_WORKDIR
+        if cwd.startswith("~"):
+            cwd = self.config.CONTAINER_HOME + cwd[1:]
+        if path.startswith("~"):
+            path = self.config.CONTAINER_HOME + path[1:]
+        return posixpath.normpath(posixpath.join(cwd, path))
+
+    async def tree(self, path: str = ".", **options) -> Optional[Dict]:
+        """Node of a workspace directory from the index (see `WorkspaceTree.tree`), None
+        when the index can't serve it (outside the workspace, or no exec agent)."""
+        absolute = self._container_path(path)
+        root = self.config.WORKSPACE_ROOT
+        if absolute != root and not absolute.startswith(root + "/"):
+            return None
+
+        tree = await self.docker.get_workspace_tree()
+        relative = posixpath.relpath(absolute, root)
+        relative = "" if relative == "." else relative
+        if tree is None or not tree.has_directory(relative):
+            return None
+        return tree.tree(relative, **options)
 
-        return json.loads(cleaned)
+    async def xoblas_editor_command(self, command: str):
+        """File structure of `xoblas [path]`, from the workspace index when it covers the path."""
+        args = shlex.split(command)[1:]
+        if len(args) <= 1:
+            node = await self.tree(
+                args[0] if args else ".", limit=self.config.TREE_PAGE_SIZE
+            )
+            if node is not None:
+                return [node]
+
+        # The script prints `tree -J` output
+        stdout = []
+        async for event in self.run_structured(command):
+            if event["type"] == "exec_output" and event["stream"] == "stdout":
+                stdout.append(event["data"])
+
+        return json.loads("".join(stdout))
 
     def is_xoblas_command(self, command: str) -> bool:
         # Strip leading whitespace and split by whitespace
@@ -217,12 +487,16 @@ class XoblasEditor:
     async def resize(self, rows: int, cols: int) -> None:
         """Resize the terminal."""
         if self.pty.in_alternate_screen:
-            result = await self.pty.resize(rows, cols, capture_output=True)
+            # The app's repaint goes through the screen model, the client gets one snapshot.
+            # While `stream_screen()` runs, the repaint comes after it as a diff
+            await self.pty.resize(
+                rows, cols, capture_output=not self.streaming_screen
+            )
 
             # [TO-DO]: Please do a better approach this is wild LOL
             return {
                 "type": "command",
-                "output": result,
+                "output": self.pty.screen.snapshot(),
                 "cwd": "",
                 "user": "",
                 "host": "",
@@ -0,0 +1,54 @@
+# PTYs hosted by a local exec agent (terminal/container_agent.py)
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+import os
+import sys
+
+from terminal.agent_pty import AgentPtyController
+from terminal.exec_agent import ExecAgent
+from terminal.terminal_config import TerminalConfig
+
+AGENT = [
+    sys.executable,
+    "-u",
+    os.path.join(os.path.dirname(__file__), "..", "terminal", "container_agent.py"),
+]
+
+
+def test_paste_echoed_back_while_output_is_paused():
+    """Reading pauses while nobody takes the echo, the paste still goes through."""
+
+    async def run():
+        agent = ExecAgent(AGENT)
+        await agent.start()
+        try:
+            controller = AgentPtyController(TerminalConfig(), agent, "paste")
+            controller.pid = await agent.pty_open(
+                "paste", 24, 80, controller._on_event, command=("cat",)
+            )
+            controller._alive = True
+
+            size = 3_000_000
+            writing = asyncio.create_task(
+                controller.write(("x" * 99 + "\n") * (size // 100))
+            )
+            # Nobody reads meanwhile: the agent stops reading the PTY, cat stops
+            # reading its input, the agent's writer waits on cat
+            while not controller.paused:
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.5)
+
+            echoed = 0
+            while echoed < size:
+                chunk = await controller._next_chunk(10)
+                assert chunk, f"echo stalled after {echoed} bytes"
+                controller._release(len(chunk))
+                echoed += len(chunk)
+
+            await asyncio.wait_for(writing, 10)
+            assert echoed == size
+        finally:
+            await agent.close()
+
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+# Admission queue of the capacity manager (terminal/capacity.py)
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+
+import pytest
+
+from terminal.capacity import CapacityManager
+
+
+def test_waiter_cancelled_right_after_its_grant_gives_the_slot_back():
+    async def run():
+        capacity = CapacityManager(max_containers=1, check_host_memory=False)
+        await capacity.acquire("alice")
+
+        waiting = asyncio.create_task(capacity.acquire("bob"))
+        await asyncio.sleep(0)
+        assert [waiter.key for waiter in capacity.queue] == ["bob"]
+
+        # Granted, then cancelled before the waiting task got to run
+        capacity.release("alice")
+        assert capacity.holds("bob")
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert not capacity.holds("bob")
+        assert capacity.try_acquire("carol")
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        capacity = CapacityManager(max_containers=1, check_host_memory=False)
+        await capacity.acquire("alice")
+
+        waiting = asyncio.create_task(capacity.acquire("bob"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert not capacity.queue
+        assert list(capacity.holders) == ["alice"]
+
+    asyncio.run(run())
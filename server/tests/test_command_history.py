@@ -0,0 +1,153 @@
+# Terminal command history (terminal/command_history.py): the ring, and the records
+# written to the database in batches
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+
+from terminal.command_history import CommandHistory
+
+
+class FakeDatabase:
+    """Stands in for PostgreSQLClient, keeping the batches it's given."""
+
+    def __init__(self):
+        self.connection_string = "postgresql://fake"
+        self.conn_params = {}
+        self.batches = []
+        self.failing = False
+
+    def create_tables(self):
+        pass
+
+    def add_command_history(self, records):
+        if self.failing:
+            raise ConnectionError("database down")
+        self.batches.append([record["command"] for record in records])
+
+
+def record(history: CommandHistory, command: str, duration: float = 1.0) -> None:
+    history.record("user", "main", command, 0.0, duration, 10, 0)
+
+
+def test_ring_keeps_the_latest_records_without_a_database():
+    async def run():
+        history = CommandHistory(max_records=3)
+        await history.start()
+        for n in range(5):
+            record(history, f"cmd{n}", duration=n)
+
+        assert [r["command"] for r in history.records] == ["cmd2", "cmd3", "cmd4"]
+        metrics = history.get_metrics()
+        assert (metrics["recorded"], metrics["in_memory"]) == (5, 3)
+        assert not metrics["database"]
+
+        slowest = await history.slowest("user", limit=2)
+        assert slowest["source"] == "memory"
+        assert [c["command"] for c in slowest["commands"]] == ["cmd4", "cmd3"]
+        frequent = await history.most_frequent("user")
+        assert [c["runs"] for c in frequent["commands"]] == [1, 1, 1]
+        await history.stop()
+
+    asyncio.run(run())
+
+
+def test_a_database_without_configuration_is_not_used():
+    async def run():
+        database = FakeDatabase()
+        database.connection_string = None
+        history = CommandHistory()
+        await history.start(database)
+
+        assert history.database is None
+        await history.stop()
+
+    asyncio.run(run())
+
+
+def test_flush_writes_pending_records_in_batches():
+    async def run():
+        database = FakeDatabase()
+        history = CommandHistory(database, max_records=10, batch_size=2)
+        for n in range(5):
+            record(history, f"cmd{n}")
+        assert history.pending() == 5
+
+        await history.flush()
+
+        assert database.batches == [["cmd0", "cmd1"], ["cmd2", "cmd3"], ["cmd4"]]
+        assert history.pending() == 0
+        metrics = history.get_metrics()
+        assert (metrics["written"], metrics["dropped"]) == (5, 0)
+
+        # Only what came since is written next time
+        record(history, "cmd5")
+        await history.flush()
+        assert database.batches[-1] == ["cmd5"]
+
+    asyncio.run(run())
+
+
+def test_failed_batch_stays_pending():
+    async def run():
+        database = FakeDatabase()
+        history = CommandHistory(database, max_records=10, batch_size=2)
+        for n in range(3):
+            record(history, f"cmd{n}")
+
+        database.failing = True
+        try:
+            await history.flush()
+        except ConnectionError:
+            pass
+        assert history.pending() == 3
+
+        database.failing = False
+        await history.flush()
+        assert database.batches == [["cmd0", "cmd1"], ["cmd2"]]
+        assert history.get_metrics()["written"] == 3
+
+    asyncio.run(run())
+
+
+def test_records_overwritten_before_their_write_are_dropped():
+    async def run():
+        database = FakeDatabase()
+        history = CommandHistory(database, max_records=3, batch_size=10)
+        for n in range(3):
+            record(history, f"cmd{n}")
+        await history.flush()
+
+        # 5 more come in before the next flush, the ring holds the last 3
+        for n in range(3, 8):
+            record(history, f"cmd{n}")
+        assert history.pending() == 3
+
+        await history.flush()
+        assert database.batches[-1] == ["cmd5", "cmd6", "cmd7"]
+        metrics = history.get_metrics()
+        assert metrics["recorded"] == 8
+        assert (metrics["written"], metrics["dropped"], metrics["pending"]) == (6, 2, 0)
+
+    asyncio.run(run())
+
+
+def test_a_full_batch_is_written_without_waiting_for_the_interval():
+    async def run():
+        database = FakeDatabase()
+        history = CommandHistory(database, batch_size=2, flush_interval=60)
+        await history.start()
+        record(history, "cmd0")
+        record(history, "cmd1")
+
+        for _ in range(100):
+            if database.batches:
+                break
+            await asyncio.sleep(0.01)
+        assert database.batches == [["cmd0", "cmd1"]]
+
+        # The rest on stop
+        record(history, "cmd2")
+        await history.stop()
+        assert database.batches == [["cmd0", "cmd1"], ["cmd2"]]
+
+    asyncio.run(run())
@@ -0,0 +1,156 @@
+# Operations of the exec agent (terminal/container_agent.py), run as a local process
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+from terminal.exec_agent import ExecAgent, ExecAgentError
+
+AGENT = [
+    sys.executable,
+    "-u",
+    os.path.join(os.path.dirname(__file__), "..", "terminal", "container_agent.py"),
+]
+
+
+def with_agent(test):
+    """Run `test(agent, directory)` against a fresh agent and an empty directory."""
+
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            agent = ExecAgent(AGENT)
+            await agent.start()
+            try:
+                await test(agent, directory)
+            finally:
+                await agent.close()
+
+    asyncio.run(run())
+
+
+def test_write_stat_read():
+    async def test(agent, directory):
+        path = os.path.join(directory, "src", "main.py")
+        assert await agent.write(path, b"print(1)\n") == {"size": 9}
+
+        info = await agent.stat(path)
+        assert info["exists"] and info["is_file"] and not info["is_directory"]
+        assert (info["size"], info["name"]) == (9, "main.py")
+        assert await agent.read(path) == b"print(1)\n"
+        assert await agent.read(path, max_size=4) is None
+
+        assert await agent.stat(os.path.join(directory, "missing")) == {
+            "exists": False
+        }
+
+    with_agent(test)
+
+
+def test_list():
+    async def test(agent, directory):
+        for path in ("a.txt", "src/b.py", "node_modules/c.js"):
+            await agent.write(os.path.join(directory, path), b"")
+
+        top = await agent.list(directory)
+        assert [entry["path"][len(directory) + 1 :] for entry in top["entries"]] == [
+            "node_modules",
+            "src",
+            "a.txt",
+        ]
+
+        tree = await agent.list(directory, recursive=True, ignore=("node_modules",))
+        paths = [entry["path"][len(directory) + 1 :] for entry in tree["entries"]]
+        assert paths == ["src", "a.txt", "src/b.py"]
+        assert not tree["truncated"]
+
+        limited = await agent.list(directory, recursive=True, limit=2)
+        assert len(limited["entries"]) == 2 and limited["truncated"]
+
+    with_agent(test)
+
+
+def test_run():
+    async def test(agent, directory):
+        result = await agent.run("echo out; echo err >&2; exit 3")
+        assert result == (b"out\n", b"err\n", 3)
+        result = await agent.run("pwd", cwd=directory)
+        assert result == (directory.encode() + b"\n", b"", 0)
+
+        with pytest.raises(ExecAgentError, match="TimeoutExpired"):
+            await agent.run("sleep 5", timeout=0.2)
+
+    with_agent(test)
+
+
+def test_batch_runs_in_order_and_reports_each_error():
+    async def test(agent, directory):
+        path = os.path.join(directory, "new", "file.txt")
+        results = await agent.batch(
+            [
+                {"op": "write", "path": path, "content": "aGk="},
+                {"op": "read", "path": os.path.join(directory, "missing")},
+                {"op": "nope"},
+                {"op": "stat", "path": path},
+                {"op": "run", "command": f"cat {path}"},
+            ]
+        )
+
+        assert [result["ok"] for result in results] == [True, False, False, True, True]
+        assert results[1]["error"].startswith("FileNotFoundError")
+        assert results[2]["error"] == "ValueError: Unknown operation"
+        assert results[3]["result"]["size"] == 2
+        assert await agent.run_many([f"cat {path}", "exit 1"]) == [
+            (b"hi", b"", 0),
+            (b"", b"", 1),
+        ]
+
+    with_agent(test)
+
+
+def test_errors_come_back_as_error_frames():
+    async def test(agent, directory):
+        with pytest.raises(ExecAgentError, match="FileNotFoundError"):
+            await agent.read(os.path.join(directory, "missing"))
+        with pytest.raises(ExecAgentError, match="Unknown operation"):
+            await agent.request("nope")
+        with pytest.raises(ExecAgentError, match="TypeError"):
+            await agent.request("stat")
+
+        # The agent keeps serving after them
+        assert (await agent.stat(directory))["is_directory"]
+
+    with_agent(test)
+
+
+def test_frames_larger_than_the_pipes():
+    async def test(agent, directory):
+        path = os.path.join(directory, "big.bin")
+        content = os.urandom(5 * 1024 * 1024)
+        assert await agent.write(path, content) == {"size": len(content)}
+        assert await agent.read(path) == content
+
+        stdout, _, exit_code = await agent.run(f"cat {path}")
+        assert (stdout, exit_code) == (content, 0)
+
+    with_agent(test)
+
+
+def test_quick_operations_dont_wait_behind_commands():
+    async def test(agent, directory):
+        # More long commands than there are workers
+        commands = [asyncio.create_task(agent.run("sleep 2")) for _ in range(10)]
+        await asyncio.sleep(0.3)
+
+        started = time.monotonic()
+        await agent.stat(directory)
+        await agent.batch([{"op": "list", "path": directory}])
+        assert time.monotonic() - started < 1
+
+        await asyncio.gather(*commands)
+
+    with_agent(test)
@@ -0,0 +1,51 @@
+# Warm container pool against a stand-in Docker daemon (terminal/docker_standin.py)
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+import os
+import tempfile
+
+from terminal.capacity import CapacityManager
+from terminal.container_pool import ContainerPool
+from terminal.container_state import ContainerStateCache
+from terminal.docker_client import DockerAPIClient, normalize_endpoint
+from terminal.docker_standin import StandInDockerDaemon
+from terminal.exec_agent import ExecAgent
+
+
+def test_warm_up_failing_after_the_container_started_leaves_nothing(monkeypatch):
+    attempts = []
+
+    async def failing_start(agent):
+        attempts.append(agent)
+        raise OSError("agent didn't start")
+
+    monkeypatch.setattr(ExecAgent, "start", failing_start)
+
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            daemon = StandInDockerDaemon(os.path.join(directory, "docker.sock"))
+            await daemon.start()
+            client = DockerAPIClient(normalize_endpoint(daemon.socket_path))
+            capacity = CapacityManager(check_host_memory=False)
+            pool = ContainerPool(client, ContainerStateCache(client), capacity, size=1)
+            try:
+                await pool.start()
+                while not attempts:
+                    await asyncio.sleep(0.01)
+                # The failed attempt is torn down before the retry delay
+                for _ in range(100):
+                    if not capacity.holders:
+                        break
+                    await asyncio.sleep(0.01)
+
+                assert not capacity.holders
+                assert daemon.containers == {}
+                assert daemon.volumes == set()
+                assert pool.ready == []
+            finally:
+                await pool.stop()
+                await client.close()
+                await daemon.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+# Container states fed by the events stream (terminal/container_state.py) of a
+# stand-in Docker daemon (terminal/docker_standin.py)
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+import os
+import tempfile
+
+from terminal.container_state import ContainerStateCache
+from terminal.docker_client import DockerAPIClient, normalize_endpoint
+from terminal.docker_standin import StandInDockerDaemon
+
+
+async def wait_for(condition) -> None:
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_connected_once_the_daemon_answers_the_subscription():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            daemon = StandInDockerDaemon(os.path.join(directory, "docker.sock"))
+            await daemon.start()
+            client = DockerAPIClient(normalize_endpoint(daemon.socket_path))
+            state = ContainerStateCache(client)
+            try:
+                await state.start()
+                # No event has come yet
+                await wait_for(lambda: state.connected)
+                assert state.connected
+
+                container_id = await client.create_container({"Image": "stand-in"})
+                await client.start_container(container_id)
+                await wait_for(lambda: state._cached(container_id) is not None)
+                assert state._cached(container_id)[:2] == (True, False)
+            finally:
+                await state.stop()
+                await client.close()
+                await daemon.stop()
+
+    asyncio.run(run())
+
+
+def test_not_connected_while_the_daemon_hasnt_answered():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "docker.sock")
+            requests = []
+
+            async def silent(reader, writer):
+                # Takes the request, never answers
+                requests.append(await reader.readline())
+                await asyncio.sleep(10)
+
+            server = await asyncio.start_unix_server(silent, path=path)
+            client = DockerAPIClient(normalize_endpoint(path))
+            state = ContainerStateCache(client)
+            try:
+                await state.start()
+                await wait_for(lambda: requests)
+                assert requests and requests[0].startswith(b"GET ")
+
+                await asyncio.sleep(0.1)
+                assert not state.connected
+            finally:
+                await state.stop()
+                await client.close()
+                server.close()
+
+    asyncio.run(run())
@@ -0,0 +1,122 @@
+# Pooled Docker API client (terminal/docker_client.py) against a stand-in daemon
+# (terminal/docker_standin.py)
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+from terminal.docker_client import DockerAPIClient, DockerAPIError, normalize_endpoint
+from terminal.docker_standin import StandInDockerDaemon
+
+
+def with_daemon(test):
+    """Run `test(daemon, client)` against a fresh stand-in daemon."""
+
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            daemon = StandInDockerDaemon(os.path.join(directory, "docker.sock"))
+            await daemon.start()
+            client = DockerAPIClient(normalize_endpoint(daemon.socket_path))
+            try:
+                await test(daemon, client)
+            finally:
+                await client.close()
+                await daemon.stop()
+
+    asyncio.run(run())
+
+
+def test_requests_reuse_one_keep_alive_connection():
+    async def test(daemon, client):
+        await client.create_volume("data")
+        for _ in range(5):
+            assert await client.inspect_volume("data") is not None
+        assert await client.ping()
+
+        assert daemon.connections == 1
+        assert len(client._idle) == 1
+
+    with_daemon(test)
+
+
+def test_stale_reused_connection_is_retried_once():
+    async def test(daemon, client):
+        assert await client.ping()
+
+        # The daemon drops the idle connection without the client noticing first
+        daemon.drop_next_request = True
+        await client.create_volume("data")
+
+        assert daemon.volumes == {"data"}
+        assert daemon.connections == 2
+
+    with_daemon(test)
+
+
+def test_dropped_fresh_connection_is_not_retried():
+    async def test(daemon, client):
+        daemon.drop_next_request = True
+        with pytest.raises(ConnectionResetError):
+            await client.create_volume("data")
+
+        assert daemon.connections == 1
+        assert client._idle == []
+
+    with_daemon(test)
+
+
+def test_chunked_bodies_are_read_whole():
+    async def test(daemon, client):
+        daemon.chunked = True
+        name = "volume-" + "x" * 100
+        created = await client.create_volume(name)
+        assert created == {"Name": name}
+        assert await client.inspect_volume(name) is not None
+        with pytest.raises(DockerAPIError) as error:
+            await client.start_container("missing")
+        assert error.value.status == 404
+
+        # The connection stays usable after every chunked body
+        assert daemon.connections == 1
+
+    with_daemon(test)
+
+
+def test_error_statuses():
+    async def test(daemon, client):
+        # 404 where a missing object is an answer
+        assert await client.inspect_volume("missing") is None
+        assert await client.inspect_container("missing") is None
+        await client.remove_container("missing", force=True)
+        await client.remove_volume("missing")
+
+        with pytest.raises(DockerAPIError) as error:
+            await client.start_container("missing")
+        assert error.value.status == 404
+        assert "No such container" in str(error.value)
+
+        # Error responses don't cost the connection either
+        assert daemon.connections == 1
+
+    with_daemon(test)
+
+
+def test_exec_run_splits_stdout_and_stderr():
+    async def test(daemon, client):
+        container_id = await client.create_container({"Image": "stand-in"})
+        await client.start_container(container_id)
+
+        script = "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"
+        stdout, stderr, exit_code = await client.exec_run(
+            container_id, [sys.executable, "-c", script]
+        )
+
+        assert (stdout, stderr, exit_code) == (b"out\n", b"err\n", 3)
+        # The raw stream ends by closing its connection, later requests use another
+        assert await client.ping()
+
+    with_daemon(test)
@@ -0,0 +1,78 @@
+# Output post-processing (terminal/output_pipeline.py, terminal/shell_integration.py):
+# a stream read in pieces comes out as it does read whole
+#
+#   cd server && python -m pytest -q tests
+import random
+
+from terminal.output_pipeline import OutputPipeline, ScreenSwitches
+from terminal.shell_integration import ShellMarks
+
+SESSION = (
+    b"\x1b]133;D;0;t=1700000000.123456\x07"
+    b"\x1b]133;A;user=termuser;host=box;cwd=~/root\x07\x1b]133;B\x07"
+    b"ls --color\r\n"
+    b"\x1b]133;C;t=1700000001.5\x07"
+    b"\x1b[0m\x1b[01;34mdir\x1b[0m  \x1b[01;32mexec\x1b[0m  caf\xc3\xa9.txt\r\n"
+    b"\x1b]133;D;0;t=1700000002,25\x07"
+    b"\x1b]133;A;user=termuser;host=box;cwd=~/root; odd\x07\x1b]133;B\x07"
+    b"vim\r\n"
+    b"\x1b]133;C;t=\x07"
+    b"\x1b[?1049h\x1b[1;1H\x1b[K~\x1b[38;5;12mx\x1b[m\r\n\x1b]0;title\x07\xe4\xb8\xad"
+    b"\x1b[?1049l\x1b[?1049"
+    b"\x1b]133;D;130;t=\x07\r\r\n"
+    b"\x1b]133;A;user=termuser;host=box;cwd=/\x07\x1b]133;B\x07"
+    + b"ech\x08\x1b[K" * 3
+    + b"\x1b]133;C\x07plain \x1b]13 not a mark \x1b]133 still not\r\n"
+)
+
+
+def feed_in_pieces(pipeline: OutputPipeline, data: bytes, rng: random.Random):
+    """Output, and events with their offsets counted from the start of the output."""
+    output = b""
+    events = []
+    position = 0
+    while position < len(data):
+        size = rng.choice((1, 1, 2, 3, 5, 8, 13, 64, len(data)))
+        chunk_output, chunk_events = pipeline.feed(data[position : position + size])
+        events += [(name, value, len(output) + at) for name, value, at in chunk_events]
+        output += chunk_output
+        position += size
+    return output + pipeline.flush(), events
+
+
+def check_splits(make_pipeline, data: bytes, runs: int = 300):
+    """Output and events of `data` fed whole, after checking every split gives them."""
+    pipeline = make_pipeline()
+    expected_output, expected_events = pipeline.feed(data)
+    expected_output += pipeline.flush()
+
+    for run in range(runs):
+        output, events = feed_in_pieces(make_pipeline(), data, random.Random(run))
+        assert output == expected_output, run
+        assert events == expected_events, run
+    return expected_output, expected_events
+
+
+def test_pty_pipeline_gives_the_same_output_and_marks_in_any_split():
+    output, events = check_splits(
+        lambda: OutputPipeline([ShellMarks(), ScreenSwitches()]), SESSION
+    )
+
+    marks = [value[0] for name, value, _ in events if name == "mark"]
+    assert marks == ["D", "A", "B", "C", "D", "A", "B", "C", "D", "A", "B", "C"]
+    assert [name for name, _, _ in events if name != "mark"] == [
+        "alternate_enter",
+        "alternate_exit",
+    ]
+    # The command line echo is dropped, the rest is passed through
+    assert b"ls --color" not in output and b"ech" not in output
+    assert b"\x1b]133" in output and b"\x1b[?1049" in output
+
+
+def test_plain_text_is_the_same_in_any_split():
+    output, _ = check_splits(OutputPipeline.plain_text, SESSION)
+
+    # Colors, title and marks are gone; the sequences never finished stay
+    assert b"\ndir  exec  caf\xc3\xa9.txt\nvim\n~x\n" in output
+    assert b"title" not in output and b"\x1b]133;" not in output
+    assert output.endswith(b"\x1b]13 not a mark \x1b]133 still not\n")
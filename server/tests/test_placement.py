@@ -0,0 +1,142 @@
+# Placement over several stand-in Docker daemons (terminal/docker_standin.py)
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+import json
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from terminal.container_pool import VolumeBindings
+from terminal.docker_client import normalize_endpoint
+from terminal.docker_standin import StandInDockerDaemon
+from terminal.placement import Placement
+
+
+@asynccontextmanager
+async def standin_daemons(directory: str, count: int):
+    daemons = [
+        StandInDockerDaemon(os.path.join(directory, f"docker-{i}.sock"))
+        for i in range(count)
+    ]
+    for daemon in daemons:
+        await daemon.start()
+    try:
+        yield daemons
+    finally:
+        for daemon in daemons:
+            await daemon.stop()
+
+
+async def cold_start(placement: Placement, user_id: str) -> str:
+    """What DockerManager.start_container does for the volume: create it, bind it."""
+    node = placement.node_for(user_id)
+    volume_name = placement.bindings.volume_for(user_id)
+    await node.client.create_volume(volume_name)
+    placement.bindings.bind(user_id, volume_name, node.endpoint)
+    return node.endpoint
+
+
+async def close(placement: Placement) -> None:
+    for node in placement.nodes.values():
+        await node.client.close()
+
+
+def test_users_spread_within_bounded_load():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            async with standin_daemons(directory, 3) as daemons:
+                placement = Placement(
+                    [daemon.socket_path for daemon in daemons],
+                    load_factor=1.25,
+                    bindings=VolumeBindings(os.path.join(directory, "bindings.json")),
+                )
+                for i in range(300):
+                    await cold_start(placement, f"user-{i}")
+
+                loads = [placement._load(endpoint) for endpoint in placement.nodes]
+                assert sum(loads) == 300
+                assert max(loads) <= placement._max_load()
+                # Each volume is on the daemon of its user's node, and only there
+                for daemon in daemons:
+                    endpoint = normalize_endpoint(daemon.socket_path)
+                    assert daemon.volumes == {
+                        user_id
+                        for user_id, assigned in placement.assignments.items()
+                        if assigned == endpoint
+                    }
+                await close(placement)
+
+    asyncio.run(run())
+
+
+def test_returning_user_lands_on_the_node_holding_their_volume():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            bindings_path = os.path.join(directory, "bindings.json")
+            async with standin_daemons(directory, 4) as daemons:
+                endpoints = [daemon.socket_path for daemon in daemons]
+                placement = Placement(
+                    endpoints[:3], bindings=VolumeBindings(bindings_path)
+                )
+                homes = {}
+                for i in range(60):
+                    homes[f"user-{i}"] = await cold_start(placement, f"user-{i}")
+                await close(placement)
+
+                # Restart with a node added in front: nobody with a volume moves,
+                # new users reach the new node
+                placement = Placement(
+                    endpoints[3:] + endpoints[:3],
+                    bindings=VolumeBindings(bindings_path),
+                )
+                for user_id, endpoint in homes.items():
+                    assert placement.node_for(user_id).endpoint == endpoint
+
+                new_nodes = {
+                    placement.node_for(f"new-user-{i}").endpoint for i in range(40)
+                }
+                assert normalize_endpoint(endpoints[3]) in new_nodes
+                await close(placement)
+
+    asyncio.run(run())
+
+
+def test_ended_sessions_leave_the_load():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            async with standin_daemons(directory, 2) as daemons:
+                placement = Placement(
+                    [daemon.socket_path for daemon in daemons],
+                    bindings=VolumeBindings(os.path.join(directory, "bindings.json")),
+                )
+                homes = {}
+                for i in range(40):
+                    homes[f"user-{i}"] = await cold_start(placement, f"user-{i}")
+
+                for i in range(30):
+                    placement.release(f"user-{i}")
+                loads = [placement._load(endpoint) for endpoint in placement.nodes]
+                assert sum(loads) == 10
+                assert placement._max_load() < 40
+
+                # Back on the node holding their volume
+                assert placement.node_for("user-0").endpoint == homes["user-0"]
+                assert len(placement.assignments) == 11
+                await close(placement)
+
+    asyncio.run(run())
+
+
+def test_bindings_written_before_nodes_were_recorded_still_load():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bindings.json")
+        with open(path, "w") as f:
+            json.dump({"alice": "xoblas-warm-1"}, f)
+
+        bindings = VolumeBindings(path)
+        assert bindings.volume_for("alice") == "xoblas-warm-1"
+        assert bindings.node_for("alice") is None
+
+        bindings.bind("alice", "xoblas-warm-1", "unix:///tmp/docker-a.sock")
+        assert VolumeBindings(path).node_for("alice") == "unix:///tmp/docker-a.sock"
@@ -0,0 +1,61 @@
+# Pastes of several MB into a local shell (terminal/local_pty.py): the input is written
+# while its echo fills the PTY, past the output watermarks
+#
+#   cd server && python -m pytest -q tests
+import asyncio
+
+from terminal.local_pty import LocalPtyController
+from terminal.xoblas_editor import XoblasEditor
+
+
+async def open_shell() -> XoblasEditor:
+    editor = XoblasEditor("paste")
+    editor.pty = LocalPtyController(editor.config)
+    await editor.pty.start_shell()
+    return editor
+
+
+async def run_command(editor: XoblasEditor, command: str) -> dict:
+    """Final result of `command`, its whole output as text."""
+    result = None
+    async for result in editor.execute_streaming(command, complete_output=True):
+        pass
+    return result
+
+
+def test_echo_of_a_long_command_line():
+    async def run():
+        editor = await open_shell()
+        try:
+            size = 3_000_000
+            result = await asyncio.wait_for(
+                run_command(editor, "echo " + "a" * size), 60
+            )
+            assert result["output"] == "a" * size
+            assert result["exit_code"] == 0
+        finally:
+            editor.pty.close()
+
+    asyncio.run(run())
+
+
+def test_paste_into_a_running_command():
+    async def run():
+        editor = await open_shell()
+        try:
+            size = 4_000_000
+            line = "x" * 99 + "\n"
+            # Read by `head` from the terminal, its last newline is the one ending
+            # the command line
+            paste = (line * (size // len(line)))[:-1]
+            result = await asyncio.wait_for(
+                run_command(editor, f"head -c {size} | wc -c\n{paste}"), 60
+            )
+            # Part of the echo may be held back by the line discipline and come
+            # after the count, so it isn't always the last thing printed
+            assert str(size) in result["output"]
+            assert result["exit_code"] == 0
+        finally:
+            editor.pty.close()
+
+    asyncio.run(run())
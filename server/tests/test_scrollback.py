@@ -0,0 +1,82 @@
+# Scrollback ring (terminal/scrollback.py) and the replay a reconnecting client gets
+# with its resume token (XoblasEditor.resume_replay)
+#
+#   cd server && python -m pytest -q tests
+import random
+
+from terminal.scrollback import ScrollbackBuffer
+from terminal.xoblas_editor import XoblasEditor
+
+
+def test_offsets_count_every_byte_appended():
+    scrollback = ScrollbackBuffer(8)
+    scrollback.append(b"abcdef")
+    assert (scrollback.start, scrollback.end) == (0, 6)
+    assert scrollback.read_from(2) == (2, b"cdef")
+
+    # Wraps around, the oldest bytes are gone
+    scrollback.append(b"ghijk")
+    assert (scrollback.start, scrollback.end) == (3, 11)
+    assert scrollback.read_from(0) == (3, b"defghijk")
+    assert scrollback.read_from(9) == (9, b"jk")
+    assert scrollback.read_from(11) == (11, b"")
+    assert scrollback.read_from(50) == (11, b"")
+
+    # More than the capacity at once
+    scrollback.append(b"0123456789")
+    assert scrollback.read_from(0) == (13, b"23456789")
+
+
+def test_random_appends_keep_the_last_bytes():
+    for run in range(200):
+        rng = random.Random(run)
+        capacity = rng.randint(1, 32)
+        scrollback = ScrollbackBuffer(capacity)
+        everything = b""
+        for _ in range(rng.randint(1, 20)):
+            data = bytes(rng.randrange(256) for _ in range(rng.randint(0, 40)))
+            scrollback.append(data)
+            everything += data
+
+            offset = rng.randint(0, len(everything))
+            start = max(offset, len(everything) - capacity)
+            assert scrollback.read_from(offset) == (start, everything[start:]), run
+
+
+def editor_with_output(output: bytes) -> XoblasEditor:
+    editor = XoblasEditor("resume")
+    editor.pty.scrollback.append(output)
+    return editor
+
+
+def test_client_with_the_token_gets_what_it_missed():
+    editor = editor_with_output(b"$ ls\r\nmain.py\r\n$ ")
+
+    replay = editor.resume_replay(editor.resume_token, "6")
+    assert replay == {
+        "type": "replay",
+        "output": "main.py\r\n$ ",
+        "offset": 17,
+        "truncated": False,
+    }
+    assert editor.resume_replay(editor.resume_token, 17)["output"] == ""
+
+
+def test_replay_says_when_part_was_dropped():
+    editor = editor_with_output(b"")
+    editor.pty.scrollback = ScrollbackBuffer(4)
+    editor.pty.scrollback.append(b"abcdefgh")
+
+    replay = editor.resume_replay(editor.resume_token, "2")
+    assert (replay["output"], replay["offset"]) == ("efgh", 8)
+    assert replay["truncated"]
+
+
+def test_bad_tokens_and_offsets_get_nothing():
+    editor = editor_with_output(b"secret output")
+    token = editor.resume_token
+
+    for bad_token in (None, "", "wrong", "é" * 22, 42, [token]):
+        assert editor.resume_replay(bad_token, "0") is None
+    for bad_offset in (None, "", "abc", "-1", -1, "1.5", 1.5, {}):
+        assert editor.resume_replay(token, bad_offset) is None
@@ -0,0 +1,103 @@
+# Alternate screen model (terminal/vt_screen.py): a client applying the diffs ends up
+# with the screen the model holds
+#
+#   cd server && python -m pytest -q tests
+import random
+
+from terminal.vt_screen import VtScreen
+
+PIECES = [
+    "abc",
+    "xy",
+    "é",
+    "中",
+    "\r\n",
+    "\n",
+    "\r",
+    "\x1b[M",
+    "\x1b[2M",
+    "\x1b[L",
+    "\x1b[2L",
+    "\x1b[S",
+    "\x1b[T",
+    "\x1bM",
+    "\x1bD",
+    "\x1b[2;4r",
+    "\x1b[1;3r",
+    "\x1b[r",
+    "\x1b[31m",
+    "\x1b[44m",
+    "\x1b[0m",
+    "\x1b[K",
+    "\x1b[2J",
+    "\x1b[3X",
+    "\x1b[2@",
+    "\x1b[P",
+    "\x1b[H",
+    "\x1b[3;1H",
+    "\x1b[4;1H",
+    "\x1b[5;2H",
+    "\x1b[A",
+    "\x1b[B",
+]
+
+
+def text(screen: VtScreen):
+    return ["".join(cell[0] for cell in row) for row in screen.grid]
+
+
+def connect(model: VtScreen) -> VtScreen:
+    """Client screen (what xterm.js shows), painted from a snapshot of the model."""
+    client = VtScreen(model.rows, model.cols)
+    client.feed(model.snapshot().encode())
+    return client
+
+
+def test_deleting_the_bottom_row_of_the_region_only_changes_that_row():
+    model = VtScreen(3, 6)
+    client = connect(model)
+    model.feed(b"abc\r\ndef\r\nghi")
+    client.feed(model.diff().encode())
+
+    model.feed(b"\x1b[3;1H\x1b[M")
+    client.feed(model.diff().encode())
+
+    assert text(model) == ["abc   ", "def   ", "      "]
+    assert client.grid == model.grid
+
+
+def test_scrolls_are_replayed_on_the_client():
+    model = VtScreen(4, 6)
+    client = connect(model)
+    model.feed(b"1\r\n2\r\n3\r\n4")
+    client.feed(model.diff().encode())
+
+    # Region rows 2-3 scrolled up once, then the whole screen down once
+    model.feed(b"\x1b[2;3r\x1b[3;1H\n\x1b[r\x1b[T")
+    diff = model.diff()
+    client.feed(diff.encode())
+
+    assert "\x1b[2;3r" in diff
+    assert text(model) == ["      ", "1     ", "3     ", "      "]
+    assert client.grid == model.grid
+
+
+def test_overwriting_half_of_a_wide_character_erases_it():
+    screen = VtScreen(2, 6)
+    screen.feed("中中".encode())
+    screen.feed(b"\x1b[1;2Hx")
+
+    assert text(screen)[0] == " x中  "
+
+
+def test_random_output_diffs_keep_the_client_in_step():
+    for run in range(500):
+        rng = random.Random(run)
+        model = VtScreen(5, 8)
+        client = connect(model)
+        for _ in range(rng.randint(1, 8)):
+            chunk = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 6)))
+            model.feed(chunk.encode())
+            client.feed(model.diff().encode())
+            assert client.grid == model.grid, (run, chunk)
+            assert (client.y, client.x) == (model.y, model.x)